@@ -1,18 +1,28 @@
 """
-AI Intent Parser - Uses Groq API (free) or regex fallback
+AI Intent Parser - regex first, Groq API (free) for low-confidence messages
 """
 import re
 import json
-from config import GROQ_API_KEY
+import threading
+from config import GROQ_API_KEY, INTENT_CONFIDENCE_THRESHOLD, LLM_INTENT_BUDGET
+from circuit_breaker import CircuitOpenError
+from llm_client import chat_completion, get_llm_stats
+import intent_cache
+import tracing
 from logger_config import logger
 
-def parse_with_groq(message: str) -> dict:
-    """Parse intent using Groq API"""
+# Routing metrics: which path answered each message
+CONFIDENCE_BUCKETS = (0.0, 0.25, 0.5, 0.75, 0.9, 1.0)
+_route_stats = {"regex": 0, "cache": 0, "llm": 0, "regex_fallback": 0}
+_confidence_histogram = {b: 0 for b in CONFIDENCE_BUCKETS}
+_stats_lock = threading.Lock()
+
+JSON_PATTERN = re.compile(r'\[.*\]|\{.*\}', re.DOTALL)
+
+@tracing.traced("parse_with_groq")
+def parse_with_groq(message: str) -> list:
+    """Parse intents using Groq API; returns a list with one entry per command"""
     try:
-        from groq import Groq
-        
-        client = Groq(api_key=GROQ_API_KEY)
-        
         system_prompt = """You are an intent parser for a shopkeeper assistant. 
 Extract the intent and entities from the user message.
 
@@ -31,144 +41,370 @@ Available intents:
 Respond ONLY with valid JSON like:
 {"intent": "record_sale", "entities": {"product": "rice", "quantity": 5, "price": 80}}
 
+If the message contains several actions, respond with a JSON array of such
+objects in the order they appear, like:
+[{"intent": "record_sale", "entities": {"product": "rice", "quantity": 5, "price": 80}},
+ {"intent": "record_purchase", "entities": {"product": "sugar", "quantity": 20, "price": 90}}]
+
 Parse this message:"""
 
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
+        result_text = chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": message}
             ],
             temperature=0.1,
-            max_tokens=200
+            max_tokens=400,
+            budget=LLM_INTENT_BUDGET
         )
+        if result_text is None:
+            return None
         
-        result_text = response.choices[0].message.content.strip()
-        
-        # Extract JSON from response
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        # Extract JSON (an object or an array of objects) from response
+        json_match = JSON_PATTERN.search(result_text)
         if json_match:
-            return json.loads(json_match.group())
+            parsed = json.loads(json_match.group())
+            if isinstance(parsed, dict):
+                parsed = parsed.get("intents", [parsed])
+            intents = [i for i in parsed if isinstance(i, dict)]
+            if intents:
+                return intents
         
-        return {"intent": "unknown", "entities": {}}
+        return [{"intent": "unknown", "entities": {}}]
         
+    except CircuitOpenError as e:
+        logger.debug(str(e))
+        return None
     except Exception as e:
-        logger.warning(f"Groq API error: {e}")
+        logger.warning("Groq API error: %s", e)
         return None
 
-def parse_with_regex(message: str) -> dict:
-    """Fallback regex-based intent parser"""
-    message_lower = message.lower().strip()
-    
-    # Greeting patterns
-    if re.match(r'^(hi|hello|hey|good morning|good evening)', message_lower):
-        return {"intent": "greeting", "entities": {}}
-    
-    # Help patterns
-    if re.match(r'^(help|what can you do|commands)', message_lower):
-        return {"intent": "help", "entities": {}}
-    
-    # Sale patterns - improved to capture multi-word product names
-    sale_patterns = [
-        # "sold 5 kg cooking oil at 80" or "sold 5 rice at 80"
-        r'sold?\s+(\d+\.?\d*)\s*(?:kg|pieces?|pcs?|units?)?\s*(?:of\s+)?(.+?)\s+(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
-        # "5 rice sold at 80"
-        r'(\d+\.?\d*)\s+(.+?)\s+sold\s*(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
-    ]
-    
-    for pattern in sale_patterns:
-        match = re.search(pattern, message_lower)
-        if match:
-            product = match.group(2).strip()
-            # Clean up product name - remove trailing words like "each", "per"
-            product = re.sub(r'\s+(each|per|piece|kg|unit)s?$', '', product)
-            return {
-                "intent": "record_sale",
-                "entities": {
-                    "quantity": float(match.group(1)),
-                    "product": product,
-                    "price": float(match.group(3))
-                }
-            }
-    
-    # Purchase patterns - improved to capture multi-word product names
-    purchase_patterns = [
-        # "bought 10 cooking oil at 280" or "bought 10 kg rice at 70"
-        r'(?:bought|purchased?|restocked?|got)\s+(\d+\.?\d*)\s*(?:kg|pieces?|pcs?|units?)?\s*(?:of\s+)?(.+?)\s+(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
-    ]
-    
-    for pattern in purchase_patterns:
-        match = re.search(pattern, message_lower)
+# Words that carry no meaning of their own around a structured command
+FILLER_WORDS = {
+    "i", "we", "just", "have", "has", "today", "each", "per", "piece", "pieces",
+    "pcs", "kg", "unit", "units", "rs", "rupees", "please", "only", "of", "a", "the"
+}
+
+# Base confidence per regex rule; a message the rule explains completely
+# scores the base, anything left unexplained pulls the score down
+RULE_CONFIDENCE = {
+    "greeting": 0.95,
+    "help": 0.9,
+    "record_sale": 0.95,
+    "record_purchase": 0.95,
+    "create_invoice": 0.9,
+    "show_inventory": 0.9,
+    "show_summary": 0.85,
+    "suggest_reorder": 0.85,
+    "recommend_price": 0.8,
+}
+
+# Compiled grammar - every pattern is built once at import
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+# "1,000" or "1,250.50" with thousands separators, otherwise plain "12" or "12.5"
+NUMBER = r'(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+\.?\d*)'
+PRICE = r'(?:at|@|for)\s*(?:rs\.?|₹)?\s*' + NUMBER
+UNIT = r'(?:kg|pieces?|pcs?|units?)?'
+
+GREETING_PREFIXES = ("hi", "hello", "hey", "good morning", "good evening")
+HELP_PREFIXES = ("help", "what can you do", "commands")
+
+SALE_PATTERNS = (
+    # "sold 5 kg cooking oil at 80" or "sold 5 rice at 80"
+    re.compile(r'sold?\s+' + NUMBER + r'\s*' + UNIT + r'\s*(?:of\s+)?(.+?)\s+' + PRICE),
+    # "5 rice sold at 80"
+    re.compile(NUMBER + r'\s+(.+?)\s+sold\s*' + PRICE),
+)
+PURCHASE_PATTERNS = (
+    # "bought 10 cooking oil at 280" or "bought 10 kg rice at 70"
+    re.compile(r'(?:bought|purchased?|restocked?|got)\s+' + NUMBER + r'\s*' + UNIT + r'\s*(?:of\s+)?(.+?)\s+' + PRICE),
+)
+# "invoice for ali hassan: ..." names the customer up to the colon,
+# otherwise the customer is the single word after "invoice (for)"
+INVOICE_PATTERNS = (
+    re.compile(r'invoice\s+(?:for\s+)?([a-z][\w ]*?)\s*:\s*(.+)'),
+    re.compile(r'invoice\s+(?:for\s+)?(\w+)(?:\s*:\s*|\s+)(.+)'),
+)
+# Items like "5 rice at 80, 2 cooking oil at 150 and 1 kg of sugar @ 90"
+INVOICE_ITEM_PATTERN = re.compile(
+    NUMBER + r'\s*' + UNIT + r'\s*(?:of\s+)?([a-z][a-z ]*?)\s*(?:at|@)\s*(?:rs\.?|₹)?\s*' + NUMBER
+)
+INVENTORY_PATTERN = re.compile(r'(show|list|view|check|my)\s*(inventory|products?|stock|items)')
+SUMMARY_PATTERN = re.compile(r'(summary|total|report|sales|today|daily)')
+REORDER_PATTERN = re.compile(r'(reorder|restock|low stock|what.*order|need.*buy)')
+PRICE_PATTERN = re.compile(r'(?:what|suggest).*?price\s*(?:for|of)?\s+([a-z][\w ]*?)[\s?.!]*$')
+PRODUCT_SUFFIX_PATTERN = re.compile(r'\s+(each|per|piece|kg|unit)s?$')
+
+# Trigger words found in one scan of the message decide which rules run
+TRIGGER_PATTERN = re.compile(
+    r'\b(sold?|bought|purchase|restock|got|invoice|inventory|products?|stock|items|'
+    r'summary|total|report|sales|today|daily|reorder|order|buy|price)'
+)
+TRIGGERS = {
+    "sol": ("record_sale",), "sold": ("record_sale",),
+    "bought": ("record_purchase",), "purchase": ("record_purchase",), "got": ("record_purchase",),
+    "restock": ("record_purchase", "suggest_reorder"),
+    "invoice": ("create_invoice",),
+    "inventory": ("show_inventory",), "product": ("show_inventory",), "products": ("show_inventory",),
+    "items": ("show_inventory",), "stock": ("show_inventory", "suggest_reorder"),
+    "summary": ("show_summary",), "total": ("show_summary",), "report": ("show_summary",),
+    "sales": ("show_summary",), "today": ("show_summary",), "daily": ("show_summary",),
+    "reorder": ("suggest_reorder",), "order": ("suggest_reorder",), "buy": ("suggest_reorder",),
+    "price": ("recommend_price",),
+}
+
+def _residual_words(text: str, spans: list) -> list:
+    """Meaningful words of `text` not covered by any of the matched spans"""
+    remaining = list(text)
+    for start, end in spans:
+        remaining[start:end] = " " * (end - start)
+    words = TOKEN_PATTERN.findall("".join(remaining))
+    return [w for w in words if w not in FILLER_WORDS]
+
+def _span_confidence(intent: str, residual: list) -> float:
+    """Confidence for a structured rule given the words it left unexplained"""
+    return round(max(0.0, RULE_CONFIDENCE[intent] - 0.15 * len(residual)), 2)
+
+def _keyword_confidence(intent: str, message: str) -> float:
+    """Confidence for a keyword rule, decaying as the message gets longer"""
+    word_count = max(1, len(message.split()))
+    base = RULE_CONFIDENCE[intent]
+    return round(base if word_count <= 5 else base * 5 / word_count, 2)
+
+def _number(text: str) -> float:
+    """A matched NUMBER as a float, thousands separators dropped"""
+    return float(text.replace(",", ""))
+
+def _result(intent: str, entities: dict, confidence: float) -> dict:
+    return {"intent": intent, "entities": entities, "confidence": confidence}
+
+def _match_transaction(intent: str, patterns: tuple, text: str):
+    """Shared rule for sales and purchases: quantity, product and price"""
+    for pattern in patterns:
+        match = pattern.search(text)
         if match:
             product = match.group(2).strip()
             # Clean up product name - remove trailing words like "each", "per"
-            product = re.sub(r'\s+(each|per|piece|kg|unit)s?$', '', product)
-            return {
-                "intent": "record_purchase",
-                "entities": {
-                    "quantity": float(match.group(1)),
-                    "product": product,
-                    "price": float(match.group(3))
-                }
-            }
-    
-    # Invoice patterns
-    invoice_match = re.search(
-        r'invoice\s+(?:for\s+)?(\w+)(?:\s*:\s*|\s+)(.+)',
-        message_lower
-    )
-    if invoice_match:
-        customer = invoice_match.group(1)
+            product = PRODUCT_SUFFIX_PATTERN.sub('', product)
+            residual = _residual_words(text, [match.span()])
+            return _result(intent, {
+                "quantity": _number(match.group(1)),
+                "product": product,
+                "price": _number(match.group(3))
+            }, _span_confidence(intent, residual))
+    return None
+
+def _match_sale(text: str):
+    return _match_transaction("record_sale", SALE_PATTERNS, text)
+
+def _match_purchase(text: str):
+    return _match_transaction("record_purchase", PURCHASE_PATTERNS, text)
+
+def _match_invoice(text: str):
+    for pattern in INVOICE_PATTERNS:
+        invoice_match = pattern.search(text)
+        if not invoice_match:
+            continue
+        customer = invoice_match.group(1).strip()
         items_str = invoice_match.group(2)
         items = []
-        
-        # Parse items like "5 rice at 80, 2 oil at 150"
-        item_pattern = r'(\d+\.?\d*)\s*(?:kg|pcs?)?\s*(\w+)\s*(?:at|@)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)'
-        for item_match in re.finditer(item_pattern, items_str):
+        item_spans = []
+        for item_match in INVOICE_ITEM_PATTERN.finditer(items_str):
             items.append({
-                "name": item_match.group(2),
-                "quantity": float(item_match.group(1)),
-                "price": float(item_match.group(3))
+                "name": item_match.group(2).strip(),
+                "quantity": _number(item_match.group(1)),
+                "price": _number(item_match.group(3))
             })
-        
-        if items:
-            return {
-                "intent": "create_invoice",
-                "entities": {"customer": customer, "items": items}
-            }
+            item_spans.append(item_match.span())
+        if not items:
+            continue
+        residual = [w for w in _residual_words(items_str, item_spans) if w != "and"]
+        residual += _residual_words(text[:invoice_match.start(2)], [invoice_match.span(1)])
+        residual = [w for w in residual if w not in ("invoice", "for", "create", "make")]
+        return _result("create_invoice", {"customer": customer, "items": items},
+                       _span_confidence("create_invoice", residual))
+    return None
+
+def _match_keyword(intent: str, pattern):
+    def rule(text: str):
+        if pattern.search(text):
+            return _result(intent, {}, _keyword_confidence(intent, text))
+        return None
+    return rule
+
+def _match_price(text: str):
+    price_match = PRICE_PATTERN.search(text)
+    if price_match:
+        return _result("recommend_price", {"product": price_match.group(1)},
+                       _keyword_confidence("recommend_price", text))
+    return None
+
+# Rules in priority order; only those triggered by the message are evaluated
+GRAMMAR = (
+    ("record_sale", _match_sale),
+    ("record_purchase", _match_purchase),
+    ("create_invoice", _match_invoice),
+    ("show_inventory", _match_keyword("show_inventory", INVENTORY_PATTERN)),
+    ("show_summary", _match_keyword("show_summary", SUMMARY_PATTERN)),
+    ("suggest_reorder", _match_keyword("suggest_reorder", REORDER_PATTERN)),
+    ("recommend_price", _match_price),
+)
+
+def _match_prefix(intent: str, prefixes: tuple, text: str):
+    for prefix in prefixes:
+        if text.startswith(prefix):
+            residual = _residual_words(text, [(0, len(prefix))])
+            return _result(intent, {}, _span_confidence(intent, residual))
+    return None
+
+def parse_with_regex(message: str) -> dict:
+    """Grammar-based intent parser.
+
+    One scan collects trigger words, then only the rules they point to run,
+    in priority order. The result carries a `confidence` between 0 and 1
+    describing how much of the message the matching rule explained.
+    """
+    text = message.lower().strip()
     
-    # Inventory patterns
-    if re.search(r'(show|list|view|check|my)\s*(inventory|products?|stock|items)', message_lower):
-        return {"intent": "show_inventory", "entities": {}}
+    if text.startswith(GREETING_PREFIXES):
+        return _match_prefix("greeting", GREETING_PREFIXES, text)
+    if text.startswith(HELP_PREFIXES):
+        return _match_prefix("help", HELP_PREFIXES, text)
     
-    # Summary patterns
-    if re.search(r'(summary|total|report|sales|today|daily)', message_lower):
-        return {"intent": "show_summary", "entities": {}}
+    candidates = set()
+    for trigger in TRIGGER_PATTERN.findall(text):
+        candidates.update(TRIGGERS[trigger])
     
-    # Reorder patterns
-    if re.search(r'(reorder|restock|low stock|what.*order|need.*buy)', message_lower):
-        return {"intent": "suggest_reorder", "entities": {}}
+    for intent, rule in GRAMMAR:
+        if intent in candidates:
+            result = rule(text)
+            if result:
+                return result
     
-    # Price recommendation patterns
-    price_match = re.search(r'(?:what|suggest).*price.*(?:for\s+)?(\w+)', message_lower)
-    if price_match:
-        return {
-            "intent": "recommend_price",
-            "entities": {"product": price_match.group(1)}
-        }
+    return _result("unknown", {}, 0.0)
+
+def _record_route(path: str, confidence: float):
+    """Count which path answered a message, bucketed by regex confidence"""
+    bucket = next(b for b in CONFIDENCE_BUCKETS if confidence <= b)
+    tracing.set_attribute("route", path)
+    tracing.set_attribute("confidence", confidence)
+    with _stats_lock:
+        _route_stats[path] += 1
+        _confidence_histogram[bucket] += 1
+
+def get_parser_stats() -> dict:
+    """Per-path hit counts and rates, for tuning INTENT_CONFIDENCE_THRESHOLD"""
+    with _stats_lock:
+        routes = dict(_route_stats)
+        histogram = {f"<={b}": n for b, n in _confidence_histogram.items()}
+    total = sum(routes.values())
+    return {
+        "threshold": INTENT_CONFIDENCE_THRESHOLD,
+        "total": total,
+        "routes": routes,
+        "hit_rates": {path: round(n / total, 4) if total else 0.0 for path, n in routes.items()},
+        "regex_confidence": histogram,
+        "cache": intent_cache.get_cache_stats(),
+        "llm": get_llm_stats()
+    }
+
+# Separators between commands in one message; a comma between digits
+# ("1,000") is part of a number, not a separator
+COMMAND_SEPARATOR_PATTERN = re.compile(r'\s*(?:(?<!\d)[,;]|[,;](?!\d)|\band\b|\bthen\b|\balso\b)\s*')
+COMMAND_START_PATTERN = re.compile(r'(?:sold?|bought|purchased?|restocked?|got|(?:create\s+|make\s+)?invoice)\b|\d')
+COMMAND_VERB_PATTERN = re.compile(r'\b(sold?|bought|purchased?|restocked?|got)\b')
+# An invoice always starts a new command, with or without a separator before it
+INVOICE_START_PATTERN = re.compile(r'\b(?:(?:create|make)\s+)?invoice\b')
+SPLIT_INTENTS = {"record_sale", "record_purchase", "create_invoice"}
+
+def _split_clauses(text: str) -> list:
+    """Cut the message at separators that are followed by a command, and before every invoice"""
+    cuts = {m.end(): m.start() for m in COMMAND_SEPARATOR_PATTERN.finditer(text)
+            if COMMAND_START_PATTERN.match(text, m.end())}
+    for m in INVOICE_START_PATTERN.finditer(text):
+        if m.start() > 0:
+            cuts.setdefault(m.start(), m.start())
+    clauses, start = [], 0
+    for end in sorted(cuts):
+        clauses.append(text[start:cuts[end]])
+        start = end
+    clauses.append(text[start:])
+    return [clause for clause in clauses if clause.strip()]
+
+def parse_commands_with_regex(message: str) -> list:
+    """Split a message into sale, purchase and invoice commands and parse each one.
+
+    "sold 5 rice at 80, 2 oil at 150 and bought 20 sugar at 90" gives three
+    commands; a clause without its own verb inherits the previous one, and
+    after an invoice it is another line of that invoice. "invoice for ali:
+    2 rice at 85; invoice for bilal: 3 sugar at 100" gives two invoices.
+    When the message does not split cleanly into these commands the whole
+    message is parsed as a single command.
+    """
+    text = message.lower().strip()
+    single = [parse_with_regex(message)]
+    
+    clauses = _split_clauses(text)
+    if len(clauses) < 2:
+        return single
     
-    return {"intent": "unknown", "entities": {}}
-
-def parse_intent(message: str) -> dict:
-    """Main intent parsing function"""
-    # Try Groq API first if available
-    if GROQ_API_KEY:
-        result = parse_with_groq(message)
-        if result and result.get("intent") != "unknown":
-            logger.debug(f"Groq parsed: {result}")
-            return result
+    commands, verb = [], None
+    for clause in clauses:
+        if INVOICE_START_PATTERN.match(clause):
+            verb = "invoice"
+        else:
+            found = COMMAND_VERB_PATTERN.search(clause)
+            if found:
+                verb = found.group(1)
+            elif verb == "invoice":
+                commands[-1] = f"{commands[-1]}, {clause}"
+                continue
+            elif verb:
+                clause = f"{verb} {clause}"
+        commands.append(clause)
     
-    # Fallback to regex
-    result = parse_with_regex(message)
-    logger.debug(f"Regex parsed: {result}")
-    return result
+    results = [parse_with_regex(command) for command in commands]
+    if any(result["intent"] not in SPLIT_INTENTS for result in results):
+        return single
+    return results
+
+@tracing.traced("parse_intents")
+def parse_intents(message: str, user_id: int = None) -> list:
+    """Main intent parsing function; returns one intent per command in the message.
+
+    The regex parser runs first; below INTENT_CONFIDENCE_THRESHOLD the shop's
+    intent cache is checked, and only then is the LLM consulted.
+    """
+    results = parse_commands_with_regex(message)
+    confidence = min(r.get("confidence", 0.0) for r in results)
+    
+    if confidence >= INTENT_CONFIDENCE_THRESHOLD or not GROQ_API_KEY:
+        _record_route("regex", confidence)
+        logger.debug("Regex parsed (%s): %s", confidence, results)
+        return results
+    
+    if user_id is not None:
+        cached = intent_cache.lookup(user_id, message)
+        if cached:
+            _record_route("cache", confidence)
+            logger.debug("Cache parsed: %s", cached)
+            return cached
+    
+    llm_results = parse_with_groq(message)
+    if llm_results:
+        llm_results = [r for r in llm_results if r.get("intent") != "unknown"]
+    if llm_results:
+        _record_route("llm", confidence)
+        logger.debug("Groq parsed: %s", llm_results)
+        if user_id is not None:
+            intent_cache.store(user_id, message, llm_results)
+        return llm_results
+    
+    # LLM failed or could not understand either - keep the regex answer
+    _record_route("regex_fallback", confidence)
+    logger.debug("Regex fallback (%s): %s", confidence, results)
+    return results
+
+def parse_intent(message: str, user_id: int = None) -> dict:
+    """Parse a message expected to hold a single command"""
+    return parse_intents(message, user_id)[0]
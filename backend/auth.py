@@ -1,6 +1,22 @@
 """
 Authentication and authorization module
+
+Verified tokens and the users they name are cached in memory, so an
+authenticated request normally needs no signature check and no query. A
+principal is reloaded after AUTH_CACHE_TTL seconds. When an admin changes
+an account, the change is recorded against a shared epoch in the database.
+Each worker polls that epoch every AUTH_EPOCH_CHECK_INTERVAL seconds and
+drops only the accounts that changed.
+
+bcrypt takes a few hundred milliseconds of CPU, so logins and signups hash
+on a small thread pool instead of the event loop, behind per-IP and
+per-account rate limits and a bounded queue.
 """
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -8,11 +24,30 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_CACHE_TTL, AUTH_EPOCH_CHECK_INTERVAL, AUTH_TOKEN_CACHE_SIZE,
+    BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+    LOGIN_RATE_PER_IP, LOGIN_RATE_PER_ACCOUNT, SIGNUP_RATE_PER_IP
+)
+from rate_limiter import RateLimiter
+from metrics import PASSWORD_HASH_LATENCY, register_collector
 from logger_config import logger
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so these threads hash in parallel with the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_pending = 0
+_hash_lock = threading.Lock()
+
+login_ip_limiter = RateLimiter("login-ip", LOGIN_RATE_PER_IP)
+login_account_limiter = RateLimiter("login-account", LOGIN_RATE_PER_ACCOUNT)
+signup_ip_limiter = RateLimiter("signup-ip", SIGNUP_RATE_PER_IP)
+
+class PasswordHashBusy(Exception):
+    """Raised instead of queueing more password hashes than PASSWORD_HASH_QUEUE"""
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -20,12 +55,17 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 # Re-export for convenience
 ACCESS_TOKEN_EXPIRE_MINUTES = ACCESS_TOKEN_EXPIRE_MINUTES
 
+_principals = {}  # user_id -> (user, expires_at)
+_tokens = OrderedDict()  # token -> (user_id, exp), least recently used first
+_cache_lock = threading.Lock()
+_epoch = {"value": None, "checked_at": 0.0}
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        logger.error(f"Password verification error: {e}")
+        logger.error("Password verification error: %s", e)
         return False
 
 def get_password_hash(password: str) -> str:
@@ -33,9 +73,66 @@ def get_password_hash(password: str) -> str:
     try:
         return pwd_context.hash(password)
     except Exception as e:
-        logger.error(f"Password hashing error: {e}")
+        logger.error("Password hashing error: %s", e)
         raise
 
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Verify a password; returns (valid, new_hash) where new_hash is set if the stored hash is outdated"""
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.error("Password verification error: %s", e)
+        return False, None
+
+def rehash_password(user_id: int, new_hash: str):
+    """Store an upgraded hash; a failure only means the upgrade is retried at the next login"""
+    conn = None
+    try:
+        from database import get_db_connection
+        conn = get_db_connection()
+        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, user_id))
+        conn.commit()
+        logger.info("Password hash upgraded for user %s", user_id)
+    except Exception as e:
+        logger.warning("Password rehash error: %s", e)
+    finally:
+        if conn:
+            conn.close()
+
+async def _run_hashing(function, *args):
+    """Run a bcrypt call on the hashing pool, refusing work once the queue is full"""
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+            raise PasswordHashBusy(f"{_hash_pending} password hashes already pending")
+        _hash_pending += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, function, *args)
+    finally:
+        PASSWORD_HASH_LATENCY.observe(time.perf_counter() - start, function.__name__)
+        with _hash_lock:
+            _hash_pending -= 1
+
+async def check_password(plain_password: str, hashed_password: str):
+    """verify_and_update_password on the hashing pool"""
+    return await _run_hashing(verify_and_update_password, plain_password, hashed_password)
+
+async def hash_password(password: str) -> str:
+    """get_password_hash on the hashing pool"""
+    return await _run_hashing(get_password_hash, password)
+
+def enforce_rate_limit(limiter: RateLimiter, key: str):
+    """Raise 429 with Retry-After if `key` is over the limiter's rate"""
+    retry_after = limiter.acquire(key)
+    if retry_after:
+        logger.warning("Rate limited (%s): %s", limiter.name, key)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again shortly",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     try:
@@ -48,7 +145,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     except Exception as e:
-        logger.error(f"Token creation error: {e}")
+        logger.error("Token creation error: %s", e)
         raise
 
 def get_user_by_id(user_id: int) -> Optional[dict]:
@@ -75,9 +172,82 @@ def get_user_by_id(user_id: int) -> Optional[dict]:
             }
         return None
     except Exception as e:
-        logger.error(f"Get user error: {e}")
+        logger.error("Get user error: %s", e)
         return None
 
+def _decode_user_id(token: str) -> Optional[str]:
+    """The token's subject, verifying the signature only the first time a token is seen"""
+    now = time.time()
+    with _cache_lock:
+        cached = _tokens.get(token)
+        if cached is not None:
+            if cached[1] > now:
+                _tokens.move_to_end(token)
+                return cached[0]
+            del _tokens[token]
+
+    # Raises JWTError (ExpiredSignatureError included) for a bad token
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    user_id = payload.get("sub")
+    if user_id is not None and payload.get("exp"):
+        with _cache_lock:
+            _tokens[token] = (user_id, payload["exp"])
+            while len(_tokens) > AUTH_TOKEN_CACHE_SIZE:
+                _tokens.popitem(last=False)
+    return user_id
+
+def _sync_epoch():
+    """Drop cached principals changed by any worker since the last check"""
+    now = time.monotonic()
+    if now - _epoch["checked_at"] < AUTH_EPOCH_CHECK_INTERVAL:
+        return
+    _epoch["checked_at"] = now
+    conn = None
+    try:
+        from database import get_db_connection
+        conn = get_db_connection()
+        epoch = conn.execute("SELECT epoch FROM auth_state WHERE id = 1").fetchone()[0]
+        known = _epoch["value"]
+        if known is not None and epoch != known:
+            changed = conn.execute("SELECT id FROM users WHERE auth_version > ?", (known,)).fetchall()
+            with _cache_lock:
+                for (user_id,) in changed:
+                    _principals.pop(user_id, None)
+        _epoch["value"] = epoch
+    except Exception as e:
+        # Cached principals still expire after AUTH_CACHE_TTL
+        logger.warning("Auth epoch check error: %s", e)
+    finally:
+        if conn:
+            conn.close()
+
+def get_principal(user_id: int) -> Optional[dict]:
+    """The user's account row, from the principal cache when fresh"""
+    _sync_epoch()
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _principals.get(user_id)
+        if cached is not None and cached[1] > now:
+            return dict(cached[0])
+
+    user = get_user_by_id(user_id)
+    if user is not None:
+        with _cache_lock:
+            _principals[user_id] = (user, now + AUTH_CACHE_TTL)
+    return user
+
+def mark_user_changed(cursor, user_id: int):
+    """Record an account change in the caller's transaction so every worker reloads the user"""
+    cursor.execute("UPDATE auth_state SET epoch = epoch + 1 WHERE id = 1")
+    cursor.execute("""
+        UPDATE users SET auth_version = (SELECT epoch FROM auth_state WHERE id = 1) WHERE id = ?
+    """, (user_id,))
+
+def invalidate_user(user_id: int):
+    """Drop a user from this worker's principal cache"""
+    with _cache_lock:
+        _principals.pop(user_id, None)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
@@ -87,25 +257,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        user_id = _decode_user_id(token)
         if user_id is None:
             logger.warning("JWT token missing user_id")
             raise credentials_exception
     except JWTError as e:
-        logger.warning(f"JWT decode error: {e}")
+        logger.warning("JWT decode error: %s", e)
         raise credentials_exception
     except Exception as e:
-        logger.error(f"Unexpected error decoding JWT: {e}")
+        logger.error("Unexpected error decoding JWT: %s", e)
         raise credentials_exception
     
-    user = get_user_by_id(int(user_id))
+    user = get_principal(int(user_id))
     if user is None:
-        logger.warning(f"User {user_id} not found")
+        logger.warning("User %s not found", user_id)
         raise credentials_exception
     
     if not user["is_active"]:
-        logger.warning(f"Inactive user {user_id} tried to access")
+        logger.warning("Inactive user %s tried to access", user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is inactive"
@@ -121,3 +290,16 @@ async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
             detail="Admin access required"
         )
     return current_user
+
+def _collect_metrics() -> list:
+    with _cache_lock:
+        principals, tokens = len(_principals), len(_tokens)
+    with _hash_lock:
+        pending = _hash_pending
+    return [
+        ("auth_cache_entries", "gauge", "Verified tokens and cached principals",
+         [({"cache": "tokens"}, tokens), ({"cache": "principals"}, principals)]),
+        ("password_hash_pending", "gauge", "Password hashes running or waiting for a thread", [({}, pending)]),
+    ]
+
+register_collector(_collect_metrics)
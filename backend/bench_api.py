@@ -0,0 +1,352 @@
+"""
+API load test - throughput and latency percentiles per endpoint
+
+Seeds a fresh database, then runs the API either in this process (over
+ASGI) or as a uvicorn server with worker processes. Virtual users replay a
+weighted mix of requests:
+- /chat: sales, purchases, invoices, and free-form messages that go to
+  the LLM;
+- /inventory, /summary and /notifications/low-stock polls;
+- logins.
+
+Each virtual user works as one of the seeded shops, naming that shop's
+products. Groq is replaced by groq_stub.py in a subprocess, with fixed
+--groq-latency, so runs are comparable. A run is deterministic for a given
+--seed, apart from timing.
+
+Results are written as JSON. --compare against an earlier file prints the
+change in p50, p95 and throughput for each endpoint. It exits with status
+1 when one has regressed by more than --tolerance.
+
+Run: python bench_api.py [--mode inprocess|uvicorn] [--shops 20] [--products 50] [--days 90]
+                         [--users 16] [--duration 20] [--out results.json] [--compare baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = "bench-secret"
+
+# Request kind -> relative weight; chat kinds pick a message from CHAT_TEMPLATES
+DEFAULT_MIX = {
+    "chat_sale": 30,
+    "chat_purchase": 10,
+    "chat_invoice": 8,
+    "chat_llm": 4,
+    "inventory": 20,
+    "summary": 12,
+    "notifications": 12,
+    "login": 4,
+}
+
+CHAT_TEMPLATES = {
+    "chat_sale": ["sold {q} {p} at {price}", "sold {q} {p} at {price} and sold {q2} {p2} at {price2}"],
+    "chat_purchase": ["bought {q} {p} at {cost}", "restocked {q} {p} at {cost}"],
+    "chat_invoice": ["invoice for {customer}: {q} {p} at {price}, {q2} {p2} at {price2}"],
+    # Below the regex confidence threshold, so these go to the (stubbed) LLM
+    "chat_llm": ["my neighbour took some {p} and paid {price} each", "how is business going this week?"],
+}
+
+CHAT_FAILURE = "Sorry, something went wrong"
+
+CUSTOMERS = ["Ali Hassan", "Bilal Ahmed", "Sana Malik", "Usman", "Ayesha Khan", "Kamran"]
+
+SALES_PER_DAY = 18  # average per shop in the seeded history
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def seed_database(shops: int, products: int, days: int, seed: int) -> list:
+    """Fill the (fresh) database at DB_PATH with data_generator; returns the shop emails"""
+    from data_generator import generate
+    totals = generate(shops, products, days / 365, SALES_PER_DAY, seed, email_domain="bench.example.com",
+                      password=PASSWORD, shop_type="general")
+    return totals["emails"]
+
+def chat_message(kind: str, rng: random.Random, items: list) -> str:
+    (p, cost, price), (p2, _, price2) = rng.sample(items, 2)
+    return rng.choice(CHAT_TEMPLATES[kind]).format(
+        p=p, p2=p2, q=rng.randint(1, 5), q2=rng.randint(1, 5), price=price, price2=price2,
+        cost=cost, customer=rng.choice(CUSTOMERS)
+    )
+
+async def request_once(client, kind: str, shop: dict, rng: random.Random, items: list):
+    headers = {"Authorization": f"Bearer {shop['token']}"}
+    if kind.startswith("chat_"):
+        return await client.post("/chat", json={"message": chat_message(kind, rng, items)}, headers=headers)
+    if kind == "inventory":
+        return await client.get("/inventory", headers=headers)
+    if kind == "summary":
+        return await client.get("/summary", headers=headers)
+    if kind == "notifications":
+        return await client.get("/notifications/low-stock", headers=headers)
+    if kind == "login":
+        response = await client.post("/login", data={"username": shop["email"], "password": PASSWORD})
+        if response.status_code == 200:
+            shop["token"] = response.json()["access_token"]
+        return response
+    raise ValueError(f"Unknown request kind: {kind}")
+
+async def virtual_user(index: int, client, shop: dict, mix: dict, items: list, seed: int,
+                       deadline: float, warmup_until: float, think: float, results: dict):
+    """Closed loop: send the next request as soon as the previous one completes (plus think time)"""
+    rng = random.Random(seed * 1000 + index)
+    kinds, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await request_once(client, kind, shop, rng, items)
+            status = response.status_code
+            if status == 200 and kind.startswith("chat_") and response.json().get("response", "").startswith(CHAT_FAILURE):
+                # process_chat_message reports its own failures with a 200
+                status = "chat_error"
+        except Exception as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        if start >= warmup_until:
+            record = results.setdefault(kind, {"latencies": [], "statuses": {}})
+            record["latencies"].append(finished - start)
+            record["statuses"][str(status)] = record["statuses"].get(str(status), 0) + 1
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+async def run_load(client, emails: list, args) -> tuple:
+    from data_generator import catalog
+    items = catalog("general", args.products)
+    shops = []
+    for email in emails[:args.users]:
+        response = await client.post("/login", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        shops.append({"email": email, "token": response.json()["access_token"]})
+
+    results = {}
+    start = time.perf_counter()
+    warmup_until = start + args.warmup
+    deadline = warmup_until + args.duration
+    await asyncio.gather(*(
+        virtual_user(index, client, shops[index % len(shops)], args.mix, items, args.seed,
+                     deadline, warmup_until, args.think, results)
+        for index in range(args.users)
+    ))
+    return results, time.perf_counter() - warmup_until
+
+def summarize(results: dict, elapsed: float) -> dict:
+    endpoints = {}
+    for kind, record in sorted(results.items()):
+        latencies = record["latencies"]
+        errors = sum(n for status, n in record["statuses"].items() if not status.startswith("2"))
+        endpoints[kind] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": record["statuses"],
+            "rps": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            **{f"p{int(p * 100)}_ms": round(percentile(latencies, p) * 1000, 2) for p in (0.5, 0.9, 0.95, 0.99)},
+            "max_ms": round(max(latencies) * 1000, 2)
+        }
+    everything = [value for record in results.values() for value in record["latencies"]]
+    total = {
+        "requests": len(everything),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "rps": round(len(everything) / elapsed, 2),
+        "p50_ms": round(percentile(everything, 0.5) * 1000, 2) if everything else None,
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 2) if everything else None,
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 2) if everything else None
+    }
+    return {"endpoints": endpoints, "total": total}
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Print changes against a baseline run; returns the regressions beyond `tolerance`"""
+    regressions = []
+    print(f"\n[*] Compared with {baseline['meta'].get('started_at')} ({baseline['meta'].get('git_commit')})")
+    settings = ("mode", "workers", "users", "shops", "products", "days", "think", "mix", "groq_latency")
+    differing = [key for key in settings
+                 if baseline["meta"]["args"].get(key) != current["meta"]["args"].get(key)]
+    if differing:
+        print(f"  [!] Runs differ in {', '.join(differing)}; the comparison is not like for like")
+    for kind, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(kind)
+        if not before:
+            continue
+        changes = []
+        for metric, worse_if_higher in (("p50_ms", True), ("p95_ms", True), ("rps", False)):
+            if not before[metric]:
+                continue
+            change = (now[metric] - before[metric]) / before[metric]
+            changes.append(f"{metric} {change:+.0%}")
+            if (change if worse_if_higher else -change) > tolerance:
+                regressions.append(f"{kind} {metric} {before[metric]} -> {now[metric]}")
+        print(f"    {kind:15s} {'  '.join(changes)}")
+    return regressions
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def wait_until_up(url: str, timeout: float = 60.0):
+    """Wait until `url` answers at all (the stub has no GET routes, so any status counts)"""
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_groq_stub(latency: float):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "groq_stub.py", "--port", str(port), "--latency", str(latency)],
+                               cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(url)
+    except Exception:
+        process.terminate()
+        raise
+    return process, url
+
+async def run_inprocess(emails: list, args) -> tuple:
+    import httpx
+    import main as app_module
+    await app_module.startup_event()
+    transport = httpx.ASGITransport(app=app_module.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+            return await run_load(client, emails, args)
+    finally:
+        await app_module.shutdown_event()
+
+async def run_server(base_url: str, emails: list, args) -> tuple:
+    import httpx
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        return await run_load(client, emails, args)
+
+def parse_mix(text: str) -> dict:
+    """'chat_sale=30,inventory=20' -> weights; omitted kinds are not sent"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown request kind '{name}' (one of {', '.join(DEFAULT_MIX)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--shops", type=int, default=20)
+    parser.add_argument("--products", type=int, default=50, help="Products per shop")
+    parser.add_argument("--days", type=int, default=90, help="Days of sales history per shop")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean seconds between a user's requests")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Weights, e.g. chat_sale=30,inventory=20 (default: %(default)s)")
+    parser.add_argument("--groq-latency", type=float, default=0.3, help="Seconds the Groq stub takes per call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression before exit status 1")
+    args = parser.parse_args(argv)
+    args.shops = max(args.shops, 1)
+
+    stub, stub_url = start_groq_stub(args.groq_latency)
+    db_dir = tempfile.mkdtemp(prefix="bench_api_")
+    env = {
+        "DB_PATH": os.path.join(db_dir, "bench.db"),
+        "GROQ_API_KEY": "stub",
+        "GROQ_BASE_URL": stub_url,
+        "TRANSLATION_WARMUP": "False",
+        "LOG_LEVEL": "WARNING",
+        # Logins in the mix come from one client address
+        "LOGIN_RATE_PER_IP": "1000000",
+        "LOGIN_RATE_PER_ACCOUNT": "1000000",
+    }
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+    server = None
+    try:
+        started = time.perf_counter()
+        emails = seed_database(args.shops, args.products, args.days, args.seed)
+        seed_seconds = time.perf_counter() - started
+        print(f"[*] Seeded {args.shops} shops x {args.products} products, {args.days} days in {seed_seconds:.1f}s")
+
+        if args.mode == "uvicorn":
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+                cwd=BACKEND_DIR, env=dict(os.environ)
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_up(f"{base_url}/health")
+            results, elapsed = asyncio.run(run_server(base_url, emails, args))
+        else:
+            results, elapsed = asyncio.run(run_inprocess(emails, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        stub.terminate()
+
+    report = summarize(results, elapsed)
+    report["meta"] = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "seed_seconds": round(seed_seconds, 2),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    }
+
+    mode = f"uvicorn x{args.workers}" if args.mode == "uvicorn" else "in-process"
+    print(f"[*] {mode}, {args.users} users for {args.duration:.0f}s, Groq stub {args.groq_latency * 1000:.0f} ms")
+    print(f"    {'endpoint':15s} {'reqs':>6s} {'err':>4s} {'rps':>7s} {'p50':>8s} {'p90':>8s} {'p95':>8s} "
+          f"{'p99':>8s} {'max':>8s}")
+    for kind, e in report["endpoints"].items():
+        print(f"    {kind:15s} {e['requests']:6d} {e['errors']:4d} {e['rps']:7.1f} {e['p50_ms']:6.1f}ms "
+              f"{e['p90_ms']:6.1f}ms {e['p95_ms']:6.1f}ms {e['p99_ms']:6.1f}ms {e['max_ms']:6.1f}ms")
+    total = report["total"]
+    print(f"    {'total':15s} {total['requests']:6d} {total['errors']:4d} {total['rps']:7.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[+] Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"  [!] Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
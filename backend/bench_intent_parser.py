@@ -0,0 +1,210 @@
+"""
+Intent parser micro-benchmark - grammar engine vs. the sequential regex parser
+
+Times parse_with_regex over a corpus of real message shapes and checks that
+its results match the parser it replaced. Messages listed in IMPROVED are
+ones the old parser got wrong (multi-word invoice items and customers) and
+are reported rather than counted as mismatches.
+
+Run: python bench_intent_parser.py [--rounds 2000]
+"""
+import re
+import sys
+import time
+import argparse
+from ai_intent_parser import (
+    parse_with_regex, _residual_words, _span_confidence, _keyword_confidence, _result
+)
+
+CORPUS = [
+    "hi",
+    "hello",
+    "good morning",
+    "help",
+    "what can you do",
+    "sold 5 rice at 80",
+    "Sold 5 rice at 80",
+    "sold 2 cooking oil at 320",
+    "sold 5 kg rice at 85 each",
+    "sold 3 pieces of soap at rs 45",
+    "sold 12 eggs @ 20",
+    "sold 1.5 kg sugar for 105",
+    "I sold 10 biscuits at 35",
+    "5 rice sold at 80",
+    "sold 5 rice at 80 and bought 20 sugar at 90",
+    "bought 50 rice at 70",
+    "bought 20 cooking oil at 280",
+    "purchased 100 sugar at 90",
+    "restocked 30 kg wheat flour at 55",
+    "got 24 cold drinks at 40",
+    "bought 10 notebooks at 25 each",
+    "invoice for ahmed: 5 rice at 80, 2 oil at 150",
+    "invoice for bilal: 3 rice at 85",
+    "invoice ahmed 2 sugar at 105, 1 tea at 520",
+    "invoice for ahmed: 5 rice at 80, 2 cooking oil at 150",
+    "Invoice for Ali Hassan: 3 kg of sugar @ 90, 1 tea at 520",
+    "show inventory",
+    "show my inventory",
+    "list products",
+    "check stock",
+    "today's summary",
+    "daily report",
+    "total sales today",
+    "what to reorder?",
+    "low stock",
+    "what should i order",
+    "need to buy anything?",
+    "what price for rice",
+    "What price for cooking oil?",
+    "suggest price for sugar",
+    "thanks",
+    "can you tell me how my sales went compared to yesterday",
+    "asdf qwerty",
+]
+
+# Messages whose results are expected to differ from the old parser
+IMPROVED = {
+    "invoice for ahmed: 5 rice at 80, 2 cooking oil at 150",
+    "Invoice for Ali Hassan: 3 kg of sugar @ 90, 1 tea at 520",
+}
+
+def legacy_parse_with_regex(message: str) -> dict:
+    """The sequential re.match/re.search parser the grammar engine replaced"""
+    message_lower = message.lower().strip()
+    
+    # Greeting patterns
+    match = re.match(r'^(hi|hello|hey|good morning|good evening)', message_lower)
+    if match:
+        residual = _residual_words(message_lower, [match.span()])
+        return _result("greeting", {}, _span_confidence("greeting", residual))
+    
+    # Help patterns
+    match = re.match(r'^(help|what can you do|commands)', message_lower)
+    if match:
+        residual = _residual_words(message_lower, [match.span()])
+        return _result("help", {}, _span_confidence("help", residual))
+    
+    # Sale patterns - improved to capture multi-word product names
+    sale_patterns = [
+        # "sold 5 kg cooking oil at 80" or "sold 5 rice at 80"
+        r'sold?\s+(\d+\.?\d*)\s*(?:kg|pieces?|pcs?|units?)?\s*(?:of\s+)?(.+?)\s+(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
+        # "5 rice sold at 80"
+        r'(\d+\.?\d*)\s+(.+?)\s+sold\s*(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
+    ]
+    
+    for pattern in sale_patterns:
+        match = re.search(pattern, message_lower)
+        if match:
+            product = match.group(2).strip()
+            # Clean up product name - remove trailing words like "each", "per"
+            product = re.sub(r'\s+(each|per|piece|kg|unit)s?$', '', product)
+            residual = _residual_words(message_lower, [match.span()])
+            return _result("record_sale", {
+                "quantity": float(match.group(1)),
+                "product": product,
+                "price": float(match.group(3))
+            }, _span_confidence("record_sale", residual))
+    
+    # Purchase patterns - improved to capture multi-word product names
+    purchase_patterns = [
+        # "bought 10 cooking oil at 280" or "bought 10 kg rice at 70"
+        r'(?:bought|purchased?|restocked?|got)\s+(\d+\.?\d*)\s*(?:kg|pieces?|pcs?|units?)?\s*(?:of\s+)?(.+?)\s+(?:at|@|for)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)',
+    ]
+    
+    for pattern in purchase_patterns:
+        match = re.search(pattern, message_lower)
+        if match:
+            product = match.group(2).strip()
+            # Clean up product name - remove trailing words like "each", "per"
+            product = re.sub(r'\s+(each|per|piece|kg|unit)s?$', '', product)
+            residual = _residual_words(message_lower, [match.span()])
+            return _result("record_purchase", {
+                "quantity": float(match.group(1)),
+                "product": product,
+                "price": float(match.group(3))
+            }, _span_confidence("record_purchase", residual))
+    
+    # Invoice patterns
+    invoice_match = re.search(
+        r'invoice\s+(?:for\s+)?(\w+)(?:\s*:\s*|\s+)(.+)',
+        message_lower
+    )
+    if invoice_match:
+        customer = invoice_match.group(1)
+        items_str = invoice_match.group(2)
+        items = []
+        item_spans = []
+        
+        # Parse items like "5 rice at 80, 2 oil at 150"
+        item_pattern = r'(\d+\.?\d*)\s*(?:kg|pcs?)?\s*(\w+)\s*(?:at|@)\s*(?:rs\.?|₹)?\s*(\d+\.?\d*)'
+        for item_match in re.finditer(item_pattern, items_str):
+            items.append({
+                "name": item_match.group(2),
+                "quantity": float(item_match.group(1)),
+                "price": float(item_match.group(3))
+            })
+            item_spans.append(item_match.span())
+        
+        if items:
+            residual = _residual_words(items_str, item_spans)
+            residual = [w for w in residual if w != "and"]
+            residual += _residual_words(message_lower[:invoice_match.start(2)], [invoice_match.span(1)])
+            residual = [w for w in residual if w not in ("invoice", "for", "create", "make")]
+            return _result("create_invoice", {"customer": customer, "items": items},
+                           _span_confidence("create_invoice", residual))
+    
+    # Inventory patterns
+    if re.search(r'(show|list|view|check|my)\s*(inventory|products?|stock|items)', message_lower):
+        return _result("show_inventory", {}, _keyword_confidence("show_inventory", message_lower))
+    
+    # Summary patterns
+    if re.search(r'(summary|total|report|sales|today|daily)', message_lower):
+        return _result("show_summary", {}, _keyword_confidence("show_summary", message_lower))
+    
+    # Reorder patterns
+    if re.search(r'(reorder|restock|low stock|what.*order|need.*buy)', message_lower):
+        return _result("suggest_reorder", {}, _keyword_confidence("suggest_reorder", message_lower))
+    
+    # Price recommendation patterns
+    price_match = re.search(r'(?:what|suggest).*?price\s*(?:for|of)?\s+([a-z][\w ]*?)[\s?.!]*$', message_lower)
+    if price_match:
+        return _result("recommend_price", {"product": price_match.group(1)},
+                       _keyword_confidence("recommend_price", message_lower))
+    
+    return _result("unknown", {}, 0.0)
+
+def time_parser(parse, corpus: list, rounds: int) -> float:
+    """Average microseconds per message"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in corpus:
+            parse(message)
+    return (time.perf_counter() - start) / (rounds * len(corpus)) * 1e6
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Intent parser micro-benchmark")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    for message in CORPUS:
+        new, old = parse_with_regex(message), legacy_parse_with_regex(message)
+        if new == old:
+            continue
+        if message in IMPROVED:
+            print(f"  [~] improved: {message!r}\n      old: {old}\n      new: {new}")
+        else:
+            mismatches += 1
+            print(f"  [!] mismatch: {message!r}\n      old: {old}\n      new: {new}")
+
+    legacy_us = time_parser(legacy_parse_with_regex, CORPUS, args.rounds)
+    grammar_us = time_parser(parse_with_regex, CORPUS, args.rounds)
+
+    print(f"\n[*] {len(CORPUS)} messages x {args.rounds} rounds")
+    print(f"    sequential regex: {legacy_us:8.2f} us/message")
+    print(f"    grammar engine:   {grammar_us:8.2f} us/message ({legacy_us / grammar_us:.1f}x)")
+    print(f"    mismatches:       {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
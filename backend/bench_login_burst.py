@@ -0,0 +1,111 @@
+"""
+Login burst load test - /inventory latency while many users log in at once
+
+Drives the app in-process over ASGI. One client polls /inventory steadily,
+first on an idle server and then while a burst of logins from several IPs
+runs concurrently. With bcrypt on the event loop every poll waits behind
+the hashes; on the hashing pool the polls stay fast, and logins over the
+rate limits or the queue bound are refused with 429/503.
+
+--inline runs bcrypt on the event loop as before, for comparison. Uses a
+throwaway database unless DB_PATH is set.
+
+Run: python bench_login_burst.py [--logins 60] [--ips 6] [--polls 40] [--inline]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_login.db"))
+os.environ.setdefault("TRANSLATION_WARMUP", "False")
+
+import httpx
+import auth
+import main as app_module
+from database import init_database
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def client_for(ip: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app_module.app, client=(ip, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+async def poll_inventory(client, headers, polls: int, interval: float) -> list:
+    """Issue polls on a fixed schedule; latency counts from when each poll was due,
+    so time the event loop spent blocked before sending it is included"""
+    async def one_poll(due: float) -> float:
+        response = await client.get("/inventory", headers=headers)
+        response.raise_for_status()
+        return time.perf_counter() - due
+
+    start, tasks = time.perf_counter(), []
+    for index in range(polls):
+        due = start + index * interval
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tasks.append(asyncio.create_task(one_poll(due)))
+    return await asyncio.gather(*tasks)
+
+async def run(args) -> dict:
+    init_database()
+    shop = client_for("10.0.0.1")
+    users = [f"burst{i}@bench.example.com" for i in range(args.accounts)]
+    for index, email in enumerate(users + ["poller@bench.example.com"]):
+        # Each signup from its own IP, so setup stays under the signup rate limit
+        async with client_for(f"10.0.2.{index}") as client:
+            await client.post("/signup", json={"name": "Bench", "email": email, "password": "secret123",
+                                               "shop_name": "Bench"})
+    login = await shop.post("/login", data={"username": "poller@bench.example.com", "password": "secret123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    idle = await poll_inventory(shop, headers, args.polls, args.interval)
+
+    clients = [client_for(f"10.0.1.{i}") for i in range(args.ips)]
+
+    async def one_login(index: int):
+        client = clients[index % len(clients)]
+        response = await client.post("/login", data={"username": users[index % len(users)], "password": "secret123"})
+        return response.status_code
+
+    start = time.perf_counter()
+    poller = asyncio.create_task(poll_inventory(shop, headers, args.polls, args.interval))
+    statuses = Counter(await asyncio.gather(*(one_login(i) for i in range(args.logins))))
+    burst_seconds = time.perf_counter() - start
+    during = await poller
+    for client in clients + [shop]:
+        await client.aclose()
+    return {"idle": idle, "during": during, "statuses": statuses, "burst_seconds": burst_seconds}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Login burst load test")
+    parser.add_argument("--logins", type=int, default=60, help="Concurrent login attempts in the burst")
+    parser.add_argument("--ips", type=int, default=6, help="Client IPs the burst comes from")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--polls", type=int, default=40, help="/inventory requests per phase")
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between polls")
+    parser.add_argument("--inline", action="store_true", help="Hash on the event loop (the old behaviour)")
+    args = parser.parse_args(argv)
+
+    if args.inline:
+        async def inline(function, *call_args):
+            return function(*call_args)
+        auth._run_hashing = inline
+
+    result = asyncio.run(run(args))
+    mode = "bcrypt on the event loop" if args.inline else "bcrypt on the hashing pool"
+    print(f"[*] {args.logins} logins from {args.ips} IPs, {mode}, rounds {auth.BCRYPT_ROUNDS}")
+    for phase in ("idle", "during"):
+        latencies = result[phase]
+        print(f"    /inventory {phase:7s} p50 {percentile(latencies, 0.5) * 1000:7.1f} ms   "
+              f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms   max {max(latencies) * 1000:7.1f} ms")
+    statuses = ", ".join(f"{code}: {count}" for code, count in sorted(result["statuses"].items()))
+    print(f"    login statuses {statuses} in {result['burst_seconds']:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
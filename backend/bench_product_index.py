@@ -0,0 +1,78 @@
+"""
+Product index micro-benchmark - name resolution over a large catalogue
+
+Builds an in-memory index of synthetic product names (brand, variant, item,
+pack size) and times exact, typo and unknown-name lookups against it.
+
+Run: python bench_product_index.py [--products 20000] [--lookups 500]
+"""
+import sys
+import time
+import random
+import argparse
+from product_index import ShopIndex
+
+BRANDS = ["national", "shan", "nestle", "olpers", "dalda", "habib", "tapal", "lipton", "knorr", "kolson",
+          "sufi", "eva", "mezan", "rafhan", "peek freans", "coca cola", "pepsi", "sprite", "fanta", "lu"]
+VARIANTS = ["premium", "classic", "gold", "fresh", "pure", "super", "royal", "daily", "special", "organic", ""]
+ITEMS = ["cooking oil", "basmati rice", "sugar", "tea", "milk", "biscuits", "ketchup", "noodles", "salt",
+         "flour", "ghee", "lentils", "chickpeas", "soap", "shampoo", "detergent", "juice", "chips", "jam"]
+SIZES = ["250g", "500g", "1kg", "2kg", "5kg", "1l", "1.5l", "2l", "5l", "12pc", "24pc", ""]
+
+def make_catalogue(count: int, rng: random.Random) -> list:
+    names = set()
+    while len(names) < count:
+        parts = [rng.choice(BRANDS), rng.choice(VARIANTS), rng.choice(ITEMS), rng.choice(SIZES)]
+        if len(names) > count // 2:
+            parts.append(str(rng.randint(1, 99)))  # batch or shelf codes, as some shops use
+        names.add(" ".join(p for p in parts if p))
+    return sorted(names)
+
+def make_typo(name: str, rng: random.Random) -> str:
+    """Drop one letter from the longest word"""
+    words = name.split()
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[longest]
+    cut = rng.randrange(1, len(word))
+    words[longest] = word[:cut] + word[cut + 1:]
+    return " ".join(words)
+
+def time_lookups(index: ShopIndex, queries: list) -> tuple:
+    """(average microseconds per lookup, matched count)"""
+    start = time.perf_counter()
+    matched = sum(1 for query in queries if index.resolve(query))
+    return (time.perf_counter() - start) / len(queries) * 1e6, matched
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Product index micro-benchmark")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    names = make_catalogue(args.products, rng)
+
+    start = time.perf_counter()
+    index = ShopIndex()
+    for product_id, name in enumerate(names, 1):
+        index.add(product_id, name)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    sample = rng.sample(names, min(args.lookups, len(names)))
+    cases = [
+        ("exact", [name.upper() for name in sample]),
+        ("typo", [make_typo(name, rng) for name in sample]),
+        ("unknown", [f"unknown item {i}" for i in range(len(sample))]),
+    ]
+
+    print(f"[*] {len(names)} products indexed in {build_ms:.0f} ms")
+    worst = 0.0
+    for label, queries in cases:
+        us, matched = time_lookups(index, queries)
+        worst = max(worst, us)
+        print(f"    {label:8s} {us:8.1f} us/lookup  ({matched}/{len(queries)} matched)")
+    return 0 if worst < 1000 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Translation backend benchmark - stock pipeline vs. int8-quantized model on CPU
+
+Each backend is loaded in its own fresh process, so load time and memory
+are measured in isolation. Reports load time, resident memory, latency for
+single segments and for padded batches, and how often a backend's output
+matches the first backend's word for word.
+
+Needs transformers and torch. Backends are names from
+inference_service.BACKENDS or any module:function loader.
+
+Run: python bench_translation_backends.py [--backends pipeline int8] [--rounds 5] [--batch 8]
+"""
+import sys
+import time
+import argparse
+import resource
+import multiprocessing
+from inference_service import BACKENDS, HELSINKI_MODEL
+
+SEGMENTS = [
+    "Thank you for shopping with us",
+    "Customer",
+    "Total amount",
+    "cooking oil",
+    "basmati rice",
+    "{0} sugar at {1}",
+    "Invoice number",
+    "Please visit again",
+    "Paid in cash",
+    "Balance due",
+]
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def _rss_mb() -> float:
+    """Current resident memory of this process (Linux)"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 2**20
+
+def measure(loader: str, model: str, rounds: int, batch: int) -> dict:
+    """Runs in a fresh process: load one backend and time it"""
+    import importlib
+    before = _rss_mb()
+    start = time.perf_counter()
+    module, function = loader.split(":")
+    run = getattr(importlib.import_module(module), function)(model)
+    run(SEGMENTS[:2])  # first call allocates the generation buffers
+    load_s = time.perf_counter() - start
+
+    single, batched = [], []
+    for _ in range(rounds):
+        for text in SEGMENTS:
+            t = time.perf_counter()
+            run([text])
+            single.append(time.perf_counter() - t)
+        for index in range(0, len(SEGMENTS), batch):
+            t = time.perf_counter()
+            run(SEGMENTS[index:index + batch])
+            batched.append(time.perf_counter() - t)
+    return {
+        "load_s": load_s,
+        "rss_mb": _rss_mb(),
+        "model_mb": _rss_mb() - before,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "single_p50_ms": percentile(single, 0.5) * 1000,
+        "single_p95_ms": percentile(single, 0.95) * 1000,
+        "batch_p50_ms": percentile(batched, 0.5) * 1000,
+        "segments_per_s": len(SEGMENTS) * rounds / sum(batched),
+        "outputs": run(SEGMENTS),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Translation backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=["pipeline", "int8"],
+                        help=f"{', '.join(BACKENDS)} or module:function loaders")
+    parser.add_argument("--model", default=HELSINKI_MODEL)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name in args.backends:
+        loader = BACKENDS.get(name, name)
+        with context.Pool(1) as pool:
+            try:
+                results[name] = pool.apply(measure, (loader, args.model, args.rounds, args.batch))
+            except Exception as e:
+                print(f"[!] {name}: {type(e).__name__}: {e}")
+    if not results:
+        return 1
+
+    baseline = next(iter(results.values()))["outputs"]
+    print(f"[*] {args.model} on CPU, {args.rounds} rounds of {len(SEGMENTS)} segments, batches of {args.batch}")
+    print(f"    {'backend':10s} {'load':>7s} {'model':>9s} {'peak':>9s} {'single p50':>11s} {'p95':>8s} "
+          f"{'batch p50':>10s} {'seg/s':>7s} {'same':>6s}")
+    for name, r in results.items():
+        same = sum(a == b for a, b in zip(r["outputs"], baseline)) / len(baseline)
+        print(f"    {name:10s} {r['load_s']:6.1f}s {r['model_mb']:6.0f} MB {r['peak_mb']:6.0f} MB "
+              f"{r['single_p50_ms']:8.1f} ms {r['single_p95_ms']:5.1f} ms {r['batch_p50_ms']:7.1f} ms "
+              f"{r['segments_per_s']:7.1f} {same:6.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Translation batching benchmark - micro-batched vs. sequential pipeline calls
+
+Several client threads translate short bill segments concurrently, first
+with one pipeline call per segment (the old behaviour) and then through the
+MicroBatcher. Reports throughput and latency percentiles for both.
+
+By default this loads the Helsinki-NLP pipeline on CPU (needs transformers
+and torch). --simulate replaces it with a stand-in whose cost is a fixed
+per-call overhead plus a smaller per-item cost, to exercise the batcher
+where the model cannot be installed.
+
+Run: python bench_translation_batching.py [--clients 8] [--requests 20] [--batch 16] [--wait-ms 10] [--workers 1] [--simulate]
+"""
+import sys
+import time
+import argparse
+import threading
+from micro_batcher import MicroBatcher
+from inference_service import load_pipeline, HELSINKI_MODEL
+
+SEGMENTS = [
+    "Thank you for shopping with us",
+    "Customer",
+    "Total amount",
+    "cooking oil",
+    "basmati rice",
+    "{0} sugar at {1}",
+    "Invoice number",
+    "Please visit again",
+    "Paid in cash",
+    "Balance due",
+]
+
+def simulated_pipeline(overhead: float = 0.04, per_item: float = 0.006):
+    lock = threading.Lock()  # one model, one forward pass at a time
+
+    def run(texts: list) -> list:
+        with lock:
+            time.sleep(overhead + per_item * len(texts))
+        return [f"[ur] {text}" for text in texts]
+    return run
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def run_clients(translate_one, clients: int, requests: int) -> dict:
+    latencies, lock = [], threading.Lock()
+
+    def client(index: int):
+        for n in range(requests):
+            text = f"{SEGMENTS[(index + n) % len(SEGMENTS)]} {index}-{n}"
+            start = time.perf_counter()
+            translate_one(text)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Translation micro-batching benchmark")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20, help="Segments per client")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--simulate", action="store_true", help="Use a stand-in instead of the real model")
+    args = parser.parse_args(argv)
+
+    run_batch = simulated_pipeline() if args.simulate else load_pipeline(HELSINKI_MODEL)
+    run_batch(SEGMENTS[:2])  # warm up
+
+    model_lock = threading.Lock()  # the old path: each request calls the pipeline on its own
+
+    def sequential(text: str):
+        with model_lock:
+            return run_batch([text])[0]
+
+    batcher = MicroBatcher(run_batch, max_batch=args.batch, max_wait=args.wait_ms / 1000,
+                           workers=args.workers, name="bench")
+    results = {
+        "sequential": run_clients(sequential, args.clients, args.requests),
+        "micro-batched": run_clients(lambda text: batcher.submit(text).result(), args.clients, args.requests),
+    }
+
+    model = "simulated model" if args.simulate else f"{HELSINKI_MODEL} on CPU"
+    print(f"[*] {args.clients} clients x {args.requests} segments, {model}")
+    for label, r in results.items():
+        print(f"    {label:14s} {r['throughput']:8.1f} segments/s   p50 {r['p50_ms']:7.1f} ms   p95 {r['p95_ms']:7.1f} ms")
+    stats = batcher.get_stats()
+    speedup = results["micro-batched"]["throughput"] / results["sequential"]["throughput"]
+    print(f"    average batch {stats['avg_batch']}, largest {stats['max_batch_seen']}, speedup {speedup:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,230 +2,377 @@
 Business logic for shop operations
 """
 import json
+import logging
 import sqlite3
 import re
 from datetime import datetime
 from typing import Optional
 from database import get_db_connection
-from ai_intent_parser import parse_intent
+from ai_intent_parser import parse_intents
+from stock_ledger import record_movement, SALE, PURCHASE, INVOICE
+import product_index
+import tracing
+from llm_client import astream_chat_completion
+from config import LLM_INTENT_BUDGET, INTENT_MIN_CONFIDENCE
 from logger_config import logger
 
+def _find_product(cursor, user_id: int, product_name: str):
+    """Resolve a product name to its id by exact name or alias, falling back to SQL.
+    Approximate (word or fuzzy) matches are never bound on a write path."""
+    match = product_index.resolve_exact(user_id, product_name)
+    if match:
+        return match["id"]
+    
+    # Not in the index - it may have been created by another worker
+    cursor.execute("""
+        SELECT id, name FROM products 
+        WHERE user_id = ? AND LOWER(name) = ?
+    """, (user_id, product_name.strip().lower()))
+    product = cursor.fetchone()
+    if product:
+        product_index.add_product(user_id, product[0], product[1])
+        return product[0]
+    return None
+
+def _insert_product(cursor, user_id: int, product_name: str, cost_price: float, selling_price: float):
+    """Create a product and add it to the shop's product index"""
+    cursor.execute("""
+        INSERT INTO products (user_id, name, cost_price, selling_price, stock, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, product_name, cost_price, selling_price, 0, datetime.now().isoformat()))
+    product_id = cursor.lastrowid
+    product_index.add_product(user_id, product_id, product_name)
+    return product_id
+
+def _update_prices(cursor, product_id: int, cost_price: float = 0, selling_price: float = None):
+    """Keep the latest cost and selling prices on a product"""
+    if cost_price and cost_price > 0:
+        cursor.execute("UPDATE products SET cost_price = ? WHERE id = ?", (cost_price, product_id))
+    if selling_price and selling_price > 0:
+        cursor.execute("UPDATE products SET selling_price = ? WHERE id = ?", (selling_price, product_id))
+
+def _get_or_create_product(cursor, user_id: int, product_name: str, cost_price: float = 0, selling_price: float = None):
+    """Get existing product or create new one within the caller's transaction"""
+    # Normalize product name
+    product_name = product_name.strip().lower()
+    
+    product_id = _find_product(cursor, user_id, product_name)
+    
+    if product_id:
+        _update_prices(cursor, product_id, cost_price, selling_price)
+    else:
+        # Create new product
+        product_id = _insert_product(cursor, user_id, product_name, cost_price, selling_price or cost_price)
+    
+    return product_id
+
 def get_or_create_product(user_id: int, product_name: str, cost_price: float = 0, selling_price: float = None):
     """Get existing product or create new one"""
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Normalize product name
-        product_name = product_name.strip().lower()
-        
-        cursor.execute("""
-            SELECT id, cost_price, selling_price, stock FROM products 
-            WHERE user_id = ? AND LOWER(name) = ?
-        """, (user_id, product_name))
-        
-        product = cursor.fetchone()
-        
-        if product:
-            product_id = product[0]
-            # Update price if provided
-            if cost_price > 0:
-                cursor.execute("UPDATE products SET cost_price = ? WHERE id = ?", (cost_price, product_id))
-            if selling_price and selling_price > 0:
-                cursor.execute("UPDATE products SET selling_price = ? WHERE id = ?", (selling_price, product_id))
-            conn.commit()
-        else:
-            # Create new product
-            cursor.execute("""
-                INSERT INTO products (user_id, name, cost_price, selling_price, stock, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_id, product_name, cost_price, selling_price or cost_price, 0, datetime.now().isoformat()))
-            product_id = cursor.lastrowid
-            conn.commit()
-        
+        product_id = _get_or_create_product(conn.cursor(), user_id, product_name, cost_price, selling_price)
+        conn.commit()
         return product_id
     except Exception as e:
-        logger.error(f"Get/create product error: {e}")
+        logger.error("Get/create product error: %s", e)
+        product_index.invalidate(user_id)
         raise
     finally:
         if conn:
             conn.close()
 
-def record_sale(user_id: int, product_name: str, quantity: float, selling_price: float, cost_price: float = None):
+@tracing.traced("record_sale")
+def _record_sale(cursor, user_id: int, product_name: str, quantity: float, selling_price: float, cost_price: float = None,
+                 product_id: int = None):
+    """Record a sale within the caller's transaction; a known `product_id` skips name resolution"""
+    if product_id is None:
+        product_id = _get_or_create_product(cursor, user_id, product_name, cost_price or 0, selling_price)
+    else:
+        _update_prices(cursor, product_id, cost_price, selling_price)
+    
+    # Check current stock
+    cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+    current_stock = cursor.fetchone()[0] or 0
+    
+    # Record the sale
+    cursor.execute("""
+        INSERT INTO sales (user_id, product_id, product_name, quantity, selling_price, cost_price, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, product_id, product_name.strip().lower(), quantity, selling_price, cost_price, datetime.now().isoformat()))
+    sale_id = cursor.lastrowid
+    
+    # Update stock (decrease) - but never go below 0
+    new_stock = max(0, current_stock - quantity)
+    cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
+    record_movement(cursor, user_id, product_id, new_stock - current_stock, SALE,
+                    requested=-quantity, reference_id=sale_id)
+    
+    total = quantity * selling_price
+    
+    # Check for low stock warning
+    low_stock_warning = None
+    if new_stock <= 0:
+        low_stock_warning = f"⚠️ OUT OF STOCK: {product_name} is now out of stock! Please reorder."
+    elif new_stock < 10:
+        low_stock_warning = f"⚠️ LOW STOCK: Only {int(new_stock)} units of {product_name} remaining!"
+    
+    return {
+        "product": product_name,
+        "quantity": quantity,
+        "price": selling_price,
+        "total": total,
+        "remaining_stock": new_stock,
+        "low_stock_warning": low_stock_warning
+    }
+
+def record_sale(user_id: int, product_name: str, quantity: float, selling_price: float, cost_price: float = None,
+                product_id: int = None):
     """Record a sale transaction"""
     conn = None
     try:
-        # First get or create product
-        product_id = get_or_create_product(user_id, product_name, cost_price or 0, selling_price)
-        
-        # Now record the sale with a new connection
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check current stock
-        cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
-        current_stock = cursor.fetchone()[0] or 0
-        
-        # Record the sale
-        cursor.execute("""
-            INSERT INTO sales (user_id, product_id, product_name, quantity, selling_price, cost_price, date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, product_id, product_name.strip().lower(), quantity, selling_price, cost_price, datetime.now().isoformat()))
-        
-        # Update stock (decrease) - but never go below 0
-        new_stock = max(0, current_stock - quantity)
-        cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
-        
+        result = _record_sale(conn.cursor(), user_id, product_name, quantity, selling_price, cost_price, product_id)
         conn.commit()
-        
-        total = quantity * selling_price
-        logger.info(f"Sale recorded: {quantity} x {product_name} @ {selling_price}")
-        
-        # Check for low stock warning
-        low_stock_warning = None
-        if new_stock <= 0:
-            low_stock_warning = f"⚠️ OUT OF STOCK: {product_name} is now out of stock! Please reorder."
-        elif new_stock < 10:
-            low_stock_warning = f"⚠️ LOW STOCK: Only {int(new_stock)} units of {product_name} remaining!"
-        
-        return {
-            "product": product_name,
-            "quantity": quantity,
-            "price": selling_price,
-            "total": total,
-            "remaining_stock": new_stock,
-            "low_stock_warning": low_stock_warning
-        }
+        logger.info("Sale recorded: %s x %s @ %s", quantity, product_name, selling_price)
+        return result
     except Exception as e:
-        logger.error(f"Record sale error: {e}")
+        logger.error("Record sale error: %s", e)
+        if conn:
+            conn.rollback()
+            product_index.invalidate(user_id)
         raise
     finally:
         if conn:
             conn.close()
 
-def record_purchase(user_id: int, product_name: str, quantity: float, cost_price: float):
-    """Record a purchase/restock transaction"""
+def record_scan(user_id: int, code: str, quantity: float = 1, selling_price: float = None):
+    """Record a sale by barcode/SKU, skipping intent parsing; returns None for an unknown code"""
     conn = None
     try:
-        # First get or create product
-        product_id = get_or_create_product(user_id, product_name, cost_price)
-        
-        # Now record the purchase with a new connection
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        # Get current stock before update
-        cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
-        current_stock = cursor.fetchone()[0] or 0
-        
-        # Record the purchase
         cursor.execute("""
-            INSERT INTO purchases (user_id, product_id, product_name, quantity, cost_price, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, product_id, product_name.strip().lower(), quantity, cost_price, datetime.now().isoformat()))
-        
-        # Update stock (increase)
-        cursor.execute("UPDATE products SET stock = stock + ? WHERE id = ?", (quantity, product_id))
+            SELECT id, name, selling_price, cost_price FROM products
+            WHERE user_id = ? AND barcode = ?
+        """, (user_id, code.strip()))
+        product = cursor.fetchone()
+        if not product:
+            return None
         
+        price = selling_price if selling_price is not None else (product["selling_price"] or product["cost_price"])
+        result = _record_sale(cursor, user_id, product["name"], quantity, price, product["cost_price"],
+                              product_id=product["id"])
         conn.commit()
-        
-        new_stock = current_stock + quantity
-        total = quantity * cost_price
-        logger.info(f"Purchase recorded: {quantity} x {product_name} @ {cost_price}")
-        return {
-            "product": product_name,
-            "quantity": quantity,
-            "cost_price": cost_price,
-            "total": total,
-            "new_stock": new_stock,
-            "is_new_product": current_stock == 0
-        }
+        result["barcode"] = code.strip()
+        return result
     except Exception as e:
-        logger.error(f"Record purchase error: {e}")
+        logger.error("Record scan error: %s", e)
+        if conn:
+            conn.rollback()
         raise
     finally:
         if conn:
             conn.close()
 
-def create_invoice(user_id: int, customer_name: str, items: list):
-    """Create a new invoice"""
+def import_barcodes(user_id: int, items: list):
+    """Assign barcode/SKU codes to products in bulk, creating products that do not exist yet.
+
+    Each item has a `barcode` and either a `product_id` or a product `name`
+    (optionally with `cost_price` and `selling_price`). Rows whose code is
+    already used by another product are reported in `errors` and skipped.
+    """
     conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        imported, created, errors = 0, 0, []
+        
+        for row, item in enumerate(items):
+            code = str(item.get("barcode") or "").strip()
+            if not code:
+                errors.append({"row": row, "error": "Missing barcode"})
+                continue
+            
+            cursor.execute("SELECT id FROM products WHERE user_id = ? AND barcode = ?", (user_id, code))
+            owner = cursor.fetchone()
+            
+            product_id = item.get("product_id")
+            if product_id is not None:
+                cursor.execute("SELECT id FROM products WHERE id = ? AND user_id = ?", (product_id, user_id))
+                if not cursor.fetchone():
+                    errors.append({"row": row, "barcode": code, "error": "Product not found"})
+                    continue
+            elif item.get("name"):
+                name = item["name"].strip().lower()
+                # Exact names only - fuzzy matching could attach a code to the wrong product
+                product_id = _find_product(cursor, user_id, name)
+                if product_id is None and owner:
+                    errors.append({"row": row, "barcode": code, "error": "Barcode already assigned to another product"})
+                    continue
+                if product_id is None:
+                    cost_price = float(item.get("cost_price") or 0)
+                    product_id = _insert_product(cursor, user_id, name, cost_price,
+                                                 float(item.get("selling_price") or cost_price))
+                    created += 1
+            else:
+                errors.append({"row": row, "barcode": code, "error": "Missing product_id or name"})
+                continue
+            
+            if owner and owner[0] != product_id:
+                errors.append({"row": row, "barcode": code, "error": "Barcode already assigned to another product"})
+                continue
+            cursor.execute("UPDATE products SET barcode = ? WHERE id = ?", (code, product_id))
+            imported += 1
         
-        # Generate invoice number
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        # Calculate total
-        total_amount = sum(item["quantity"] * item["price"] for item in items)
+        conn.commit()
+        logger.info("Barcode import for user %s: %s codes, %s new products, %s errors",
+                    user_id, imported, created, len(errors))
+        return {"imported": imported, "created": created, "errors": errors}
+    except Exception as e:
+        logger.error("Barcode import error: %s", e)
+        if conn:
+            conn.rollback()
+            product_index.invalidate(user_id)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+@tracing.traced("record_purchase")
+def _record_purchase(cursor, user_id: int, product_name: str, quantity: float, cost_price: float,
+                     product_id: int = None):
+    """Record a purchase within the caller's transaction; a known `product_id` skips name resolution"""
+    if product_id is None:
+        product_id = _get_or_create_product(cursor, user_id, product_name, cost_price)
+    else:
+        _update_prices(cursor, product_id, cost_price)
+    
+    # Get current stock before update
+    cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+    current_stock = cursor.fetchone()[0] or 0
+    
+    # Record the purchase
+    cursor.execute("""
+        INSERT INTO purchases (user_id, product_id, product_name, quantity, cost_price, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, product_id, product_name.strip().lower(), quantity, cost_price, datetime.now().isoformat()))
+    purchase_id = cursor.lastrowid
+    
+    # Update stock (increase)
+    cursor.execute("UPDATE products SET stock = stock + ? WHERE id = ?", (quantity, product_id))
+    record_movement(cursor, user_id, product_id, quantity, PURCHASE, reference_id=purchase_id)
+    
+    new_stock = current_stock + quantity
+    total = quantity * cost_price
+    return {
+        "product": product_name,
+        "quantity": quantity,
+        "cost_price": cost_price,
+        "total": total,
+        "new_stock": new_stock,
+        "is_new_product": current_stock == 0
+    }
+
+def record_purchase(user_id: int, product_name: str, quantity: float, cost_price: float, product_id: int = None):
+    """Record a purchase/restock transaction"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        result = _record_purchase(conn.cursor(), user_id, product_name, quantity, cost_price, product_id)
+        conn.commit()
+        logger.info("Purchase recorded: %s x %s @ %s", quantity, product_name, cost_price)
+        return result
+    except Exception as e:
+        logger.error("Record purchase error: %s", e)
+        if conn:
+            conn.rollback()
+            product_index.invalidate(user_id)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+@tracing.traced("create_invoice")
+def _create_invoice(cursor, user_id: int, customer_name: str, items: list):
+    """Create an invoice and its sales within the caller's transaction"""
+    # Generate invoice number; the per-user sequence keeps several invoices
+    # in one second (or one multi-command message) unique
+    cursor.execute("SELECT COUNT(*) FROM invoices WHERE user_id = ?", (user_id,))
+    sequence = cursor.fetchone()[0] + 1
+    invoice_number = f"INV-{user_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{sequence:03d}"
+    
+    # Calculate total
+    total_amount = sum(item["quantity"] * item["price"] for item in items)
+    
+    # Insert invoice
+    cursor.execute("""
+        INSERT INTO invoices (user_id, invoice_number, customer_name, total_amount, items, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, invoice_number, customer_name, total_amount, json.dumps(items), datetime.now().isoformat()))
+    invoice_id = cursor.lastrowid
+    
+    # Record each item as a sale
+    low_stock_warnings = []
+    for item in items:
+        product_name = item["name"].strip().lower()
+        quantity = float(item["quantity"])
+        selling_price = float(item["price"])
+        
+        # Check if product exists; resolve_products may already have bound it
+        product_id = item.get("product_id") or _find_product(cursor, user_id, product_name)
+        
+        if product_id:
+            cursor.execute("SELECT cost_price, stock FROM products WHERE id = ?", (product_id,))
+            product = cursor.fetchone()
+            cost_price = product[0]
+            current_stock = product[1] or 0
+        else:
+            # Create new product
+            product_id = _insert_product(cursor, user_id, product_name, selling_price * 0.7, selling_price)
+            cost_price = selling_price * 0.7
+            current_stock = 0
         
-        # Insert invoice
+        # Record sale
         cursor.execute("""
-            INSERT INTO invoices (user_id, invoice_number, customer_name, total_amount, items, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, invoice_number, customer_name, total_amount, json.dumps(items), datetime.now().isoformat()))
+            INSERT INTO sales (user_id, product_id, product_name, quantity, selling_price, cost_price, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, product_id, product_name, quantity, selling_price, cost_price, datetime.now().isoformat()))
         
-        # Record each item as a sale (inline to avoid nested connections)
-        low_stock_warnings = []
-        for item in items:
-            product_name = item["name"].strip().lower()
-            quantity = float(item["quantity"])
-            selling_price = float(item["price"])
-            
-            # Check if product exists
-            cursor.execute("""
-                SELECT id, cost_price, stock FROM products 
-                WHERE user_id = ? AND LOWER(name) = ?
-            """, (user_id, product_name))
-            
-            product = cursor.fetchone()
-            
-            if product:
-                product_id = product[0]
-                cost_price = product[1]
-                current_stock = product[2] or 0
-            else:
-                # Create new product
-                cursor.execute("""
-                    INSERT INTO products (user_id, name, cost_price, selling_price, stock, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (user_id, product_name, selling_price * 0.7, selling_price, 0, datetime.now().isoformat()))
-                product_id = cursor.lastrowid
-                cost_price = selling_price * 0.7
-                current_stock = 0
-            
-            # Record sale
-            cursor.execute("""
-                INSERT INTO sales (user_id, product_id, product_name, quantity, selling_price, cost_price, date)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, product_id, product_name, quantity, selling_price, cost_price, datetime.now().isoformat()))
-            
-            # Update stock - never go below 0
-            new_stock = max(0, current_stock - quantity)
-            cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
-            
-            # Check for low stock warning
-            if new_stock <= 0:
-                low_stock_warnings.append(f"{product_name} (OUT OF STOCK)")
-            elif new_stock < 10:
-                low_stock_warnings.append(f"{product_name} ({int(new_stock)} left)")
+        # Update stock - never go below 0
+        new_stock = max(0, current_stock - quantity)
+        cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
+        record_movement(cursor, user_id, product_id, new_stock - current_stock, INVOICE,
+                        requested=-quantity, reference_id=invoice_id)
         
+        # Check for low stock warning
+        if new_stock <= 0:
+            low_stock_warnings.append(f"{product_name} (OUT OF STOCK)")
+        elif new_stock < 10:
+            low_stock_warnings.append(f"{product_name} ({int(new_stock)} left)")
+    
+    return {
+        "invoice_number": invoice_number,
+        "customer_name": customer_name,
+        "items": items,
+        "total_amount": total_amount,
+        "low_stock_warnings": low_stock_warnings if low_stock_warnings else None
+    }
+
+def create_invoice(user_id: int, customer_name: str, items: list):
+    """Create a new invoice"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        result = _create_invoice(conn.cursor(), user_id, customer_name, items)
         conn.commit()
-        
-        logger.info(f"Invoice created: {invoice_number} for {customer_name}")
-        return {
-            "invoice_number": invoice_number,
-            "customer_name": customer_name,
-            "items": items,
-            "total_amount": total_amount,
-            "low_stock_warnings": low_stock_warnings if low_stock_warnings else None
-        }
+        logger.info("Invoice created: %s for %s", result['invoice_number'], customer_name)
+        return result
     except Exception as e:
-        logger.error(f"Create invoice error: {e}")
+        logger.error("Create invoice error: %s", e)
         if conn:
             conn.rollback()
+            product_index.invalidate(user_id)
         raise
     finally:
         if conn:
@@ -286,7 +433,7 @@ def get_daily_summary(user_id: int):
             "date": today
         }
     except Exception as e:
-        logger.error(f"Get summary error: {e}")
+        logger.error("Get summary error: %s", e)
         raise
     finally:
         if conn:
@@ -300,7 +447,7 @@ def get_inventory(user_id: int):
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT id, name, cost_price, selling_price, stock 
+            SELECT id, name, cost_price, selling_price, stock, barcode 
             FROM products WHERE user_id = ? ORDER BY name
         """, (user_id,))
         
@@ -309,12 +456,13 @@ def get_inventory(user_id: int):
             "name": row[1],
             "cost_price": row[2],
             "selling_price": row[3],
-            "stock": max(0, row[4] or 0)  # Never show negative stock
+            "stock": max(0, row[4] or 0),  # Never show negative stock
+            "barcode": row[5]
         } for row in cursor.fetchall()]
         
         return inventory
     except Exception as e:
-        logger.error(f"Get inventory error: {e}")
+        logger.error("Get inventory error: %s", e)
         raise
     finally:
         if conn:
@@ -343,7 +491,7 @@ def get_all_invoices(user_id: int):
         
         return invoices
     except Exception as e:
-        logger.error(f"Get invoices error: {e}")
+        logger.error("Get invoices error: %s", e)
         raise
     finally:
         if conn:
@@ -372,7 +520,7 @@ def suggest_reorder(user_id: int):
         
         return {"no_products": False, "items": items}
     except Exception as e:
-        logger.error(f"Suggest reorder error: {e}")
+        logger.error("Suggest reorder error: %s", e)
         raise
     finally:
         if conn:
@@ -407,7 +555,7 @@ def get_low_stock_notifications(user_id: int):
             "total_alerts": len(out_of_stock) + len(low_stock)
         }
     except Exception as e:
-        logger.error(f"Get low stock notifications error: {e}")
+        logger.error("Get low stock notifications error: %s", e)
         raise
     finally:
         if conn:
@@ -420,10 +568,14 @@ def recommend_price(user_id: int, product_name: str, target_margin: float = 0.2)
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT cost_price FROM products 
-            WHERE user_id = ? AND LOWER(name) LIKE ?
-        """, (user_id, f"%{product_name.lower()}%"))
+        match = product_index.resolve(user_id, product_name)
+        if match:
+            cursor.execute("SELECT cost_price FROM products WHERE id = ?", (match["id"],))
+        else:
+            cursor.execute("""
+                SELECT cost_price FROM products 
+                WHERE user_id = ? AND LOWER(name) LIKE ?
+            """, (user_id, f"%{product_name.lower()}%"))
         
         row = cursor.fetchone()
         
@@ -431,233 +583,399 @@ def recommend_price(user_id: int, product_name: str, target_margin: float = 0.2)
             cost = row[0]
             recommended = cost * (1 + target_margin)
             return {
-                "product": product_name,
+                "product": match["name"] if match else product_name,
                 "cost_price": cost,
                 "recommended_price": round(recommended, 2),
                 "margin": f"{target_margin * 100}%"
             }
         return None
     except Exception as e:
-        logger.error(f"Recommend price error: {e}")
+        logger.error("Recommend price error: %s", e)
         raise
     finally:
         if conn:
             conn.close()
 
+# System prompt for free-form answers to messages that are not commands
+ASSISTANT_PROMPT = """You are ShopKeeperAI, an assistant for a small shop owner.
+Answer briefly and practically. If the user seems to want to record a sale,
+purchase or invoice, show them the command format, e.g. "Sold 5 rice at 80"."""
+
+# Intents that write to the database; a multi-command message runs all of
+# them in one transaction
+WRITE_INTENTS = {"record_sale", "record_purchase", "create_invoice"}
+
+@tracing.traced("process_chat_message")
 def process_chat_message(message: str, user_id: int):
-    """Process a chat message and execute the appropriate action"""
+    """Process a chat message and execute the appropriate action(s)"""
+    try:
+        # Parse intents using AI or fallback - one message may hold several commands
+        intents = parse_intents(message, user_id)
+        return execute_intents(intents, user_id)
+    except Exception as e:
+        logger.error("Process chat error: %s", e)
+        return {"response": f"Sorry, something went wrong. Please try again."}
+
+def _lookup_exact(user_id: int, product_name: str) -> Optional[dict]:
+    """Exact name lookup in SQL, for names the product index only matched approximately"""
+    conn = None
     try:
-        # Parse intent using AI or fallback
-        intent = parse_intent(message)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        product_id = _find_product(cursor, user_id, product_name)
+        if product_id is None:
+            return None
+        cursor.execute("SELECT name FROM products WHERE id = ?", (product_id,))
+        return {"id": product_id, "name": cursor.fetchone()[0], "score": 1.0, "match": "exact"}
+    finally:
+        if conn:
+            conn.close()
+
+def resolve_products(intent: dict, user_id: int) -> dict:
+    """Map parsed product names to the shop's existing products.
+
+    Only exact names and aliases are bound ("Cooking  Oil" -> "cooking oil").
+    A word or fuzzy match ("cookin oil", or "rice" with only "rice flour" in
+    stock) is attached as a `suggestion` for the user to confirm instead."""
+    entities = dict(intent.get("entities") or {})
+    # Ids are only ever bound here - never trust one that came with the parse
+    entities.pop("product_id", None)
+    
+    def lookup(name):
+        """(exact match, suggested name); at most one of them is set"""
+        match = product_index.resolve(user_id, str(name))
+        if not match:
+            return None, None
+        if match["match"] == "exact":
+            return match, None
+        # A product created by another worker may not be in this worker's index yet
+        product = _lookup_exact(user_id, str(name))
+        if product:
+            return product, None
+        logger.info("Product '%s' is close to '%s' (%s, %s); asking to confirm",
+                    name, match['name'], match['match'], match['score'])
+        return None, match["name"]
+    
+    if intent.get("intent") in ("record_sale", "record_purchase", "recommend_price") and entities.get("product"):
+        match, suggestion = lookup(entities["product"])
+        if match:
+            entities.update(product=match["name"], product_id=match["id"])
+        elif suggestion:
+            entities["suggestion"] = suggestion
+    elif intent.get("intent") == "create_invoice" and isinstance(entities.get("items"), list):
+        items = []
+        for item in entities["items"]:
+            if isinstance(item, dict):
+                item = {key: value for key, value in item.items() if key != "product_id"}
+            match, suggestion = lookup(item.get("name", "")) if isinstance(item, dict) else (None, None)
+            if match:
+                item = dict(item, name=match["name"], product_id=match["id"])
+            elif suggestion:
+                item = dict(item, suggestion=suggestion)
+            items.append(item)
+        entities["items"] = items
+    return dict(intent, entities=entities)
+
+@tracing.traced("execute_intents")
+def execute_intents(intents: list, user_id: int):
+    """Execute parsed intents and build the chat response"""
+    intents = [resolve_products(intent, user_id) for intent in intents]
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Parsed intents: %s", [(i.get('intent'), i.get('entities')) for i in intents])
+    
+    if len(intents) == 1:
+        return _handle_intent(intents[0], user_id)
+    
+    # A message split this unsurely may have merged or dropped commands, and the
+    # batch is all-or-nothing - don't guess with the books. Single commands run
+    # as parsed, as they always have.
+    unsure = [i for i in intents if i.get("intent") in WRITE_INTENTS and i.get("confidence", 1.0) < INTENT_MIN_CONFIDENCE]
+    if unsure:
+        logger.info("Refusing low-confidence commands: %s", [(i.get('intent'), i.get('confidence')) for i in unsure])
+        return {
+            "response": "❓ Nothing was recorded - I couldn't read that message clearly.\n\n"
+                        "Please send one command at a time, e.g. 'Sold 5 rice at 80' or 'Invoice for Ali: 2 rice at 85'."
+        }
+    
+    return _handle_commands(intents, user_id)
+
+async def stream_free_form_reply(message: str):
+    """Stream an LLM answer, token by token, for a message that matched no command"""
+    async for token in astream_chat_completion(
+        [
+            {"role": "system", "content": ASSISTANT_PROMPT},
+            {"role": "user", "content": message}
+        ],
+        temperature=0.5,
+        max_tokens=300,
+        budget=LLM_INTENT_BUDGET
+    ):
+        yield token
+
+def _handle_commands(intents: list, user_id: int):
+    """Execute several commands atomically and combine their responses"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        results = {}
+        for index, intent in enumerate(intents):
+            if intent.get("intent") in WRITE_INTENTS:
+                result = _handle_intent(intent, user_id, cursor)
+                if "data" not in result:
+                    # A command was incomplete - record none of them
+                    conn.rollback()
+                    product_index.invalidate(user_id)
+                    return {"response": "Nothing was recorded.\n\n" + result["response"]}
+                results[index] = result
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        product_index.invalidate(user_id)
+        raise
+    finally:
+        conn.close()
+    
+    # Read-only commands run after the commit so they see the new state
+    responses = [results.get(index) or _handle_intent(intent, user_id) for index, intent in enumerate(intents)]
+    logger.info("Executed %d commands in one transaction", len(results))
+    return {
+        "response": "\n\n".join(r["response"] for r in responses),
+        "data": {"actions": [r.get("data") for r in responses]}
+    }
+
+def _handle_intent(intent: dict, user_id: int, cursor=None):
+    """Execute one parsed intent; write intents use `cursor` when given"""
+    intent_type = intent.get("intent", "unknown")
+    entities = intent.get("entities", {})
+    
+    # Handle sale intent
+    if intent_type == "record_sale":
+        product = entities.get("product", "item")
+        quantity = float(entities.get("quantity", 1))
+        price = float(entities.get("price", 0))
+        
+        if price <= 0:
+            return {"response": "Please specify the selling price. Example: 'Sold 5 pens at 10 each'"}
+        
+        if entities.get("suggestion"):
+            suggestion = entities["suggestion"]
+            return {"response": f"❓ There is no product called '{product}'. Did you mean '{suggestion}'?\n\n"
+                                f"To confirm, say: 'Sold {quantity:g} {suggestion} at {price:g}'\n"
+                                f"To sell '{product}' as a new product, record a purchase of it first.",
+                    "suggestions": {product: suggestion}}
+        
+        # resolve_products already bound the name to a product id
+        product_id = entities.get("product_id")
+        if cursor:
+            result = _record_sale(cursor, user_id, product, quantity, price, product_id=product_id)
+        else:
+            result = record_sale(user_id, product, quantity, price, product_id=product_id)
+        response_msg = f"✅ Sale recorded!\n\n📦 Product: {product}\n📊 Quantity: {quantity}\n💰 Price: Rs.{price}/-\n💵 Total: Rs.{result['total']:.2f}/-"
         
-        intent_type = intent.get("intent", "unknown")
-        entities = intent.get("entities", {})
+        # Add low stock warning if applicable
+        if result.get("low_stock_warning"):
+            response_msg += f"\n\n{result['low_stock_warning']}"
         
-        logger.info(f"Parsed intent: {intent_type} with entities: {entities}")
+        return {
+            "response": response_msg,
+            "data": result
+        }
+    
+    # Handle purchase intent
+    elif intent_type == "record_purchase":
+        product = entities.get("product", "item")
+        quantity = float(entities.get("quantity", 1))
+        price = float(entities.get("price", 0))
+        
+        if price <= 0:
+            return {"response": "Please specify the cost price. Example: 'Bought 10 notebooks at 25 each'"}
+        
+        product_id = entities.get("product_id")
+        if cursor:
+            result = _record_purchase(cursor, user_id, product, quantity, price, product_id)
+        else:
+            result = record_purchase(user_id, product, quantity, price, product_id)
         
-        # Handle sale intent
-        if intent_type == "record_sale":
-            product = entities.get("product", "item")
-            quantity = float(entities.get("quantity", 1))
-            price = float(entities.get("price", 0))
-            
-            if price <= 0:
-                return {"response": "Please specify the selling price. Example: 'Sold 5 pens at 10 each'"}
-            
-            result = record_sale(user_id, product, quantity, price)
-            response_msg = f"✅ Sale recorded!\n\n📦 Product: {product}\n📊 Quantity: {quantity}\n💰 Price: Rs.{price}/-\n💵 Total: Rs.{result['total']:.2f}/-"
-            
-            # Add low stock warning if applicable
-            if result.get("low_stock_warning"):
-                response_msg += f"\n\n{result['low_stock_warning']}"
-            
-            return {
-                "response": response_msg,
-                "data": result
-            }
+        # Build response message
+        response_msg = f"✅ Purchase recorded!\n\n📦 Product: {product}\n📊 Quantity: {quantity}\n💰 Cost: Rs.{price}/-\n💵 Total: Rs.{result['total']:.2f}/-\n📈 New Stock: {int(result['new_stock'])} units"
         
-        # Handle purchase intent
-        elif intent_type == "record_purchase":
-            product = entities.get("product", "item")
-            quantity = float(entities.get("quantity", 1))
-            price = float(entities.get("price", 0))
-            
-            if price <= 0:
-                return {"response": "Please specify the cost price. Example: 'Bought 10 notebooks at 25 each'"}
-            
-            result = record_purchase(user_id, product, quantity, price)
-            
-            # Build response message
-            response_msg = f"✅ Purchase recorded!\n\n📦 Product: {product}\n📊 Quantity: {quantity}\n💰 Cost: Rs.{price}/-\n💵 Total: Rs.{result['total']:.2f}/-\n📈 New Stock: {int(result['new_stock'])} units"
-            
-            if result.get('is_new_product'):
-                response_msg += "\n\n🆕 New product added to inventory!"
-            
-            return {
-                "response": response_msg,
-                "data": result
-            }
+        if result.get('is_new_product'):
+            response_msg += "\n\n🆕 New product added to inventory!"
+        if entities.get("suggestion"):
+            # Purchases are where products are created, so a near miss becomes a new product
+            result["similar_product"] = entities["suggestion"]
+            response_msg += (f"\n\nℹ️ Recorded as '{product}', separate from '{entities['suggestion']}'. "
+                             f"If you meant '{entities['suggestion']}', adjust the stock and use that name.")
         
-        # Handle invoice intent
-        elif intent_type == "create_invoice":
-            customer = entities.get("customer", "Customer")
-            items = entities.get("items", [])
-            
-            # Handle case where items come as JSON string from AI
-            if isinstance(items, str):
-                try:
-                    items = json.loads(items)
-                except:
-                    items = []
-            
-            if not items:
-                return {"response": "Please specify items for the invoice. Example: 'Invoice for Ahmed: 5 rice at 80, 2 oil at 150'"}
-            
-            result = create_invoice(user_id, customer, items)
-            response_msg = f"✅ Invoice created!\n\n📄 Invoice #: {result['invoice_number']}\n👤 Customer: {customer}\n💵 Total: Rs.{result['total_amount']:.2f}/-"
-            
-            # Add low stock warnings if applicable
-            if result.get("low_stock_warnings"):
-                response_msg += "\n\n⚠️ Low Stock Alert:\n"
-                for warning in result["low_stock_warnings"]:
-                    response_msg += f"• {warning}\n"
-            
-            return {
-                "response": response_msg,
-                "data": result
-            }
+        return {
+            "response": response_msg,
+            "data": result
+        }
+    
+    # Handle invoice intent
+    elif intent_type == "create_invoice":
+        customer = entities.get("customer", "Customer")
+        items = entities.get("items", [])
+        
+        # Handle case where items come as JSON string from AI
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except:
+                items = []
+        
+        if not items:
+            return {"response": "Please specify items for the invoice. Example: 'Invoice for Ahmed: 5 rice at 80, 2 oil at 150'"}
+        
+        suggestions = {item["name"]: item["suggestion"] for item in items
+                       if isinstance(item, dict) and item.get("suggestion")}
+        if suggestions:
+            lines = "\n".join(f"• '{name}' → did you mean '{suggestion}'?" for name, suggestion in suggestions.items())
+            return {"response": f"❓ Some invoice items do not match a product exactly:\n{lines}\n\n"
+                                "Please send the invoice again with the exact product names.",
+                    "suggestions": suggestions}
+        
+        result = _create_invoice(cursor, user_id, customer, items) if cursor else create_invoice(user_id, customer, items)
+        response_msg = f"✅ Invoice created!\n\n📄 Invoice #: {result['invoice_number']}\n👤 Customer: {customer}\n💵 Total: Rs.{result['total_amount']:.2f}/-"
+        
+        # Add low stock warnings if applicable
+        if result.get("low_stock_warnings"):
+            response_msg += "\n\n⚠️ Low Stock Alert:\n"
+            for warning in result["low_stock_warnings"]:
+                response_msg += f"• {warning}\n"
+        
+        return {
+            "response": response_msg,
+            "data": result
+        }
+    
+    # Handle inventory intent
+    elif intent_type == "show_inventory":
+        inventory = get_inventory(user_id)
+        if not inventory:
+            return {"response": "📦 Your inventory is empty. Start adding products by recording purchases!"}
         
-        # Handle inventory intent
-        elif intent_type == "show_inventory":
+        return {
+            "response": f"📦 Your Inventory ({len(inventory)} items)",
+            "data": inventory
+        }
+    
+    # Handle summary intent
+    elif intent_type == "show_summary":
+        summary = get_daily_summary(user_id)
+        
+        # Check if there are any sales today
+        if summary['total_sales'] == 0 and summary['total_items_sold'] == 0:
+            # Check if user has any products
             inventory = get_inventory(user_id)
             if not inventory:
-                return {"response": "📦 Your inventory is empty. Start adding products by recording purchases!"}
-            
-            return {
-                "response": f"📦 Your Inventory ({len(inventory)} items)",
-                "data": inventory
-            }
-        
-        # Handle summary intent
-        elif intent_type == "show_summary":
-            summary = get_daily_summary(user_id)
-            
-            # Check if there are any sales today
-            if summary['total_sales'] == 0 and summary['total_items_sold'] == 0:
-                # Check if user has any products
-                inventory = get_inventory(user_id)
-                if not inventory:
-                    return {
-                        "response": f"📊 Daily Summary ({summary['date']})\n\n" +
-                        "📦 No products in inventory yet.\n\n" +
-                        "Start by adding products:\n" +
-                        "• \"Bought 50 rice at 70\"\n" +
-                        "• \"Bought 20 cooking oil at 280\"",
-                        "data": summary
-                    }
                 return {
                     "response": f"📊 Daily Summary ({summary['date']})\n\n" +
-                    "📭 No sales recorded today yet.\n\n" +
-                    "Record a sale by saying:\n" +
-                    "• \"Sold 5 rice at 85\"",
+                    "📦 No products in inventory yet.\n\n" +
+                    "Start by adding products:\n" +
+                    "• \"Bought 50 rice at 70\"\n" +
+                    "• \"Bought 20 cooking oil at 280\"",
                     "data": summary
                 }
-            
-            response = f"📊 Daily Summary ({summary['date']})\n\n"
-            response += f"💰 Total Sales: Rs.{summary['total_sales']:.2f}/-\n"
-            response += f"📈 Total Profit: Rs.{summary['total_profit']:.2f}/-\n"
-            response += f"🛒 Items Sold: {int(summary['total_items_sold'])}"
-            
-            if summary['top_selling_item']:
-                response += f"\n🏆 Top Seller: {summary['top_selling_item']}"
-            
-            if summary['low_stock_items']:
-                response += f"\n\n⚠️ Low Stock: {len(summary['low_stock_items'])} items need reordering"
-            
-            return {"response": response, "data": summary}
+            return {
+                "response": f"📊 Daily Summary ({summary['date']})\n\n" +
+                "📭 No sales recorded today yet.\n\n" +
+                "Record a sale by saying:\n" +
+                "• \"Sold 5 rice at 85\"",
+                "data": summary
+            }
         
-        # Handle reorder suggestion
-        elif intent_type == "suggest_reorder":
-            result = suggest_reorder(user_id)
-            
-            # Check if user has no products at all
-            if result.get("no_products"):
-                return {
-                    "response": "📦 Your inventory is empty!\n\n" +
-                    "To add products, record a purchase first:\n" +
-                    "• \"Bought 50 rice at 70\"\n" +
-                    "• \"Bought 20 oil at 280\"\n" +
-                    "• \"Bought 100 sugar at 90\"\n\n" +
-                    "This will add products to your inventory with stock."
-                }
-            
-            items = result.get("items", [])
-            if not items:
-                return {"response": "✅ All items are well-stocked! No reordering needed."}
-            
-            response = "⚠️ Items needing reorder:\n\n"
-            for item in items:
-                response += f"• {item['name']}: {item['stock']} left\n"
-            
-            return {"response": response, "data": items}
+        response = f"📊 Daily Summary ({summary['date']})\n\n"
+        response += f"💰 Total Sales: Rs.{summary['total_sales']:.2f}/-\n"
+        response += f"📈 Total Profit: Rs.{summary['total_profit']:.2f}/-\n"
+        response += f"🛒 Items Sold: {int(summary['total_items_sold'])}"
         
-        # Handle price recommendation
-        elif intent_type == "recommend_price":
-            product = entities.get("product", "")
-            if not product:
-                return {"response": "Please specify the product name. Example: 'What price for rice?'"}
-            
-            result = recommend_price(user_id, product)
-            if result:
-                return {
-                    "response": f"💡 Price Recommendation for {product}\n\nCost: Rs.{result['cost_price']}/-\nRecommended: Rs.{result['recommended_price']}/- ({result['margin']} margin)",
-                    "data": result
-                }
-            else:
-                return {"response": f"Product '{product}' not found in inventory."}
+        if summary['top_selling_item']:
+            response += f"\n🏆 Top Seller: {summary['top_selling_item']}"
         
-        # Handle greeting
-        elif intent_type == "greeting":
-            # Check if user has products
-            inventory = get_inventory(user_id)
-            if not inventory:
-                return {
-                    "response": "👋 Welcome! I see you're new here.\n\n" +
-                    "📦 **Getting Started:**\n\n" +
-                    "First, add your products by recording purchases:\n" +
-                    "• \"Bought 50 rice at 70\"\n" +
-                    "• \"Bought 20 cooking oil at 280\"\n" +
-                    "• \"Bought 100 sugar at 90\"\n\n" +
-                    "This will add products with stock to your inventory!"
-                }
+        if summary['low_stock_items']:
+            response += f"\n\n⚠️ Low Stock: {len(summary['low_stock_items'])} items need reordering"
+        
+        return {"response": response, "data": summary}
+    
+    # Handle reorder suggestion
+    elif intent_type == "suggest_reorder":
+        result = suggest_reorder(user_id)
+        
+        # Check if user has no products at all
+        if result.get("no_products"):
             return {
-                "response": "👋 Hello! How can I help you today?\n\nI can help you with:\n• Recording sales and purchases\n• Creating invoices\n• Checking inventory\n• Daily summaries\n• Reorder suggestions"
+                "response": "📦 Your inventory is empty!\n\n" +
+                "To add products, record a purchase first:\n" +
+                "• \"Bought 50 rice at 70\"\n" +
+                "• \"Bought 20 oil at 280\"\n" +
+                "• \"Bought 100 sugar at 90\"\n\n" +
+                "This will add products to your inventory with stock."
             }
         
-        # Handle help
-        elif intent_type == "help":
+        items = result.get("items", [])
+        if not items:
+            return {"response": "✅ All items are well-stocked! No reordering needed."}
+        
+        response = "⚠️ Items needing reorder:\n\n"
+        for item in items:
+            response += f"• {item['name']}: {item['stock']} left\n"
+        
+        return {"response": response, "data": items}
+    
+    # Handle price recommendation
+    elif intent_type == "recommend_price":
+        product = entities.get("product", "")
+        if not product:
+            return {"response": "Please specify the product name. Example: 'What price for rice?'"}
+        
+        result = recommend_price(user_id, product)
+        if result:
             return {
-                "response": "📚 Here's what I can do:\n\n" +
-                "**Sales:** \"Sold 5 rice at 80\"\n" +
-                "**Purchases:** \"Bought 10 pens at 20\"\n" +
-                "**Invoice:** \"Invoice for Ahmed: 3 rice at 80\"\n" +
-                "**Inventory:** \"Show inventory\"\n" +
-                "**Summary:** \"Today's summary\"\n" +
-                "**Reorder:** \"What to reorder?\"\n" +
-                "**Price:** \"What price for rice?\""
+                "response": f"💡 Price Recommendation for {product}\n\nCost: Rs.{result['cost_price']}/-\nRecommended: Rs.{result['recommended_price']}/- ({result['margin']} margin)",
+                "data": result
             }
-        
-        # Unknown intent
         else:
+            return {"response": f"Product '{product}' not found in inventory."}
+    
+    # Handle greeting
+    elif intent_type == "greeting":
+        # Check if user has products
+        inventory = get_inventory(user_id)
+        if not inventory:
             return {
-                "response": "🤔 I didn't understand that. Try saying:\n\n" +
-                "• \"Sold 5 items at 100\"\n" +
-                "• \"Bought 10 pens at 20\"\n" +
-                "• \"Show my inventory\"\n" +
-                "• \"Today's summary\"\n\n" +
-                "Type 'help' for more commands."
+                "response": "👋 Welcome! I see you're new here.\n\n" +
+                "📦 **Getting Started:**\n\n" +
+                "First, add your products by recording purchases:\n" +
+                "• \"Bought 50 rice at 70\"\n" +
+                "• \"Bought 20 cooking oil at 280\"\n" +
+                "• \"Bought 100 sugar at 90\"\n\n" +
+                "This will add products with stock to your inventory!"
             }
-            
-    except Exception as e:
-        logger.error(f"Process chat error: {e}")
-        return {"response": f"Sorry, something went wrong. Please try again."}
+        return {
+            "response": "👋 Hello! How can I help you today?\n\nI can help you with:\n• Recording sales and purchases\n• Creating invoices\n• Checking inventory\n• Daily summaries\n• Reorder suggestions"
+        }
+    
+    # Handle help
+    elif intent_type == "help":
+        return {
+            "response": "📚 Here's what I can do:\n\n" +
+            "**Sales:** \"Sold 5 rice at 80\"\n" +
+            "**Purchases:** \"Bought 10 pens at 20\"\n" +
+            "**Invoice:** \"Invoice for Ahmed: 3 rice at 80\"\n" +
+            "**Inventory:** \"Show inventory\"\n" +
+            "**Summary:** \"Today's summary\"\n" +
+            "**Reorder:** \"What to reorder?\"\n" +
+            "**Price:** \"What price for rice?\""
+        }
+    
+    # Unknown intent
+    else:
+        return {
+            "response": "🤔 I didn't understand that. Try saying:\n\n" +
+            "• \"Sold 5 items at 100\"\n" +
+            "• \"Bought 10 pens at 20\"\n" +
+            "• \"Show my inventory\"\n" +
+            "• \"Today's summary\"\n\n" +
+            "Type 'help' for more commands."
+        }
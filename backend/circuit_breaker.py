@@ -0,0 +1,92 @@
+"""
+Circuit breaker for external providers
+
+After `failure_threshold` consecutive failures the breaker opens and calls
+are refused for `cooldown` seconds. The first call after the cooldown is a
+trial (half-open): success closes the breaker, failure opens it again.
+A cancelled call counts as neither; it only gives up the trial slot, so the
+next call becomes the trial.
+"""
+import time
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+class DeadlineExceeded(Exception):
+    """Raised when a provider call does not finish within its latency budget"""
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "rejected": 0, "opened": 0,
+                       "cancelled": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                self._stats["calls"] += 1
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._stats["calls"] += 1
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self, timeout: bool = False):
+        with self._lock:
+            self._stats["failures"] += 1
+            if timeout:
+                self._stats["timeouts"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def record_cancelled(self):
+        """The call was abandoned (cancelled task, closed stream) before an outcome"""
+        with self._lock:
+            self._stats["cancelled"] += 1
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return dict(self._stats, name=self.name, state=state,
+                        consecutive_failures=self._failures, retry_in=round(retry_in, 1))
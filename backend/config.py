@@ -9,15 +9,94 @@ load_dotenv()
 
 # Groq API Configuration (Free LLM API)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "") or None  # e.g. a local stand-in for testing
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+
+# LLM Client Configuration
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # pooled keep-alive connections
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))  # seconds per call
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_INTENT_BUDGET = float(os.getenv("LLM_INTENT_BUDGET", "2.5"))  # seconds before falling back to regex
+LLM_TRANSLATION_BUDGET = float(os.getenv("LLM_TRANSLATION_BUDGET", "8"))  # seconds before falling back to Helsinki
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))  # consecutive failures that open the breaker
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds before a trial call
+
+# Intent Parsing Configuration
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))  # below this, ask the LLM
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.7"))  # multi-command messages with a write below this are not executed
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "5000"))  # templates across all shops
+INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", "86400"))  # seconds
+INTENT_CACHE_PERSIST = os.getenv("INTENT_CACHE_PERSIST", "False").lower() == "true"
+
+# Translation Cache Configuration
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "2000"))  # in-process entries
+TRANSLATION_CACHE_DB_ROWS = int(os.getenv("TRANSLATION_CACHE_DB_ROWS", "50000"))  # persistent entries
+
+# Local Translation Model Configuration (Helsinki-NLP fallback)
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "16"))  # segments per model call
+TRANSLATION_BATCH_WAIT_MS = float(os.getenv("TRANSLATION_BATCH_WAIT_MS", "10"))  # wait for more requests
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "1"))  # worker processes holding the model
+TRANSLATION_TIMEOUT = float(os.getenv("TRANSLATION_TIMEOUT", "60"))  # seconds per batch before the pool restarts
+TRANSLATION_HEALTH_INTERVAL = float(os.getenv("TRANSLATION_HEALTH_INTERVAL", "30"))  # seconds between pings
+TRANSLATION_SERVICE_URL = os.getenv("TRANSLATION_SERVICE_URL", "")  # shared inference_service.py, if running
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "pipeline")  # "pipeline" or "int8" (dynamic quantization)
+TRANSLATION_WARMUP = os.getenv("TRANSLATION_WARMUP", "True").lower() == "true"  # load the model at startup
+TRANSLATION_LOAD_TIMEOUT = float(os.getenv("TRANSLATION_LOAD_TIMEOUT", "600"))  # seconds to download and load
+
+# Product Matching Configuration
+PRODUCT_MATCH_THRESHOLD = float(os.getenv("PRODUCT_MATCH_THRESHOLD", "0.6"))  # trigram similarity for a fuzzy match
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "shopkeeper-ai-secret-key-change-in-production-2024")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "43200"))  # 30 days
 
+# Authentication Cache Configuration
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds a user's role and status are reused
+AUTH_EPOCH_CHECK_INTERVAL = float(os.getenv("AUTH_EPOCH_CHECK_INTERVAL", "1"))  # seconds between checks for changes by other workers
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))  # verified tokens remembered until expiry
+
+# Password Hashing and Login Admission Configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # stored hashes with another cost are rehashed on login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # threads running bcrypt off the event loop
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))  # waiting hashes before logins get 503
+LOGIN_RATE_PER_IP = float(os.getenv("LOGIN_RATE_PER_IP", "30"))  # login attempts per minute per client IP
+LOGIN_RATE_PER_ACCOUNT = float(os.getenv("LOGIN_RATE_PER_ACCOUNT", "10"))  # login attempts per minute per email
+SIGNUP_RATE_PER_IP = float(os.getenv("SIGNUP_RATE_PER_IP", "10"))  # signups per minute per client IP
+
 # Database Configuration
 DB_PATH = os.getenv("DB_PATH", "shopkeeper_assistant.db")
 
+# SQL Profiling Configuration
+SQL_PROFILING = os.getenv("SQL_PROFILING", "False").lower() == "true"  # time every statement by normalized text
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))  # statements slower than this are logged with their plan
+SQL_PROFILE_MAX_STATEMENTS = int(os.getenv("SQL_PROFILE_MAX_STATEMENTS", "500"))  # distinct statements tracked
+
+# Request Tracing Configuration
+TRACING = os.getenv("TRACING", "False").lower() == "true"  # record spans for each request's stages
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # share of requests exported
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))  # slower requests are exported whatever the sample rate
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")  # jsonl or otlp
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+TRACE_OTLP_URL = os.getenv("TRACE_OTLP_URL", "http://127.0.0.1:4318/v1/traces")
+
+# Stock Ledger Configuration
+STOCK_SNAPSHOT_INTERVAL = int(os.getenv("STOCK_SNAPSHOT_INTERVAL", "200"))  # movements per snapshot
+STOCK_RECONCILE_BATCH_SIZE = int(os.getenv("STOCK_RECONCILE_BATCH_SIZE", "500"))
+
+# Metrics Configuration
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # if set, /metrics requires "Authorization: Bearer <token>"
+
 # Application Settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # console
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # rotate early past this size; 0 for daily only
+LOG_BACKUP_DAYS = int(os.getenv("LOG_BACKUP_DAYS", "14"))  # days of rotated files kept; 0 keeps all
+LOG_JSON = os.getenv("LOG_JSON", "False").lower() == "true"  # one JSON object per line in the log file
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))  # share of DEBUG records kept
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records waiting for the writer; more are dropped
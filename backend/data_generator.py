@@ -0,0 +1,488 @@
+"""
+Synthetic data generator - shops with years of sales, purchases and invoices
+
+Fills DB_PATH with N shops x M products x Y years of trading for
+performance testing:
+- sales follow a yearly season that peaks at the year end, a weekly
+  pattern, a bump in the first days of each month, and busy late-morning
+  and evening hours;
+- a shop's trade grows year on year, and busy shops sell several times as
+  much as quiet ones;
+- a few popular products account for most sales;
+- prices drift up with inflation in monthly steps, at a different rate for
+  each product;
+- purchases restock a product the morning after it runs low, and a sale
+  that finds the shelf empty is lost;
+- a few sales are grouped into customer invoices.
+
+Each shop draws from its own random.Random seeded from --seed and the shop
+number, so a given --seed produces the same data whatever --workers is.
+Workers only generate rows. The parent process writes them, since SQLite
+takes one writer at a time. Rows go in with executemany in large
+transactions. The counter triggers are dropped for the load and
+platform_counters is rebuilt at the end. If a load is killed, restart the
+app or run `python platform_stats.py reconcile --fix`.
+
+Run: python data_generator.py [--shops 100] [--products 200] [--years 3] [--sales-per-day 90]
+                              [--seed 42] [--workers 4] [--no-ledger] [--reset]
+"""
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from database import init_database, get_db_connection, SHOP_COUNTED_TABLES
+from stock_ledger import OPENING, PURCHASE, SALE
+from logger_config import logger
+
+EMAIL_DOMAIN = "synthetic.example.com"
+DEFAULT_PASSWORD = "demo123"
+
+COMMIT_ROWS = 500_000  # rows written per transaction (roughly; a shop is never split)
+
+# Different product catalogs for different shop types: (name, cost, selling price)
+SHOP_CATALOGS = {
+    "general": [
+        ("rice", 70, 85), ("wheat flour", 55, 65), ("sugar", 90, 105),
+        ("cooking oil", 280, 320), ("dal", 140, 160), ("salt", 20, 25),
+        ("tea", 450, 520), ("milk powder", 380, 440), ("soap", 35, 45),
+        ("shampoo", 120, 150), ("toothpaste", 85, 100), ("biscuits", 25, 35),
+        ("chips", 15, 20), ("cold drinks", 40, 50), ("bread", 80, 100),
+    ],
+    "electronics": [
+        ("usb cable", 150, 200), ("earphones", 250, 350), ("charger", 300, 400),
+        ("power bank", 800, 1100), ("mouse", 400, 550), ("keyboard", 600, 800),
+        ("led bulb", 80, 120), ("extension cord", 200, 280), ("batteries", 30, 45),
+        ("memory card", 350, 480), ("phone cover", 100, 180), ("screen guard", 50, 100),
+    ],
+    "cosmetics": [
+        ("face cream", 180, 250), ("lipstick", 120, 180), ("foundation", 350, 480),
+        ("mascara", 200, 290), ("nail polish", 60, 95), ("perfume", 450, 620),
+        ("face wash", 150, 210), ("hair oil", 180, 250), ("body lotion", 220, 300),
+        ("sunscreen", 280, 380), ("compact powder", 150, 220), ("kajal", 80, 120),
+    ],
+    "grocery": [
+        ("rice basmati", 180, 220), ("atta", 85, 100), ("ghee", 450, 520),
+        ("milk", 120, 140), ("eggs", 200, 240), ("chicken", 380, 450),
+        ("vegetables mix", 100, 130), ("fruits", 150, 200), ("yogurt", 80, 100),
+        ("butter", 250, 300), ("cheese", 180, 220), ("juice pack", 65, 85),
+        ("noodles", 30, 45), ("pasta", 120, 150), ("sauce", 85, 110),
+    ],
+    "stationery": [
+        ("notebook", 40, 60), ("pen", 15, 25), ("pencil", 8, 15),
+        ("eraser", 10, 18), ("ruler", 20, 35), ("marker", 35, 55),
+        ("highlighter", 45, 70), ("stapler", 120, 180), ("tape", 30, 50),
+        ("glue stick", 40, 65), ("scissors", 60, 95), ("file folder", 50, 80),
+        ("register", 80, 120), ("sticky notes", 55, 85), ("calculator", 250, 380),
+    ],
+}
+SHOP_TYPES = tuple(SHOP_CATALOGS)
+
+# Variant prefix -> price multiplier, used when a shop stocks more products than its base catalog
+VARIANTS = {"": 1.0, "premium": 1.35, "family": 1.8, "small": 0.6, "large": 1.5, "local": 0.85,
+            "imported": 1.6, "organic": 1.4, "economy": 0.75, "mini": 0.5}
+
+CUSTOMER_NAMES = [
+    "Ali Hassan", "Bilal Ahmed", "Imran Khan", "Faisal Shah", "Usman Malik",
+    "Ahmed Raza", "Kamran Ali", "Tariq Mehmood", "Sajid Hussain", "Waseem Khan",
+    "Amir Sohail", "Junaid Ahmed", "Zubair Ali", "Kashif Nawaz", "Rizwan Ahmed",
+    "Fatima Bibi", "Ayesha Khan", "Sana Malik", "Hira Ahmed", "Zara Hussain",
+]
+
+# Opening hours and how busy each one is
+HOUR_WEIGHTS = {8: 2, 9: 4, 10: 8, 11: 9, 12: 7, 13: 5, 14: 4, 15: 4, 16: 5, 17: 7, 18: 10, 19: 11, 20: 9, 21: 5, 22: 2}
+WEEKDAY_FACTORS = (0.95, 0.9, 0.95, 1.0, 1.15, 1.2, 0.85)  # Monday..Sunday
+SEASON_AMPLITUDE = 0.2  # +/- around the yearly mean, peaking in late December
+MONTH_START_FACTOR = 1.15  # pay-day bump on the first five days of a month
+YEARLY_GROWTH = 0.08
+MONTHLY_INFLATION = 0.008  # average price drift; each product gets 0.5x to 1.5x of it
+POPULARITY_EXPONENT = 0.9  # Zipf exponent over a shop's products
+QUANTITY_WEIGHTS = {1: 40, 2: 25, 3: 12, 4: 8, 5: 6, 6: 4, 8: 2, 10: 2, 12: 1}
+INVOICE_RATE = 0.01  # share of sales that start an invoice of 2-5 lines
+REORDER_DAYS = 4  # restock when less than this many days of demand is left...
+RESTOCK_DAYS = 21  # ...up to this many days of demand
+DELIVERY_HOURS = (7, 9)  # purchases arrive before opening
+
+HOURS = tuple(HOUR_WEIGHTS)
+HOUR_CUM = tuple(itertools.accumulate(HOUR_WEIGHTS.values()))
+QUANTITIES = tuple(QUANTITY_WEIGHTS)
+QUANTITY_CUM = tuple(itertools.accumulate(QUANTITY_WEIGHTS.values()))
+MEAN_QUANTITY = sum(q * w for q, w in QUANTITY_WEIGHTS.items()) / sum(QUANTITY_WEIGHTS.values())
+
+_times = None
+
+def _time_of_day() -> list:
+    """'T%H:%M:%S' for every second of the day, so sales do not format timestamps one by one"""
+    global _times
+    if _times is None:
+        _times = [f"T{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+    return _times
+
+def catalog(shop_type: str, count: int) -> list:
+    """`count` distinct (name, cost, price) entries for a shop type, base products first"""
+    base = SHOP_CATALOGS[shop_type]
+    items = []
+    for lot in itertools.count(1):
+        for variant, factor in VARIANTS.items():
+            for name, cost, price in base:
+                name = f"{variant} {name}".strip()
+                if lot > 1:
+                    name = f"{name} lot {lot}"
+                items.append((name, round(cost * factor), round(price * factor)))
+                if len(items) == count:
+                    return items
+
+def day_factor(day: date) -> float:
+    """Expected trade on `day` relative to an average day of the year"""
+    season = 1 + SEASON_AMPLITUDE * math.cos(2 * math.pi * (day.timetuple().tm_yday - 355) / 365.25)
+    factor = season * WEEKDAY_FACTORS[day.weekday()]
+    return factor * MONTH_START_FACTOR if day.day <= 5 else factor
+
+def generate_shop(spec: dict) -> dict:
+    """Rows for one shop, from a spec made by shop_specs(); runs in a worker process"""
+    rng = random.Random(f"{spec['seed']}:{spec['index']}")
+    user_id, first_id = spec["user_id"], spec["first_product_id"]
+    start = date.fromisoformat(spec["start"])
+    days = spec["days"]
+    times = _time_of_day()
+
+    items = catalog(spec["shop_type"], spec["products"])
+    count = len(items)
+    names = [name for name, _, _ in items]
+    level = rng.uniform(0.9, 1.15)  # this shop's prices against the catalog
+    drift = [1 + MONTHLY_INFLATION * rng.uniform(0.5, 1.5) for _ in items]
+    months = (days + 30) // 28 + 1
+
+    def monthly(value: float, rate: float) -> list:
+        return [max(1, round(value * level * rate ** month)) for month in range(months)]
+
+    costs = [monthly(cost, rate) for (_, cost, _), rate in zip(items, drift)]
+    # Selling prices keep a margin of at least one rupee after rounding
+    prices = [[max(p, c + 1) for p, c in zip(monthly(price, rate), cost_steps)]
+              for (_, _, price), rate, cost_steps in zip(items, drift, costs)]
+
+    ranks = list(range(count))
+    rng.shuffle(ranks)
+    weights = [1 / (rank + 1) ** POPULARITY_EXPONENT for rank in ranks]
+    total_weight = sum(weights)
+    cum_weights = list(itertools.accumulate(weights))
+    scale = math.exp(rng.gauss(-0.125, 0.5))  # mean 1; a few shops are several times busier
+    demand = [spec["sales_per_day"] * scale * w / total_weight * MEAN_QUANTITY for w in weights]
+    reorder = [math.ceil(d * REORDER_DAYS) + 2 for d in demand]
+    target = [math.ceil(d * RESTOCK_DAYS) + 10 for d in demand]
+    stock = list(target)
+
+    opened = start.isoformat() + "T08:00:00"
+    products = range(count)
+    sales, purchases, invoices = [], [], []
+    low = set()
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        month = (day.year - start.year) * 12 + day.month - start.month
+        prefix = day.isoformat()
+
+        # Morning deliveries for what ran low yesterday
+        if low:
+            arrivals = sorted(rng.randrange(DELIVERY_HOURS[0] * 3600, DELIVERY_HOURS[1] * 3600) for _ in low)
+            for p, second in zip(sorted(low), arrivals):
+                quantity = target[p] - stock[p]
+                stock[p] = target[p]
+                purchases.append((user_id, first_id + p, names[p], quantity, costs[p][month], prefix + times[second]))
+            low.clear()
+
+        growth = (1 + YEARLY_GROWTH) ** ((offset - days) / 365.25)
+        mean = spec["sales_per_day"] * scale * growth * day_factor(day)
+        n = max(0, round(rng.gauss(mean, math.sqrt(mean)))) if mean > 0 else 0
+        if not n:
+            continue
+        picks = rng.choices(products, cum_weights=cum_weights, k=n)
+        quantities = rng.choices(QUANTITIES, cum_weights=QUANTITY_CUM, k=n)
+        seconds = sorted(h * 3600 + int(rng.random() * 3600) for h in rng.choices(HOURS, cum_weights=HOUR_CUM, k=n))
+
+        # Invoices take a run of consecutive sales and share the first one's time
+        member = {}
+        lines = []
+        position = 0
+        for begin in sorted(rng.sample(range(n), min(n, int(n * INVOICE_RATE + rng.random())))):
+            if begin < position:
+                continue
+            position = min(n, begin + rng.randint(2, 5))
+            for i in range(begin, position):
+                seconds[i] = seconds[begin]
+                member[i] = len(lines)
+            lines.append([])
+
+        for i in range(n):
+            p = picks[i]
+            quantity = quantities[i]
+            left = stock[p]
+            if left < quantity:
+                if left <= 0:
+                    continue  # out of stock: the customer goes elsewhere
+                quantity = left
+            left -= quantity
+            stock[p] = left
+            if left < reorder[p]:
+                low.add(p)
+            price = prices[p][month]
+            at = prefix + times[seconds[i]]
+            sales.append((user_id, first_id + p, names[p], quantity, price, costs[p][month], at))
+            if i in member:
+                lines[member[i]].append((names[p], quantity, price, at))
+
+        number = 0
+        for invoice in lines:
+            if not invoice:
+                continue
+            number += 1
+            items_json = json.dumps([{"name": name, "quantity": q, "price": price} for name, q, price, _ in invoice])
+            invoices.append((user_id, f"INV-{user_id}-{prefix.replace('-', '')}-{number:03d}",
+                             rng.choice(CUSTOMER_NAMES), sum(q * price for _, q, price, _ in invoice),
+                             items_json, invoice[0][3]))
+
+    end = start + timedelta(days=days - 1)
+    month = (end.year - start.year) * 12 + end.month - start.month
+    products_rows = [(first_id + p, user_id, names[p], costs[p][month], prices[p][month], stock[p], opened)
+                     for p in products]
+    return {
+        "index": spec["index"],
+        "user_id": user_id,
+        "products": products_rows,
+        "opening": [(user_id, first_id + p, target[p], OPENING, opened) for p in products],
+        "closing": [(user_id, first_id + p, stock[p], OPENING, opened) for p in products],
+        "sales": sales,
+        "purchases": purchases,
+        "invoices": invoices,
+    }
+
+def _generated(specs: list, workers: int):
+    """generate_shop() for each spec, in order; with workers, a few shops ahead of the writer"""
+    if workers <= 1:
+        for spec in specs:
+            yield generate_shop(spec)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        remaining = iter(specs)
+        # Bounded so finished shops do not pile up in memory while the writer catches up
+        pending = deque(pool.submit(generate_shop, spec) for spec in itertools.islice(remaining, workers * 2))
+        while pending:
+            rows = pending.popleft().result()
+            spec = next(remaining, None)
+            if spec is not None:
+                pending.append(pool.submit(generate_shop, spec))
+            yield rows
+
+def write_shop(cursor, rows: dict, ledger: bool = True) -> dict:
+    """Insert one shop's rows; with ledger, every sale and purchase also gets a stock movement"""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM sales")
+    sales_before = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM purchases")
+    purchases_before = cursor.fetchone()[0]
+
+    cursor.executemany("""
+        INSERT INTO products (id, user_id, name, cost_price, selling_price, stock, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows["products"])
+    cursor.executemany("""
+        INSERT INTO sales (user_id, product_id, product_name, quantity, selling_price, cost_price, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows["sales"])
+    cursor.executemany("""
+        INSERT INTO purchases (user_id, product_id, product_name, quantity, cost_price, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows["purchases"])
+    cursor.executemany("""
+        INSERT INTO invoices (user_id, invoice_number, customer_name, total_amount, items, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows["invoices"])
+
+    # Without the full ledger, one opening movement per product still matches products.stock
+    cursor.executemany("""
+        INSERT INTO stock_movements (user_id, product_id, change, requested, reason, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(user_id, product_id, stock, stock, reason, at)
+          for user_id, product_id, stock, reason, at in rows["opening" if ledger else "closing"]])
+    movements = len(rows["products"])
+    if ledger:
+        # Built from the rows just inserted, in time order, so reference_id points at them
+        cursor.execute("""
+            INSERT INTO stock_movements (user_id, product_id, change, requested, reason, reference_id, created_at)
+            SELECT user_id, product_id, change, change, reason, id, at FROM (
+                SELECT user_id, product_id, quantity AS change, ? AS reason, id, date AS at, 0 AS kind
+                FROM purchases WHERE id > ?
+                UNION ALL
+                SELECT user_id, product_id, -quantity, ?, id, date, 1
+                FROM sales WHERE id > ?
+            ) ORDER BY at, kind, id
+        """, (PURCHASE, purchases_before, SALE, sales_before))
+        movements += cursor.rowcount
+    return {"products": len(rows["products"]), "sales": len(rows["sales"]), "purchases": len(rows["purchases"]),
+            "invoices": len(rows["invoices"]), "movements": movements}
+
+def clear_shops(cursor, user_ids: list, keep_users: bool = False):
+    """Delete the shops' rows from every table with a user_id column, then the users themselves"""
+    if not user_ids:
+        return
+    placeholders = ", ".join("?" * len(user_ids))
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'users'")
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "user_id" in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"DELETE FROM {table} WHERE user_id IN ({placeholders})", user_ids)
+    if not keep_users:
+        cursor.execute(f"DELETE FROM users WHERE id IN ({placeholders})", user_ids)
+
+@contextmanager
+def bulk_load(conn):
+    """Load mode for `conn`: no fsync per commit and no counter triggers; counters are rebuilt on exit"""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+    for table in SHOP_COUNTED_TABLES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_insert_counters")
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_delete_counters")
+    conn.commit()
+    try:
+        yield cursor
+        conn.commit()
+    finally:
+        conn.rollback()
+        init_database()  # puts the triggers back
+        from platform_stats import rebuild_counters
+        rebuild_counters(cursor)
+        conn.commit()
+        cursor.execute("PRAGMA synchronous=FULL")
+
+def next_product_id(cursor) -> int:
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'products'")
+    sequence = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+    return max(sequence, cursor.fetchone()[0]) + 1
+
+def shop_specs(user_ids: list, first_product_id: int, products: int, start: date, days: int,
+               sales_per_day: float, seed: int, shop_type: str = None) -> list:
+    """Generation specs for the shops; product IDs are handed out up front so workers can use them"""
+    specs = []
+    for index, user_id in enumerate(user_ids):
+        kind = shop_type or SHOP_TYPES[index % len(SHOP_TYPES)]
+        count = products or len(SHOP_CATALOGS[kind])
+        specs.append({
+            "index": index, "user_id": user_id, "first_product_id": first_product_id, "shop_type": kind,
+            "products": count, "start": start.isoformat(), "days": days,
+            "sales_per_day": sales_per_day, "seed": seed
+        })
+        first_product_id += count
+    return specs
+
+def load(conn, cursor, specs: list, workers: int = 1, ledger: bool = True, progress=None) -> dict:
+    """Generate and write every shop, committing about every COMMIT_ROWS rows"""
+    totals = {"products": 0, "sales": 0, "purchases": 0, "invoices": 0, "movements": 0}
+    uncommitted = 0
+    for rows in _generated(specs, workers):
+        counts = write_shop(cursor, rows, ledger)
+        for key, value in counts.items():
+            totals[key] += value
+        uncommitted += sum(counts.values())
+        if uncommitted >= COMMIT_ROWS:
+            conn.commit()
+            uncommitted = 0
+        if progress:
+            progress(rows["index"] + 1, totals)
+    conn.commit()
+    return totals
+
+def create_shops(cursor, count: int, password_hash: str, email_domain: str = EMAIL_DOMAIN,
+                 created_at: str = None) -> list:
+    """`count` shopkeeper accounts sharing one password hash; returns (user_id, email) pairs"""
+    created_at = created_at or datetime.now().isoformat()
+    emails = [f"shop{index}@{email_domain}" for index in range(count)]
+    cursor.executemany("""
+        INSERT INTO users (name, email, password_hash, role, shop_name, is_active, created_at)
+        VALUES (?, ?, ?, 'shopkeeper', ?, 1, ?)
+    """, [(f"Shopkeeper {index}", email, password_hash, f"Shop {index}", created_at)
+          for index, email in enumerate(emails)])
+    cursor.execute("SELECT id, email FROM users WHERE email LIKE ? ORDER BY id", (f"%@{email_domain}",))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+def generate(shops: int, products: int, years: float, sales_per_day: float, seed: int = 42, workers: int = 1,
+             ledger: bool = True, reset: bool = False, email_domain: str = EMAIL_DOMAIN,
+             password: str = DEFAULT_PASSWORD, shop_type: str = None, progress=None) -> dict:
+    """Create `shops` shops under `email_domain` with `years` of history ending today"""
+    from auth import get_password_hash
+    init_database()
+    days = max(1, round(years * 365))
+    start = date.today() - timedelta(days=days - 1)
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE email LIKE ?", (f"%@{email_domain}",))
+        existing = [row[0] for row in cursor.fetchall()]
+        if existing and not reset:
+            raise ValueError(f"{len(existing)} shops under {email_domain} already exist; use --reset to replace them")
+
+        with bulk_load(conn) as cursor:
+            clear_shops(cursor, existing)
+            accounts = create_shops(cursor, shops, get_password_hash(password), email_domain,
+                                    start.isoformat() + "T08:00:00")
+            specs = shop_specs([user_id for user_id, _ in accounts], next_product_id(cursor), products,
+                               start, days, sales_per_day, seed, shop_type)
+            totals = load(conn, cursor, specs, workers, ledger, progress)
+        totals.update(shops=shops, emails=[email for _, email in accounts], start=start.isoformat(), days=days)
+        logger.info(f"Generated {shops} shops: {totals['sales']} sales, {totals['purchases']} purchases, "
+                    f"{totals['invoices']} invoices from {start}")
+        return totals
+    except Exception as e:
+        logger.error(f"Data generation failed: {e}")
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic shops and sales history")
+    parser.add_argument("--shops", type=int, default=100)
+    parser.add_argument("--products", type=int, default=200, help="Products per shop (0: the base catalog)")
+    parser.add_argument("--years", type=float, default=3.0, help="Years of history, ending today")
+    parser.add_argument("--sales-per-day", type=float, default=90.0, help="Sales on an average day for a typical shop")
+    parser.add_argument("--shop-type", choices=SHOP_TYPES, help="One catalog for every shop (default: rotate)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating shops in parallel")
+    parser.add_argument("--no-ledger", action="store_true",
+                        help="Skip the stock movement for each sale and purchase (one opening movement per product)")
+    parser.add_argument("--email-domain", default=EMAIL_DOMAIN)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--reset", action="store_true", help="Replace shops generated earlier under the domain")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def progress(done: int, totals: dict):
+        if done % 10 == 0 or done == args.shops:
+            elapsed = time.perf_counter() - started
+            print(f"    {done}/{args.shops} shops, {totals['sales']} sales, "
+                  f"{totals['sales'] / max(elapsed, 1e-9):,.0f} sales/s")
+
+    print(f"[*] Generating {args.shops} shops x {args.products or 'catalog'} products x {args.years:g} years "
+          f"(seed {args.seed}, {args.workers} worker{'s' if args.workers != 1 else ''})")
+    try:
+        totals = generate(args.shops, args.products, args.years, args.sales_per_day, args.seed, args.workers,
+                          not args.no_ledger, args.reset, args.email_domain, args.password, args.shop_type, progress)
+    except ValueError as e:
+        print(f"[!] {e}")
+        return 1
+    elapsed = time.perf_counter() - started
+    print(f"[SUCCESS] {totals['sales']} sales, {totals['purchases']} purchases, {totals['invoices']} invoices, "
+          f"{totals['movements']} stock movements in {elapsed:.1f}s")
+    print(f"   Shops: shop0@{args.email_domain} .. shop{args.shops - 1}@{args.email_domain} / {args.password}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,209 @@
 """
 Database initialization and connection management
 """
+import time
 import sqlite3
 from datetime import datetime
 from config import DB_PATH
 from logger_config import logger
+from metrics import DB_QUERY_LATENCY, DB_CONNECT_LATENCY, DB_CONNECTIONS
+import sql_profiler
+import tracing
+
+def _operation(sql: str) -> str:
+    """Statement kind for metric labels: select, insert, update, ..."""
+    words = sql.split(None, 1)
+    return words[0].lower() if words else "empty"
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement and fetch times in the metrics, and in the
+    SQL profiler when it is enabled"""
+    _sql = None
+    _parameters = None
+    _elapsed = 0.0
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_LATENCY.observe(elapsed, _operation(sql))
+            tracing.record_db(elapsed)
+            if sql_profiler.enabled:
+                self._profile(sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_LATENCY.observe(elapsed, _operation(sql))
+            tracing.record_db(elapsed)
+            if sql_profiler.enabled:
+                self._profile(sql, None, elapsed)
+
+    def fetchall(self):
+        # A large SELECT does most of its work here rather than in execute
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_LATENCY.observe(elapsed, "fetch")
+            tracing.record_db(elapsed)
+            if sql_profiler.enabled and self._sql is not None:
+                self._profile(self._sql, self._parameters, elapsed, calls=0)
+
+    def _profile(self, sql, parameters, elapsed: float, calls: int = 1):
+        """Add the time to the statement's totals; log it once if execute plus fetch went over the threshold"""
+        if calls:
+            self._sql, self._parameters, self._elapsed = sql, parameters, 0.0
+        # A new statement has not been logged yet, even with a 0 ms threshold
+        was_slow = not calls and self._elapsed >= sql_profiler.slow_threshold
+        self._elapsed += elapsed
+        sql_profiler.record(sql, elapsed, calls)
+        if self._elapsed >= sql_profiler.slow_threshold and not was_slow:
+            plan = self._explain(sql, parameters) if sql_profiler.needs_plan(sql) else None
+            sql_profiler.record_slow(sql, self._elapsed, plan)
+
+    def _explain(self, sql, parameters):
+        """EXPLAIN QUERY PLAN on a plain cursor, so it is neither timed nor profiled"""
+        if parameters is None:
+            return None
+        try:
+            rows = sqlite3.Cursor(self.connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+            return [row[3] for row in rows]
+        except sqlite3.Error as e:
+            logger.debug("Could not explain slow query: %s", e)
+            return None
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, including conn.execute shortcuts, are TimedCursors"""
+    _open = False
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self._open:
+            self._open = False
+            DB_CONNECTIONS.dec()
+        super().close()
 
 def get_db_connection():
     """Get a database connection with proper settings for concurrency"""
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30.0, check_same_thread=False)
+        start = time.perf_counter()
+        conn = sqlite3.connect(DB_PATH, timeout=30.0, check_same_thread=False, factory=TimedConnection)
+        conn._open = True
+        DB_CONNECTIONS.inc()
         conn.row_factory = sqlite3.Row
         # Enable WAL mode for better concurrency
         conn.execute('PRAGMA journal_mode=WAL')
         conn.execute('PRAGMA busy_timeout=30000')  # 30 second timeout
+        DB_CONNECT_LATENCY.observe(time.perf_counter() - start)
         return conn
     except Exception as e:
-        logger.error(f"Database connection error: {e}")
+        logger.error("Database connection error: %s", e)
         raise
 
+def _add_column(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table if it is missing (SQLite has no ADD COLUMN IF NOT EXISTS)"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info("Added column %s.%s", table, column)
+
+# Tables counted per shop, with the column that dates a row
+SHOP_COUNTED_TABLES = {"products": "created_at", "sales": "date", "purchases": "date", "invoices": "date"}
+
+def _create_counter_triggers(cursor):
+    """Triggers that keep platform_counters and shop_activity in step with their tables"""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_counters AFTER INSERT ON users BEGIN
+            UPDATE platform_counters SET value = value + 1 WHERE name = 'users';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_counters AFTER DELETE ON users BEGIN
+            UPDATE platform_counters SET value = value - 1 WHERE name = 'users';
+            DELETE FROM shop_activity WHERE user_id = OLD.id;
+        END
+    """)
+    # Users by status and role, for the Admin overview without listing every user
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_status AFTER INSERT ON users BEGIN
+            UPDATE platform_counters SET value = value + NEW.is_active WHERE name = 'users:active';
+            INSERT INTO platform_counters (name, value) VALUES ('role:' || NEW.role, 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_status AFTER DELETE ON users BEGIN
+            UPDATE platform_counters SET value = value - OLD.is_active WHERE name = 'users:active';
+            UPDATE platform_counters SET value = value - 1 WHERE name = 'role:' || OLD.role;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_update_status AFTER UPDATE OF is_active, role ON users BEGIN
+            UPDATE platform_counters SET value = value - OLD.is_active + NEW.is_active WHERE name = 'users:active';
+            UPDATE platform_counters SET value = value - 1 WHERE name = 'role:' || OLD.role;
+            INSERT INTO platform_counters (name, value) VALUES ('role:' || NEW.role, 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END
+    """)
+    for table, date_column in SHOP_COUNTED_TABLES.items():
+        # Sales also keep revenue and a count for the latest day with sales
+        insert_extra = delete_extra = daily = ""
+        if table == "sales":
+            insert_extra = """,
+                    revenue = revenue + NEW.quantity * NEW.selling_price,
+                    sales_today = CASE
+                        WHEN sales_day = substr(NEW.date, 1, 10) THEN sales_today + 1
+                        WHEN sales_day IS NULL OR sales_day < substr(NEW.date, 1, 10) THEN 1
+                        ELSE sales_today END,
+                    sales_day = max(COALESCE(sales_day, ''), substr(NEW.date, 1, 10))"""
+            delete_extra = """,
+                    revenue = revenue - OLD.quantity * OLD.selling_price,
+                    sales_today = CASE WHEN sales_day = substr(OLD.date, 1, 10)
+                        THEN max(sales_today - 1, 0) ELSE sales_today END"""
+            daily = """
+                INSERT INTO platform_counters (name, value) VALUES ('sales:' || substr(NEW.date, 1, 10), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;"""
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_counters AFTER INSERT ON {table} BEGIN
+                UPDATE platform_counters SET value = value + 1 WHERE name = '{table}';{daily}
+                INSERT INTO shop_activity (user_id) VALUES (NEW.user_id) ON CONFLICT (user_id) DO NOTHING;
+                UPDATE shop_activity SET
+                    {table} = {table} + 1,
+                    last_active_at = max(COALESCE(last_active_at, ''), NEW.{date_column}){insert_extra}
+                WHERE user_id = NEW.user_id;
+            END
+        """)
+        daily = """
+                UPDATE platform_counters SET value = value - 1 WHERE name = 'sales:' || substr(OLD.date, 1, 10);""" if table == "sales" else ""
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_counters AFTER DELETE ON {table} BEGIN
+                UPDATE platform_counters SET value = value - 1 WHERE name = '{table}';{daily}
+                UPDATE shop_activity SET {table} = {table} - 1{delete_extra}
+                WHERE user_id = OLD.user_id;
+            END
+        """)
+
 def init_database():
     """Initialize database with all required tables"""
     try:
         conn = sqlite3.connect(DB_PATH, timeout=30.0)
         cursor = conn.cursor()
-        logger.info(f"Initializing database at {DB_PATH}")
+        logger.info("Initializing database at %s", DB_PATH)
         
         # Enable WAL mode for better concurrency
         cursor.execute('PRAGMA journal_mode=WAL')
@@ -44,6 +223,21 @@ def init_database():
             )
         """)
 
+        # Bumped from auth_state.epoch when an account changes, so every worker drops its cached copy
+        _add_column(cursor, "users", "auth_version", "INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_auth_version ON users (auth_version)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS auth_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                epoch INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO auth_state (id, epoch) VALUES (1, 0)")
+
+        # Prefix search for the Admin user list (LIKE 'abc%' uses NOCASE indexes)
+        for column in ("name", "email", "shop_name"):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_users_{column} ON users ({column} COLLATE NOCASE)")
+
         # Products table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS products (
@@ -58,6 +252,13 @@ def init_database():
             )
         """)
 
+        # Barcode/SKU codes for point-of-sale scanning, unique within a shop
+        _add_column(cursor, "products", "barcode", "TEXT")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_products_user_barcode
+            ON products (user_id, barcode) WHERE barcode IS NOT NULL
+        """)
+
         # Sales table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS sales (
@@ -103,6 +304,117 @@ def init_database():
             )
         """)
 
+        # Stock movements ledger (append-only record of every stock change)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_movements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                change REAL NOT NULL,
+                requested REAL,
+                reason TEXT NOT NULL,
+                reference_id INTEGER,
+                note TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_stock_movements_product
+            ON stock_movements (product_id, id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_stock_movements_user
+            ON stock_movements (user_id, created_at)
+        """)
+
+        # Stock snapshots (per-product stock level as of a ledger position)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                stock REAL NOT NULL,
+                last_movement_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_stock_snapshots_product
+            ON stock_snapshots (product_id, last_movement_id)
+        """)
+
+        # Intent cache (LLM parses keyed by per-shop message template)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS intent_cache (
+                user_id INTEGER NOT NULL,
+                template TEXT NOT NULL,
+                entry TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, template)
+            )
+        """)
+
+        # Translation cache (model output keyed by a hash of model and normalized text)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_translation_cache_last_used
+            ON translation_cache (last_used_at)
+        """)
+
+        # Product aliases (alternative names that resolve to a product)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS product_aliases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                alias TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                UNIQUE (user_id, alias),
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+
+        # Platform counters and per-shop activity, kept current by triggers in the
+        # same transaction as every insert or delete (see platform_stats.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS platform_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS shop_activity (
+                user_id INTEGER PRIMARY KEY,
+                products INTEGER NOT NULL DEFAULT 0,
+                sales INTEGER NOT NULL DEFAULT 0,
+                purchases INTEGER NOT NULL DEFAULT 0,
+                invoices INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                sales_today INTEGER NOT NULL DEFAULT 0,
+                sales_day TEXT,
+                last_active_at TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_shop_activity_sales_day ON shop_activity (sales_day)")
+        _create_counter_triggers(cursor)
+        cursor.execute("SELECT 1 FROM platform_counters WHERE name = 'users:active'")
+        if cursor.fetchone() is None:
+            from platform_stats import rebuild_counters
+            rebuild_counters(cursor)
+
         # Create default admin user if not exists
         cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
         if cursor.fetchone()[0] == 0:
@@ -115,15 +427,33 @@ def init_database():
             """, ("Admin", "admin@shopkeeper.com", default_password, "admin", "System", 1, datetime.now().isoformat()))
             logger.info("Default admin user created: admin@shopkeeper.com / admin123")
 
+        # Open the ledger for products that predate it, so replaying the
+        # movements always reproduces products.stock
+        now = datetime.now().isoformat()
+        cursor.execute("""
+            INSERT INTO stock_movements (user_id, product_id, change, requested, reason, note, created_at)
+            SELECT p.user_id, p.id, p.stock, p.stock, 'opening', 'Opening balance', ?
+            FROM products p
+            WHERE p.stock != 0
+              AND NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.product_id = p.id)
+        """, (now,))
+        if cursor.rowcount > 0:
+            logger.info("Recorded opening stock balance for %s products", cursor.rowcount)
+
         # Fix any negative stock values (ensure stock is never negative)
+        cursor.execute("""
+            INSERT INTO stock_movements (user_id, product_id, change, requested, reason, note, created_at)
+            SELECT user_id, id, -stock, -stock, 'adjustment', 'Negative stock reset to 0', ?
+            FROM products WHERE stock < 0
+        """, (now,))
         cursor.execute("UPDATE products SET stock = 0 WHERE stock < 0")
         if cursor.rowcount > 0:
-            logger.info(f"Fixed {cursor.rowcount} products with negative stock")
+            logger.info("Fixed %s products with negative stock", cursor.rowcount)
 
         conn.commit()
         conn.close()
         logger.info("Database initialized successfully")
         
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
         raise
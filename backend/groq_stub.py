@@ -0,0 +1,185 @@
+"""
+Local stand-in for the Groq chat completions API
+
+Serves the OpenAI-compatible /openai/v1/chat/completions endpoint with
+deterministic replies so the intent parser and translator can be exercised
+without network access or an API key. Point the backend at it with:
+
+    GROQ_API_KEY=stub GROQ_BASE_URL=http://127.0.0.1:8765 python run.py
+
+Faults can be injected to exercise the latency budget and circuit breaker:
+a fraction of requests can fail with HTTP 500 or hang, either from the
+command line or at runtime by POSTing {"latency": .., "failure_rate": ..,
+"hang_rate": ..} to /__faults.
+
+Run: python groq_stub.py [--port 8765] [--latency 0.0] [--failure-rate 0.0] [--hang-rate 0.0]
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+FAULTS_PATH = "/__faults"
+HANG_SECONDS = 300
+
+class StubState:
+    """Counters shared by all handler threads"""
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, hang_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.requests = 0
+        self.failures = 0
+        self.hangs = 0
+        self.connections = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+def stub_reply(messages: list) -> str:
+    """Build a deterministic reply for the given chat messages"""
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if "intent parser" in system:
+        from ai_intent_parser import parse_commands_with_regex
+        return json.dumps(parse_commands_with_regex(user))
+    if "translator" in system.lower():
+        # Numbered batches are answered line by line, keeping the numbers
+        lines = [re.sub(r'^(\d+[.)]\s*)?', lambda m: f"{m.group()}[ur] ", line, count=1)
+                 for line in user.splitlines()]
+        return "\n".join(lines)
+    return user
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, request_number: int, model: str, content: str):
+        """Send the reply as OpenAI-style SSE chunks, one word per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-stub-{request_number}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if index == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        state = self.server.state
+        if self.path == FAULTS_PATH:
+            with state.lock:
+                for key in ("latency", "failure_rate", "hang_rate"):
+                    if key in body:
+                        setattr(state, key, float(body[key]))
+            self._send_json(200, {"latency": state.latency, "failure_rate": state.failure_rate,
+                                  "hang_rate": state.hang_rate})
+            return
+
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with state.lock:
+            state.requests += 1
+            request_number = state.requests
+            roll = state.random.random()
+            hang = roll < state.hang_rate
+            fail = not hang and roll < state.hang_rate + state.failure_rate
+            state.hangs += hang
+            state.failures += fail
+        if hang:
+            time.sleep(HANG_SECONDS)
+        if state.latency:
+            time.sleep(state.latency)
+        if fail:
+            self._send_json(500, {"error": {"message": "Injected failure", "type": "internal_server_error"}})
+            return
+
+        content = stub_reply(body.get("messages", []))
+        if body.get("stream"):
+            self._send_stream(request_number, body.get("model", "stub"), content)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{request_number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+def make_server(port: int = 0, latency: float = 0.0, failure_rate: float = 0.0,
+                hang_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Build the stub server; port 0 picks a free port"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency, failure_rate, hang_rate)
+    return server
+
+def start_stub(port: int = 0, latency: float = 0.0, failure_rate: float = 0.0, hang_rate: float = 0.0):
+    """Start the stub on a background thread; returns (server, base_url)"""
+    server = make_server(port, latency, failure_rate, hang_rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Groq API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each reply")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.failure_rate, args.hang_rate)
+    print(f"[*] Groq stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
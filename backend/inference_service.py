@@ -0,0 +1,340 @@
+"""
+Local inference service - the Helsinki-NLP model in dedicated worker processes
+
+The translation model never loads into an API worker. An InferencePool owns
+a small pool of worker processes that each load the model once and run
+padded batches gathered by a MicroBatcher, so inference does not hold the
+API worker's GIL. A monitor thread pings the workers; a crashed or hung pool
+is torn down and restarted.
+
+Run standalone so several uvicorn workers share one copy of the model:
+
+    python inference_service.py --port 8766 --processes 1
+    TRANSLATION_SERVICE_URL=http://127.0.0.1:8766 python run.py
+
+Without TRANSLATION_SERVICE_URL each API process starts its own pool, at
+startup when TRANSLATION_WARMUP is set. Requests fall back instead of
+waiting while the model loads, and a failed load is retried with backoff.
+TRANSLATION_BACKEND=int8 serves a dynamically quantized model.
+"""
+import os
+import json
+import time
+import argparse
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (
+    TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_WAIT_MS, TRANSLATION_WORKERS, TRANSLATION_TIMEOUT,
+    TRANSLATION_HEALTH_INTERVAL, TRANSLATION_BACKEND, TRANSLATION_LOAD_TIMEOUT
+)
+from micro_batcher import MicroBatcher
+from logger_config import logger
+
+HELSINKI_MODEL = "Helsinki-NLP/opus-mt-en-ur"
+BACKENDS = {
+    "pipeline": "inference_service:load_pipeline",
+    "int8": "inference_service:load_quantized_pipeline",
+}
+DEFAULT_LOADER = BACKENDS.get(TRANSLATION_BACKEND, TRANSLATION_BACKEND)
+MAX_RETRY_DELAY = 600  # seconds between attempts to load a model that failed
+
+STARTING = "starting"
+READY = "ready"
+UNAVAILABLE = "unavailable"  # workers are up but the model could not be loaded
+
+def _runner(translator):
+    def run(texts: list) -> list:
+        results = translator(texts, max_length=512, batch_size=len(texts))
+        return [result["translation_text"] for result in results]
+    return run
+
+def load_pipeline(model: str):
+    """Default loader: the stock transformers pipeline on CPU"""
+    from transformers import pipeline
+    return _runner(pipeline("translation", model=model, device=-1))
+
+def load_quantized_pipeline(model: str):
+    """The pipeline with its Linear layers dynamically quantized to int8.
+
+    MarianMT spends most of its CPU time in Linear layers, so this cuts
+    latency and weight memory with a small change in output.
+    """
+    import torch
+    from transformers import pipeline
+    translator = pipeline("translation", model=model, device=-1)
+    translator.model = torch.ao.quantization.quantize_dynamic(translator.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return _runner(translator)
+
+# Worker process state, set by _init_worker
+_worker_run = None
+_worker_error = None
+
+def _init_worker(loader: str, model: str):
+    """Load the model once per worker process; a failure is reported by _ping"""
+    global _worker_run, _worker_error
+    try:
+        module, function = loader.split(":")
+        _worker_run = getattr(importlib.import_module(module), function)(model)
+    except Exception as e:
+        _worker_error = f"{type(e).__name__}: {e}"
+
+def _translate_in_worker(texts: list) -> list:
+    if _worker_run is None:
+        raise RuntimeError(f"Translation model not loaded: {_worker_error}")
+    return _worker_run(texts)
+
+def _ping() -> dict:
+    return {"pid": os.getpid(), "loaded": _worker_run is not None, "error": _worker_error}
+
+class InferencePool:
+    def __init__(self, model: str = HELSINKI_MODEL, loader: str = DEFAULT_LOADER,
+                 processes: int = TRANSLATION_WORKERS, max_batch: int = TRANSLATION_BATCH_SIZE,
+                 max_wait: float = TRANSLATION_BATCH_WAIT_MS / 1000, timeout: float = TRANSLATION_TIMEOUT,
+                 health_interval: float = TRANSLATION_HEALTH_INTERVAL):
+        self.model = model
+        self.loader = loader
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._executor = None
+        self._status = STARTING
+        self._last_error = None
+        self._restarts = 0
+        self._load_failures = 0
+        self._next_retry = 0.0
+        self._started_at = None
+        self._ready_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor_thread = None
+        # One batch in flight per worker process
+        self._batcher = MicroBatcher(self._run_batch, max_batch=max_batch, max_wait=max_wait,
+                                     workers=self.processes, name="inference")
+
+    def start(self):
+        """Start the worker processes and the health monitor"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = self._new_executor()
+            self._started_at = time.monotonic()
+        self._monitor_thread = threading.Thread(target=self._monitor, name="inference-monitor", daemon=True)
+        self._monitor_thread.start()
+        logger.info("Inference pool started: %s processes for %s", self.processes, self.model)
+
+    def _new_executor(self):
+        # spawn, not fork: the API process may already hold threads and sockets
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.loader, self.model)
+        )
+
+    def _restart(self, reason: str, broken=None):
+        """Replace the worker processes, unless another thread already did"""
+        with self._lock:
+            if broken is not None and self._executor is not broken:
+                return
+            old, self._executor = self._executor, self._new_executor()
+            self._status = STARTING
+            self._started_at = time.monotonic()
+            self._ready_at = None
+            self._last_error = reason
+            self._restarts += 1
+        logger.warning("Inference pool restarted: %s", reason)
+        if old is not None:
+            for process in list(getattr(old, "_processes", {}).values()):
+                process.terminate()
+            old.shutdown(wait=False, cancel_futures=True)
+
+    def _run_batch(self, texts: list) -> list:
+        if self._executor is None:
+            self.start()
+        executor = self._executor
+        try:
+            return executor.submit(_translate_in_worker, texts).result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._restart("worker process crashed", broken=executor)
+            raise
+        except FutureTimeoutError:
+            self._restart(f"batch exceeded {self.timeout}s", broken=executor)
+            raise
+
+    def check(self) -> str:
+        """Ping every worker process and update the pool status"""
+        if self._executor is None:
+            self.start()
+        executor = self._executor
+        # A pool that is still starting may be downloading and loading the model
+        timeout = TRANSLATION_LOAD_TIMEOUT if self._status == STARTING else self.timeout
+        try:
+            pings = [executor.submit(_ping) for _ in range(self.processes)]
+            results = [ping.result(timeout=timeout) for ping in pings]
+        except BrokenProcessPool:
+            self._restart("worker process crashed", broken=executor)
+            return self._status
+        except FutureTimeoutError:
+            self._restart("health check timed out", broken=executor)
+            return self._status
+
+        failed = next((r for r in results if not r["loaded"]), None)
+        with self._lock:
+            was = self._status
+            if failed:
+                # Retry the load later with backoff instead of giving up for good
+                self._status = UNAVAILABLE
+                self._last_error = failed["error"]
+                if was == STARTING:
+                    self._load_failures += 1
+                    delay = min(MAX_RETRY_DELAY, self.health_interval * 2 ** (self._load_failures - 1))
+                    self._next_retry = time.monotonic() + delay
+            else:
+                self._status = READY
+                self._load_failures = 0
+                if was != READY:
+                    self._ready_at = time.monotonic()
+        if failed and was == STARTING:
+            logger.error("Translation model failed to load: %s", failed["error"])
+        elif not failed and was != READY:
+            logger.info("Translation model ready after %.1fs", self._ready_at - self._started_at)
+        return self._status
+
+    def _monitor(self):
+        while True:
+            try:
+                if self._status == UNAVAILABLE and time.monotonic() >= self._next_retry:
+                    self._restart("retrying model load")
+                self.check()
+            except Exception as e:
+                logger.error("Inference health check error: %s", e)
+            # A restarted pool is checked again right away rather than after a full interval
+            if self._stop.wait(1 if self._status == STARTING else self.health_interval):
+                break
+
+    @property
+    def ready(self) -> bool:
+        return self._status == READY
+
+    def translate(self, texts: list) -> list:
+        """Translate texts in the worker processes, batched with concurrent callers.
+
+        Raises instead of waiting while the model is still loading, so a
+        request never blocks on warm-up.
+        """
+        if self._executor is None:
+            self.start()
+        if self._status != READY:
+            raise RuntimeError(f"Translation model {self._status}: {self._last_error or 'loading'}")
+        return self._batcher.map(texts, timeout=self.timeout * 2)
+
+    def health(self) -> dict:
+        with self._lock:
+            health = {
+                "status": self._status,
+                "ready": self._status == READY,
+                "model": self.model,
+                "backend": self.loader,
+                "processes": self.processes,
+                "restarts": self._restarts,
+                "last_error": self._last_error,
+                "load_seconds": round(self._ready_at - self._started_at, 1) if self._ready_at else None
+            }
+        health["batching"] = self._batcher.get_stats()
+        return health
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+class ServiceClient:
+    """Reaches a standalone inference service over local HTTP"""
+    def __init__(self, base_url: str, timeout: float = TRANSLATION_TIMEOUT):
+        import httpx
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.Client(timeout=timeout)
+
+    def translate(self, texts: list) -> list:
+        response = self._client.post(f"{self.base_url}/translate", json={"texts": texts})
+        response.raise_for_status()
+        return response.json()["translations"]
+
+    def health(self) -> dict:
+        try:
+            response = self._client.get(f"{self.base_url}/health")
+            return dict(response.json(), service=self.base_url)
+        except Exception as e:
+            return {"status": UNAVAILABLE, "ready": False, "service": self.base_url, "last_error": str(e)}
+
+    @property
+    def ready(self) -> bool:
+        return self.health()["status"] == READY
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"detail": f"Unknown path {self.path}"})
+            return
+        self._send_json(200, self.server.pool.health())
+
+    def do_POST(self):
+        if self.path != "/translate":
+            self._send_json(404, {"detail": f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        try:
+            self._send_json(200, {"translations": self.server.pool.translate(body.get("texts", []))})
+        except Exception as e:
+            self._send_json(503, {"detail": str(e)})
+
+def start_service(pool: InferencePool, port: int = 0):
+    """Serve the pool on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), ServiceHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local translation inference service")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--processes", type=int, default=TRANSLATION_WORKERS)
+    parser.add_argument("--backend", default=TRANSLATION_BACKEND,
+                        help=f"{' or '.join(BACKENDS)}, or a module:function that loads the model")
+    args = parser.parse_args()
+
+    pool = InferencePool(loader=BACKENDS.get(args.backend, args.backend), processes=args.processes)
+    pool.start()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), ServiceHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    print(f"[*] Inference service listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
@@ -0,0 +1,243 @@
+"""
+Intent cache - reuses LLM parses for messages with the same shape
+
+Messages are reduced to a template by masking numbers and the shop's known
+product names ("sold 3 sugar at 90" -> "sold <n> <p> at <n>"). The cached
+entities keep slots where those values appeared, and a hit re-binds the new
+message's values into them. Entries are scoped per shop and evicted by LRU
+and TTL; with INTENT_CACHE_PERSIST they are also written to SQLite so they
+survive restarts.
+"""
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from config import INTENT_CACHE_SIZE, INTENT_CACHE_TTL, INTENT_CACHE_PERSIST
+from database import get_db_connection
+import product_index
+from metrics import register_collector
+from logger_config import logger
+
+# "1,000" is one number, as in the regex parser
+NUMBER_PATTERN = re.compile(r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?')
+SLOT_KEY = "__slot__"
+
+_cache = OrderedDict()  # (user_id, template) -> (expires_at, entry)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def _known_products(user_id: int) -> list:
+    """Product names of a shop, longest first so multi-word names mask before their parts"""
+    return product_index.product_names(user_id)
+
+def make_template(message: str, product_names: list):
+    """Mask product names and numbers; returns (template, values) in message order"""
+    text = " ".join(message.lower().split())
+    found = []  # (start, end, kind, value)
+    taken = [False] * len(text)
+
+    for name in product_names:
+        for match in re.finditer(r'(?<!\w)' + re.escape(name) + r'(?!\w)', text):
+            start, end = match.span()
+            if not any(taken[start:end]):
+                found.append((start, end, "p", name))
+                taken[start:end] = [True] * (end - start)
+
+    for match in NUMBER_PATTERN.finditer(text):
+        start, end = match.span()
+        if not any(taken[start:end]):
+            found.append((start, end, "n", float(match.group().replace(",", ""))))
+
+    found.sort()
+    parts, values, last = [], [], 0
+    for start, end, kind, value in found:
+        parts.append(text[last:start])
+        parts.append(f"<{kind}>")
+        values.append((kind, value))
+        last = end
+    parts.append(text[last:])
+    return "".join(parts), values
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(",", ""))
+        except ValueError:
+            return None
+    return None
+
+def _to_slots(entities, values):
+    """Replace entity values that came from the message with slot markers.
+
+    Raises ValueError when a value matches more than one slot, since the
+    template could not tell them apart on re-binding.
+    """
+    if isinstance(entities, dict):
+        return {k: _to_slots(v, values) for k, v in entities.items()}
+    if isinstance(entities, list):
+        return [_to_slots(v, values) for v in entities]
+
+    number = _as_number(entities)
+    matches = []
+    for index, (kind, value) in enumerate(values):
+        if kind == "n" and number is not None and number == value:
+            matches.append(index)
+        elif kind == "p" and isinstance(entities, str) and entities.strip().lower() == value:
+            matches.append(index)
+    if len(matches) > 1:
+        raise ValueError("ambiguous slot")
+    if matches:
+        return {SLOT_KEY: matches[0], "type": type(entities).__name__}
+    return entities
+
+def _bind(entities, values):
+    """Fill slot markers with the values of the current message"""
+    if isinstance(entities, dict):
+        if SLOT_KEY in entities:
+            value = values[entities[SLOT_KEY]][1]
+            kind = entities.get("type")
+            if kind == "str":
+                return value if isinstance(value, str) else f"{value:g}"
+            if kind == "int" and isinstance(value, float) and value.is_integer():
+                return int(value)
+            return value
+        return {k: _bind(v, values) for k, v in entities.items()}
+    if isinstance(entities, list):
+        return [_bind(v, values) for v in entities]
+    return entities
+
+def _put(key, entry, expires_at):
+    """Insert under the lock, evicting least recently used entries past capacity"""
+    _cache[key] = (expires_at, entry)
+    _cache.move_to_end(key)
+    while len(_cache) > INTENT_CACHE_SIZE:
+        _cache.popitem(last=False)
+        _stats["evictions"] += 1
+
+def lookup(user_id: int, message: str) -> Optional[list]:
+    """Return the cached intents re-bound to this message, or None on a miss"""
+    try:
+        template, values = make_template(message, _known_products(user_id))
+    except Exception as e:
+        logger.warning("Intent cache template error: %s", e)
+        return None
+
+    key = (user_id, template)
+    with _lock:
+        item = _cache.get(key)
+        if item is None or item[0] < time.time():
+            if item is not None:
+                del _cache[key]
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        entry = item[1]
+
+    if entry["slots"] != len(values):
+        return None
+    return [
+        {"intent": cached["intent"], "entities": _bind(cached["entities"], values)}
+        for cached in entry["intents"]
+    ]
+
+def store(user_id: int, message: str, intents: list):
+    """Cache an LLM parse (a list of intents) under the message's template"""
+    try:
+        template, values = make_template(message, _known_products(user_id))
+        entry = {
+            "intents": [
+                {"intent": i.get("intent", "unknown"), "entities": _to_slots(i.get("entities", {}), values)}
+                for i in intents
+            ],
+            "slots": len(values)
+        }
+    except ValueError:
+        return
+    except Exception as e:
+        logger.warning("Intent cache store error: %s", e)
+        return
+
+    with _lock:
+        _put((user_id, template), entry, time.time() + INTENT_CACHE_TTL)
+        _stats["stores"] += 1
+
+    if INTENT_CACHE_PERSIST:
+        _persist(user_id, template, entry)
+
+def _persist(user_id: int, template: str, entry: dict):
+    conn = None
+    try:
+        conn = get_db_connection()
+        conn.execute("""
+            INSERT OR REPLACE INTO intent_cache (user_id, template, entry, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, template, json.dumps(entry), datetime.now().isoformat()))
+        conn.commit()
+    except Exception as e:
+        logger.warning("Intent cache persist error: %s", e)
+    finally:
+        if conn:
+            conn.close()
+
+def load_persisted():
+    """Warm the in-memory cache from SQLite (no-op unless INTENT_CACHE_PERSIST is set)"""
+    if not INTENT_CACHE_PERSIST:
+        return 0
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cutoff = datetime.fromtimestamp(time.time() - INTENT_CACHE_TTL).isoformat()
+        cursor.execute("DELETE FROM intent_cache WHERE created_at < ?", (cutoff,))
+        cursor.execute("""
+            SELECT user_id, template, entry, created_at FROM intent_cache
+            ORDER BY created_at DESC LIMIT ?
+        """, (INTENT_CACHE_SIZE,))
+        rows = cursor.fetchall()
+        conn.commit()
+
+        with _lock:
+            # Oldest first, so the most recent entries end up most recently used
+            for user_id, template, entry, created_at in reversed(rows):
+                expires_at = datetime.fromisoformat(created_at).timestamp() + INTENT_CACHE_TTL
+                _put((user_id, template), json.loads(entry), expires_at)
+        logger.info("Intent cache loaded %s templates", len(rows))
+        return len(rows)
+    except Exception as e:
+        logger.warning("Intent cache load error: %s", e)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def clear(user_id: int = None):
+    """Drop cached templates for one shop, or all of them"""
+    with _lock:
+        for key in [k for k in _cache if user_id is None or k[0] == user_id]:
+            del _cache[key]
+
+def get_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, size=len(_cache), capacity=INTENT_CACHE_SIZE)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+def _collect_metrics() -> list:
+    stats = get_cache_stats()
+    return [
+        ("intent_cache_lookups_total", "counter", "Intent cache lookups by result",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("intent_cache_hit_ratio", "gauge", "Share of messages parsed from the intent cache", [({}, stats["hit_ratio"])]),
+        ("intent_cache_entries", "gauge", "Cached intent templates", [({}, stats["size"])]),
+    ]
+
+register_collector(_collect_metrics)
@@ -0,0 +1,239 @@
+"""
+Shared LLM client manager - one pooled, keep-alive Groq client per process
+
+The intent parser and the translator both go through this module so every
+chat message reuses warm HTTP connections instead of building a new client
+(and a new TLS handshake) per call. Calls can carry a latency budget, and a
+circuit breaker stops calling Groq for a cooldown after repeated failures.
+"""
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+from config import (
+    GROQ_API_KEY, GROQ_BASE_URL, GROQ_MODEL, LLM_POOL_SIZE, LLM_TIMEOUT,
+    LLM_CONNECT_TIMEOUT, LLM_KEEPALIVE_EXPIRY, LLM_MAX_RETRIES,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+)
+from circuit_breaker import CircuitBreaker, CircuitOpenError, DeadlineExceeded
+from metrics import LLM_LATENCY, register_collector
+from logger_config import logger
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+# Calls with a latency budget run here so the caller can stop waiting
+_executor = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+groq_breaker = CircuitBreaker("groq", LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+
+def _http_options():
+    """Connection pool and timeout settings shared by the sync and async clients"""
+    import httpx
+    limits = httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_SIZE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+    return limits, timeout
+
+def _observe(kind: str, outcome: str, start: float):
+    LLM_LATENCY.observe(time.perf_counter() - start, kind, outcome)
+
+def get_llm_client():
+    """Get the shared Groq client, creating it on first use"""
+    global _client
+    if _client is None and GROQ_API_KEY:
+        with _lock:
+            if _client is None:
+                try:
+                    import httpx
+                    from groq import Groq
+                    limits, timeout = _http_options()
+                    _client = Groq(
+                        api_key=GROQ_API_KEY,
+                        base_url=GROQ_BASE_URL,
+                        timeout=timeout,
+                        max_retries=LLM_MAX_RETRIES,
+                        http_client=httpx.Client(limits=limits, timeout=timeout)
+                    )
+                    logger.info("Groq client initialized (pool size %s)", LLM_POOL_SIZE)
+                except Exception as e:
+                    logger.error("Failed to initialize Groq client: %s", e)
+    return _client
+
+def get_async_llm_client():
+    """Get the shared async Groq client, creating it on first use"""
+    global _async_client
+    if _async_client is None and GROQ_API_KEY:
+        with _lock:
+            if _async_client is None:
+                try:
+                    import httpx
+                    from groq import AsyncGroq
+                    limits, timeout = _http_options()
+                    _async_client = AsyncGroq(
+                        api_key=GROQ_API_KEY,
+                        base_url=GROQ_BASE_URL,
+                        timeout=timeout,
+                        max_retries=LLM_MAX_RETRIES,
+                        http_client=httpx.AsyncClient(limits=limits, timeout=timeout)
+                    )
+                    logger.info("Async Groq client initialized (pool size %s)", LLM_POOL_SIZE)
+                except Exception as e:
+                    logger.error("Failed to initialize async Groq client: %s", e)
+    return _async_client
+
+def _completion_kwargs(messages: list, temperature: float, max_tokens: int,
+                       timeout: Optional[float], model: Optional[str]) -> dict:
+    kwargs = {
+        "model": model or GROQ_MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    return kwargs
+
+def _guarded_call(call, budget: Optional[float]):
+    """Run a provider call through the breaker, with a wall-clock deadline if `budget` is set"""
+    start = time.perf_counter()
+    if not groq_breaker.allow():
+        _observe("sync", "circuit_open", start)
+        raise CircuitOpenError(f"Groq circuit open, retry in {groq_breaker.snapshot()['retry_in']}s")
+    try:
+        if budget is None:
+            response = call()
+        else:
+            # The SDK timeout applies per network operation (and per retry);
+            # the future enforces the total. A call that overruns keeps its
+            # worker thread until the SDK timeout ends it.
+            response = _executor.submit(call).result(timeout=budget)
+    except FutureTimeoutError:
+        groq_breaker.record_failure(timeout=True)
+        _observe("sync", "timeout", start)
+        raise DeadlineExceeded(f"Groq call exceeded {budget}s budget")
+    except Exception:
+        groq_breaker.record_failure()
+        _observe("sync", "error", start)
+        raise
+    except BaseException:
+        # Cancelled or closed by the caller: no outcome, but the trial slot is freed
+        groq_breaker.record_cancelled()
+        _observe("sync", "cancelled", start)
+        raise
+    groq_breaker.record_success()
+    _observe("sync", "ok", start)
+    return response
+
+def chat_completion(messages: list, temperature: float = 0.1, max_tokens: int = 200,
+                    timeout: Optional[float] = None, model: Optional[str] = None,
+                    budget: Optional[float] = None) -> Optional[str]:
+    """Run a chat completion and return the reply text, or None if no client is configured.
+
+    API errors are raised to the caller, which decides on its own fallback.
+    With `budget`, DeadlineExceeded is raised once that many seconds pass;
+    CircuitOpenError is raised without calling Groq while the breaker is open.
+    """
+    client = get_llm_client()
+    if not client:
+        return None
+    kwargs = _completion_kwargs(messages, temperature, max_tokens, timeout or budget, model)
+    response = _guarded_call(lambda: client.chat.completions.create(**kwargs), budget)
+    return response.choices[0].message.content.strip()
+
+async def achat_completion(messages: list, temperature: float = 0.1, max_tokens: int = 200,
+                           timeout: Optional[float] = None, model: Optional[str] = None,
+                           budget: Optional[float] = None) -> Optional[str]:
+    """Async variant of chat_completion"""
+    client = get_async_llm_client()
+    if not client:
+        return None
+    start = time.perf_counter()
+    if not groq_breaker.allow():
+        _observe("async", "circuit_open", start)
+        raise CircuitOpenError(f"Groq circuit open, retry in {groq_breaker.snapshot()['retry_in']}s")
+    kwargs = _completion_kwargs(messages, temperature, max_tokens, timeout or budget, model)
+    try:
+        response = await asyncio.wait_for(client.chat.completions.create(**kwargs), budget)
+    except asyncio.TimeoutError:
+        groq_breaker.record_failure(timeout=True)
+        _observe("async", "timeout", start)
+        raise DeadlineExceeded(f"Groq call exceeded {budget}s budget")
+    except Exception:
+        groq_breaker.record_failure()
+        _observe("async", "error", start)
+        raise
+    except BaseException:
+        groq_breaker.record_cancelled()
+        _observe("async", "cancelled", start)
+        raise
+    groq_breaker.record_success()
+    _observe("async", "ok", start)
+    return response.choices[0].message.content.strip()
+
+async def astream_chat_completion(messages: list, temperature: float = 0.1, max_tokens: int = 200,
+                                  model: Optional[str] = None, budget: Optional[float] = None):
+    """Stream a chat completion, yielding text deltas as they arrive.
+
+    `budget` bounds the wait for the stream to open. Yields nothing if no
+    client is configured.
+    """
+    client = get_async_llm_client()
+    if not client:
+        return
+    start = time.perf_counter()
+    if not groq_breaker.allow():
+        _observe("stream", "circuit_open", start)
+        raise CircuitOpenError(f"Groq circuit open, retry in {groq_breaker.snapshot()['retry_in']}s")
+    kwargs = _completion_kwargs(messages, temperature, max_tokens, None, model)
+    try:
+        stream = await asyncio.wait_for(client.chat.completions.create(stream=True, **kwargs), budget)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except asyncio.TimeoutError:
+        groq_breaker.record_failure(timeout=True)
+        _observe("stream", "timeout", start)
+        raise DeadlineExceeded(f"Groq stream did not open within {budget}s budget")
+    except Exception:
+        groq_breaker.record_failure()
+        _observe("stream", "error", start)
+        raise
+    except BaseException:
+        groq_breaker.record_cancelled()
+        _observe("stream", "cancelled", start)
+        raise
+    groq_breaker.record_success()
+    # The whole stream, first token to last
+    _observe("stream", "ok", start)
+
+def get_llm_stats() -> dict:
+    """Circuit breaker state and call counts for the LLM provider"""
+    return groq_breaker.snapshot()
+
+async def close_llm_clients():
+    """Close pooled connections (called on application shutdown)"""
+    global _client, _async_client
+    client, async_client = _client, _async_client
+    _client = _async_client = None
+    try:
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            await async_client.close()
+    except Exception as e:
+        logger.warning("Error closing Groq clients: %s", e)
+
+def _collect_metrics() -> list:
+    stats = groq_breaker.snapshot()
+    return [
+        ("groq_circuit_open", "gauge", "1 while the Groq circuit breaker refuses calls",
+         [({}, 1 if stats["state"] == "open" else 0)]),
+        ("groq_calls_rejected_total", "counter", "Calls refused by the open circuit", [({}, stats["rejected"])]),
+    ]
+
+register_collector(_collect_metrics)
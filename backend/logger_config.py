@@ -1,38 +1,177 @@
 """
 Logging configuration for the application
+
+Records are handed to a queue and written by a background listener
+thread, so a log call on the event loop does not wait on disk I/O. The
+file rotates at midnight and whenever it grows past LOG_MAX_BYTES; rotated
+files older than LOG_BACKUP_DAYS days are deleted.
+LOG_JSON=True writes one JSON object per line. Each record carries the ID
+of the request it was logged in.
+
+Use lazy formatting on hot paths, so messages below the level are never
+built:
+
+    logger.debug("Regex parsed (%s): %s", confidence, results)
+
+Only a sample (LOG_DEBUG_SAMPLE_RATE) of DEBUG records is kept.
 """
-import logging
 import os
-from datetime import datetime
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import contextvars
+import re
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from config import (
+    LOG_LEVEL, LOG_FILE_LEVEL, LOG_DIR, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_DAYS, LOG_JSON,
+    LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE
+)
+
+# Set per request by the tracing middleware
+request_id = contextvars.ContextVar("request_id", default=None)
+
+_IMMUTABLE = (str, int, float, bool, type(None))
+
+# Date in a rotated file's suffix: app.log.2026-10-19 or app.log.2026-10-19.1
+_ROTATED_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:\.\d+)?$")
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID and sample DEBUG records"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno == logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1 and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+            return False
+        record.request_id = request_id.get() or "-"
+        return True
+
+class BackgroundQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread and drops records when the queue is full"""
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The record stays in this process, so it need not be made picklable.
+        # Arguments that could change before the writer gets to them are
+        # rendered now; plain values are left for the writer thread.
+        if record.args and not all(isinstance(arg, _IMMUTABLE) for arg in (
+                record.args.values() if isinstance(record.args, dict) else record.args)):
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # SimpleQueue is unbounded and lock-free to put to; the size check keeps
+        # a stalled writer from growing it without limit
+        if self.queue.qsize() >= LOG_QUEUE_SIZE:
+            BackgroundQueueHandler.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Rotates at midnight and also when the file reaches max_bytes; same-day
+    backups get a counter (app.log.2026-10-19.1) instead of overwriting each other.
+
+    Retention is by date: backups dated more than backup_days ago are deleted,
+    however many size rotations a busy day produced. backupCount is left at 0
+    so the base class does not also prune by file count.
+    """
+    def __init__(self, filename: str, max_bytes: int, backup_days: int = 0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.backup_days = backup_days
+        self.namer = self._unique_name
 
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
+    def doRollover(self):
+        super().doRollover()
+        if self.backup_days > 0:
+            for path in self.expired_backups():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # already gone, or still open elsewhere; the next rollover retries
+
+    def expired_backups(self) -> list:
+        """Rotated files dated before the last backup_days days"""
+        cutoff = (datetime.now() - timedelta(days=self.backup_days)).date().isoformat()
+        directory, base = os.path.split(self.baseFilename)
+        expired = []
+        for name in os.listdir(directory):
+            match = _ROTATED_DATE.match(name[len(base) + 1:]) if name.startswith(base + ".") else None
+            if match and match.group(1) < cutoff:
+                expired.append(os.path.join(directory, name))
+        return expired
+
+    def shouldRollover(self, record) -> bool:
+        if super().shouldRollover(record):
+            return True
+        return bool(self.max_bytes) and self.stream is not None and self.stream.tell() >= self.max_bytes
+
+    @staticmethod
+    def _unique_name(name: str) -> str:
+        candidate, index = name, 0
+        while os.path.exists(candidate):
+            index += 1
+            candidate = f"{name}.{index}"
+        return candidate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "source": f"{record.filename}:{record.lineno}"
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _build_handlers() -> list:
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(LOG_LEVEL)
+    console_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    ))
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = SizedTimedRotatingFileHandler(
+        os.path.join(LOG_DIR, LOG_FILE), LOG_MAX_BYTES,
+        backup_days=LOG_BACKUP_DAYS, when="midnight", encoding='utf-8', delay=True
+    )
+    file_handler.setLevel(LOG_FILE_LEVEL)
+    file_handler.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(filename)s:%(lineno)d - %(message)s'
+    ))
+    return [console_handler, file_handler]
+
+def shutdown_logging():
+    """Flush the queue and stop the writer thread; safe to call more than once"""
+    global listener
+    if listener is not None:
+        current, listener = listener, None
+        current.stop()
 
 # Create logger
 logger = logging.getLogger("shopkeeper_ai")
-logger.setLevel(logging.DEBUG)
+listener = None
 
 # Prevent duplicate handlers
 if not logger.handlers:
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_format = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%H:%M:%S'
-    )
-    console_handler.setFormatter(console_format)
-    logger.addHandler(console_handler)
-
-    # File handler
-    log_file = f"logs/app_{datetime.now().strftime('%Y%m%d')}.log"
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-    file_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
-    )
-    file_handler.setFormatter(file_format)
-    logger.addHandler(file_handler)
+    handlers = _build_handlers()
+    # The logger level is the most verbose handler level, so calls below it return immediately
+    logger.setLevel(min(handler.level for handler in handlers))
+    queue_handler = BackgroundQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestContextFilter())
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Write out what is still queued when the process exits
+    atexit.register(lambda: shutdown_logging())
 
 # Suppress noisy loggers
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -2,26 +2,40 @@
 ShopKeeperAI - Advanced AI Assistant for Small Shopkeepers
 Production-ready FastAPI backend
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 import json
 
 from database import init_database, get_db_connection
 from auth import (
-    get_password_hash, verify_password, create_access_token, 
-    get_current_user, require_admin, ACCESS_TOKEN_EXPIRE_MINUTES
+    hash_password, check_password, create_access_token, enforce_rate_limit, rehash_password, PasswordHashBusy,
+    login_ip_limiter, login_account_limiter, signup_ip_limiter,
+    get_current_user, require_admin, mark_user_changed, invalidate_user, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from business_logic import (
-    process_chat_message, get_inventory, get_daily_summary,
-    get_all_invoices, get_low_stock_notifications
+    process_chat_message, execute_intents, stream_free_form_reply, get_inventory,
+    get_daily_summary, get_all_invoices, get_low_stock_notifications, record_scan, import_barcodes
 )
-from translation import translate_to_urdu
+from stock_ledger import adjust_stock, get_movements, get_stock_at, take_snapshots
+from translation import translate_to_urdu, get_translator_stats, shutdown_translator, warm_up_translator
+from translation_cache import get_cache_stats as get_translation_cache_stats
+from llm_client import close_llm_clients
+from ai_intent_parser import get_parser_stats, parse_intents
+from intent_cache import load_persisted as load_intent_cache
+from product_index import add_alias, get_index_stats
+from platform_stats import get_platform_stats, get_shop_activity, shop_activity_from_row, SHOP_COLUMNS
+import sql_profiler
+import tracing
+from metrics import render as render_metrics, HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT
 from logger_config import logger
-from config import GROQ_API_KEY
+from config import GROQ_API_KEY, TRANSLATION_WARMUP, METRICS_TOKEN
+import time
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -52,6 +66,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """Give every request an ID and a trace, and count and time it by route template,
+    so /inventory/5 and /inventory/6 share a series"""
+    start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    status_code = 500
+    with tracing.request_trace(request.method, request.headers.get("X-Request-ID")) as root:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            response.headers["X-Request-ID"] = tracing.current_request_id()
+            if root is not None:
+                # The body (a StreamingResponse's stages included) runs after call_next returns
+                tracing.hold(root)
+                response.body_iterator = tracing.end_after(root, response.body_iterator)
+            return response
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - start, request.method, path)
+            HTTP_REQUESTS.inc(request.method, path, str(status_code))
+            if root is not None:
+                root.name = f"{request.method} {path}"
+                root.set("http.status", status_code)
+
 # Pydantic models
 class UserSignup(BaseModel):
     name: str
@@ -65,6 +106,28 @@ class ChatMessage(BaseModel):
 class TranslateRequest(BaseModel):
     text: str
 
+class StockAdjustment(BaseModel):
+    stock: float
+    note: Optional[str] = None
+
+class ProductAlias(BaseModel):
+    alias: str
+
+class ScanRequest(BaseModel):
+    code: str
+    quantity: float = 1
+    price: Optional[float] = None
+
+class BarcodeItem(BaseModel):
+    barcode: str
+    product_id: Optional[int] = None
+    name: Optional[str] = None
+    cost_price: Optional[float] = None
+    selling_price: Optional[float] = None
+
+class BarcodeImport(BaseModel):
+    items: List[BarcodeItem]
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
@@ -75,15 +138,26 @@ class TokenResponse(BaseModel):
 async def startup_event():
     try:
         init_database()
+        take_snapshots()
+        load_intent_cache()
+        if TRANSLATION_WARMUP:
+            # Loads in the worker processes; /health reports when it is ready
+            warm_up_translator()
         logger.info("Application started successfully")
         if GROQ_API_KEY:
             logger.info("Groq API key configured")
         else:
             logger.warning("Groq API key not found - using fallback parser")
     except Exception as e:
-        logger.error(f"Failed to initialize application: {e}")
+        logger.error("Failed to initialize application: %s", e)
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_llm_clients()
+    shutdown_translator()
+    await run_in_threadpool(tracing.flush)
+
 # Root endpoint with API info
 @app.get("/")
 async def root():
@@ -95,12 +169,16 @@ async def root():
         "redoc": "/redoc",
         "endpoints": {
             "auth": ["/signup", "/login"],
-            "chat": "/chat",
-            "inventory": "/inventory",
+            "chat": ["/chat", "/chat/stream"],
+            "inventory": ["/inventory", "/inventory/{product_id}/adjust", "/inventory/{product_id}/movements",
+                          "/inventory/{product_id}/aliases", "/inventory/barcodes"],
+            "pos": "/pos/scan",
             "invoices": "/invoices",
             "summary": "/summary",
             "translate": "/translate",
-            "admin": ["/admin/users", "/admin/stats"]
+            "metrics": "/metrics",
+            "admin": ["/admin/users", "/admin/users/{user_id}/activity", "/admin/stats", "/admin/parser-stats", "/admin/translation-stats",
+                      "/admin/query-stats"]
         },
         "status": "running"
     }
@@ -108,13 +186,28 @@ async def root():
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": "2.0.0"}
+    # The API serves without the local model (Groq is tried first), so it only reports readiness
+    translator = await run_in_threadpool(get_translator_stats)
+    return {
+        "status": "healthy",
+        "version": "2.0.0",
+        "translation_model": {"status": translator["status"], "ready": translator.get("ready", False)}
+    }
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    body = await run_in_threadpool(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Authentication endpoints
 @app.post("/signup", response_model=dict)
-async def signup(user_data: UserSignup):
+async def signup(user_data: UserSignup, request: Request):
     """Register a new shopkeeper account"""
     try:
+        enforce_rate_limit(signup_ip_limiter, request.client.host if request.client else "unknown")
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -129,7 +222,11 @@ async def signup(user_data: UserSignup):
         
         # Create user
         from datetime import datetime
-        password_hash = get_password_hash(user_data.password)
+        try:
+            password_hash = await hash_password(user_data.password)
+        except PasswordHashBusy:
+            conn.close()
+            raise
         cursor.execute("""
             INSERT INTO users (name, email, password_hash, role, shop_name, is_active, created_at)
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -147,22 +244,32 @@ async def signup(user_data: UserSignup):
         user_id = cursor.lastrowid
         conn.close()
         
-        logger.info(f"New user registered: {user_data.email}")
+        logger.info("New user registered: %s", user_data.email)
         return {"message": "Account created successfully", "user_id": user_id}
         
     except HTTPException:
         raise
+    except PasswordHashBusy as e:
+        logger.warning("Signup refused: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please try again",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        logger.error(f"Signup error: {e}")
+        logger.error("Signup error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create account"
         )
 
 @app.post("/login", response_model=TokenResponse)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     """Login and get access token"""
     try:
+        # Refuse login storms before they reach bcrypt
+        enforce_rate_limit(login_ip_limiter, request.client.host if request.client else "unknown")
+        enforce_rate_limit(login_account_limiter, form_data.username.lower())
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -190,11 +297,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             "is_active": user_row[6]
         }
         
-        if not verify_password(form_data.password, user["password_hash"]):
+        valid, new_hash = await check_password(form_data.password, user["password_hash"])
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
+        if new_hash:
+            # Stored with an older cost or scheme; replace it now that the password is known
+            rehash_password(user["id"], new_hash)
         
         if not user["is_active"]:
             raise HTTPException(
@@ -208,7 +319,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         )
         
-        logger.info(f"User logged in: {user['email']}")
+        logger.info("User logged in: %s", user['email'])
         
         return {
             "access_token": access_token,
@@ -224,8 +335,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         
     except HTTPException:
         raise
+    except PasswordHashBusy as e:
+        logger.warning("Login refused: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please try again",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Login failed"
@@ -236,16 +354,74 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 async def chat(message: ChatMessage, current_user: dict = Depends(get_current_user)):
     """Process natural language commands via AI chat"""
     try:
-        result = process_chat_message(message.message, current_user["id"])
-        logger.info(f"Chat processed for user {current_user['id']}: {message.message[:50]}...")
+        # Parsing may wait on the LLM for up to LLM_INTENT_BUDGET - keep it off the event loop
+        result = await run_in_threadpool(process_chat_message, message.message, current_user["id"])
+        logger.info("Chat processed for user %s: %.50s...", current_user['id'], message.message)
         return result
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process message"
         )
 
+def _sse(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Streaming chat endpoint (server-sent events)
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage, current_user: dict = Depends(get_current_user)):
+    """Process a chat message, emitting events as each stage completes.
+
+    Events: `intent` (parsed intents), then either `token` events for a
+    free-form LLM answer or `result` (action data), then `text` (formatted
+    response) and finally `done`, which is only sent after a clean finish.
+    Failures produce an `error` event instead of `done`; when a free-form
+    answer breaks off midway it carries the `partial` text and `truncated`.
+    """
+    user_id = current_user["id"]
+
+    async def events():
+        try:
+            intents = await run_in_threadpool(parse_intents, message.message, user_id)
+            yield _sse("intent", {"intents": intents})
+
+            if len(intents) == 1 and intents[0].get("intent") == "unknown" and GROQ_API_KEY:
+                reply = ""
+                try:
+                    async for token in stream_free_form_reply(message.message):
+                        reply += token
+                        yield _sse("token", {"token": token})
+                except Exception as e:
+                    logger.warning("Free-form reply error after %s chars: %s", len(reply), e)
+                    if reply:
+                        # The client already shows part of the answer - flag it as cut off, never as complete
+                        yield _sse("error", {"detail": "The reply was cut off. Please try again.",
+                                             "partial": reply, "truncated": True})
+                        return
+                    # Nothing was streamed yet - answer with the regular help text below
+                else:
+                    if reply:
+                        yield _sse("text", {"response": reply})
+                        yield _sse("done", {})
+                        return
+
+            result = await run_in_threadpool(execute_intents, intents, user_id)
+            yield _sse("result", {"data": result.get("data")})
+            yield _sse("text", {"response": result["response"]})
+            yield _sse("done", {})
+            logger.info("Chat streamed for user %s: %.50s...", user_id, message.message)
+        except Exception as e:
+            logger.error("Chat stream error: %s", e)
+            yield _sse("error", {"detail": "Failed to process message"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Inventory endpoint
 @app.get("/inventory")
 async def get_inventory_list(current_user: dict = Depends(get_current_user)):
@@ -254,12 +430,128 @@ async def get_inventory_list(current_user: dict = Depends(get_current_user)):
         inventory = get_inventory(current_user["id"])
         return {"inventory": inventory, "count": len(inventory)}
     except Exception as e:
-        logger.error(f"Inventory error: {e}")
+        logger.error("Inventory error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get inventory"
         )
 
+# Manual stock adjustment endpoint
+@app.post("/inventory/{product_id}/adjust")
+async def adjust_inventory_stock(product_id: int, adjustment: StockAdjustment, current_user: dict = Depends(get_current_user)):
+    """Set a product's stock level, recording the change in the stock ledger"""
+    try:
+        result = adjust_stock(current_user["id"], product_id, adjustment.stock, adjustment.note)
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Stock adjustment error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to adjust stock"
+        )
+
+# Stock movement history endpoint
+@app.get("/inventory/{product_id}/movements")
+async def get_inventory_movements(product_id: int, limit: int = 50, at: Optional[datetime] = None,
+                                  current_user: dict = Depends(get_current_user)):
+    """Get recent stock movements for a product; with `at`, the movements up to
+    that time and the stock the product had then"""
+    try:
+        if at is None:
+            movements = get_movements(current_user["id"], product_id, min(max(limit, 1), 500))
+            return {"movements": movements, "count": len(movements)}
+
+        # The ledger stores naive local timestamps
+        at = (at.astimezone().replace(tzinfo=None) if at.tzinfo else at).isoformat()
+        stock = get_stock_at(current_user["id"], product_id, at)
+        if stock is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        movements = get_movements(current_user["id"], product_id, min(max(limit, 1), 500), at)
+        return {"movements": movements, "count": len(movements), "at": at, "stock": stock}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Movements error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get stock movements"
+        )
+
+# Product alias endpoint
+@app.post("/inventory/{product_id}/aliases")
+async def add_product_alias(product_id: int, product_alias: ProductAlias, current_user: dict = Depends(get_current_user)):
+    """Add an alternative name that chat messages can use for a product"""
+    try:
+        result = add_alias(current_user["id"], product_id, product_alias.alias)
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Add alias error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to add alias"
+        )
+
+# Bulk barcode/SKU import endpoint
+@app.post("/inventory/barcodes")
+async def import_inventory_barcodes(catalog: BarcodeImport, current_user: dict = Depends(get_current_user)):
+    """Assign barcode/SKU codes to products, creating any that do not exist"""
+    try:
+        return import_barcodes(current_user["id"], [item.model_dump() for item in catalog.items])
+    except Exception as e:
+        logger.error("Barcode import error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to import barcodes"
+        )
+
+# Point-of-sale scan endpoint
+@app.post("/pos/scan")
+async def pos_scan(scan: ScanRequest, current_user: dict = Depends(get_current_user)):
+    """Record a sale by barcode/SKU without going through the chat parser"""
+    if scan.quantity <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Quantity must be positive"
+        )
+    try:
+        result = record_scan(current_user["id"], scan.code, scan.quantity, scan.price)
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Unknown code: {scan.code}"
+            )
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Scan error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to record scan"
+        )
+
 # Low stock notifications endpoint
 @app.get("/notifications/low-stock")
 async def get_stock_notifications(current_user: dict = Depends(get_current_user)):
@@ -268,7 +560,7 @@ async def get_stock_notifications(current_user: dict = Depends(get_current_user)
         notifications = get_low_stock_notifications(current_user["id"])
         return notifications
     except Exception as e:
-        logger.error(f"Notifications error: {e}")
+        logger.error("Notifications error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get notifications"
@@ -282,7 +574,7 @@ async def get_summary(current_user: dict = Depends(get_current_user)):
         summary = get_daily_summary(current_user["id"])
         return summary
     except Exception as e:
-        logger.error(f"Summary error: {e}")
+        logger.error("Summary error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get summary"
@@ -296,7 +588,7 @@ async def get_invoices(current_user: dict = Depends(get_current_user)):
         invoices = get_all_invoices(current_user["id"])
         return {"invoices": invoices, "count": len(invoices)}
     except Exception as e:
-        logger.error(f"Invoices error: {e}")
+        logger.error("Invoices error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get invoices"
@@ -307,10 +599,11 @@ async def get_invoices(current_user: dict = Depends(get_current_user)):
 async def translate_bill(request: TranslateRequest, current_user: dict = Depends(get_current_user)):
     """Translate English text to Urdu"""
     try:
-        translated = translate_to_urdu(request.text)
+        # Off the event loop, so concurrent requests can share model batches
+        translated = await run_in_threadpool(translate_to_urdu, request.text)
         return {"translated_text": translated, "original_text": request.text}
     except Exception as e:
-        logger.error(f"Translation error: {e}")
+        logger.error("Translation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Translation failed"
@@ -318,18 +611,56 @@ async def translate_bill(request: TranslateRequest, current_user: dict = Depends
 
 # Admin endpoints
 @app.get("/admin/users")
-async def admin_get_users(current_user: dict = Depends(require_admin)):
-    """Get all users (admin only)"""
+async def admin_get_users(
+    search: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(active|inactive)$"),
+    role: Optional[str] = Query(None, pattern="^(admin|shopkeeper)$"),
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(require_admin)
+):
+    """Get users, newest first, a page at a time (admin only).
+
+    Pass the returned next_cursor as `before` for the next page. `search`
+    matches the start of the name, email or shop name.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, email, role, shop_name, is_active, created_at
-            FROM users ORDER BY created_at DESC
-        """)
+
+        conditions, params = [], []
+        if before is not None:
+            conditions.append("u.id < ?")
+            params.append(before)
+        if status_filter:
+            conditions.append("u.is_active = ?")
+            params.append(1 if status_filter == "active" else 0)
+        if role:
+            conditions.append("u.role = ?")
+            params.append(role)
+        if search and search.strip():
+            # Escape LIKE wildcards so the prefix is matched literally
+            prefix = search.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append(
+                "(u.name LIKE ? ESCAPE '\\' OR u.email LIKE ? ESCAPE '\\' OR u.shop_name LIKE ? ESCAPE '\\')"
+            )
+            params.extend([prefix] * 3)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Per-shop figures come from shop_activity, one primary key lookup per row
+        cursor.execute(f"""
+            SELECT u.id, u.name, u.email, u.role, u.shop_name, u.is_active, u.created_at,
+                   {', '.join(f'a.{column}' for column in SHOP_COLUMNS)}
+            FROM users u
+            LEFT JOIN shop_activity a ON a.user_id = u.id
+            {where}
+            ORDER BY u.id DESC
+            LIMIT ?
+        """, params + [limit + 1])
         rows = cursor.fetchall()
         conn.close()
-        
+
+        today = datetime.now().date().isoformat()
         users = [{
             "id": row[0],
             "name": row[1],
@@ -337,12 +668,13 @@ async def admin_get_users(current_user: dict = Depends(require_admin)):
             "role": row[3],
             "shop_name": row[4],
             "is_active": bool(row[5]),
-            "created_at": row[6]
-        } for row in rows]
-        
-        return {"users": users}
+            "created_at": row[6],
+            "activity": shop_activity_from_row(row[7:], today)
+        } for row in rows[:limit]]
+
+        return {"users": users, "next_cursor": users[-1]["id"] if len(rows) > limit else None}
     except Exception as e:
-        logger.error(f"Admin users error: {e}")
+        logger.error("Admin users error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get users"
@@ -350,38 +682,53 @@ async def admin_get_users(current_user: dict = Depends(require_admin)):
 
 @app.get("/admin/stats")
 async def admin_get_stats(current_user: dict = Depends(require_admin)):
-    """Get system statistics (admin only)"""
+    """Get system statistics from the platform counters (admin only)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM products")
-        total_products = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM sales")
-        total_sales = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM invoices")
-        total_invoices = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return {
-            "total_users": total_users,
-            "total_products": total_products,
-            "total_sales": total_sales,
-            "total_invoices": total_invoices
-        }
+        return get_platform_stats()
     except Exception as e:
-        logger.error(f"Admin stats error: {e}")
+        logger.error("Admin stats error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get stats"
         )
 
+@app.get("/admin/users/{user_id}/activity")
+async def admin_get_user_activity(user_id: int, current_user: dict = Depends(require_admin)):
+    """Get a shop's activity: row counts, revenue, sales today, last active (admin only)"""
+    try:
+        return get_shop_activity(user_id)
+    except Exception as e:
+        logger.error("Admin user activity error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get activity"
+        )
+
+@app.get("/admin/parser-stats")
+async def admin_get_parser_stats(current_user: dict = Depends(require_admin)):
+    """Get intent routing hit rates and product matching counts since startup (admin only)"""
+    return dict(get_parser_stats(), product_index=get_index_stats())
+
+@app.get("/admin/translation-stats")
+async def admin_get_translation_stats(current_user: dict = Depends(require_admin)):
+    """Get translation cache and local model batching counters since startup (admin only)"""
+    return {"cache": get_translation_cache_stats(), "local_model": get_translator_stats()}
+
+@app.get("/admin/query-stats")
+async def admin_get_query_stats(
+    limit: int = Query(20, ge=1, le=200),
+    order: str = Query("total", pattern="^(total|avg|max|calls)$"),
+    current_user: dict = Depends(require_admin)
+):
+    """Get the slowest SQL statements, with query plans of slow ones (admin only, needs SQL_PROFILING)"""
+    return sql_profiler.get_top_queries(limit, order)
+
+@app.delete("/admin/query-stats")
+async def admin_reset_query_stats(current_user: dict = Depends(require_admin)):
+    """Clear the SQL profile, e.g. after adding an index (admin only)"""
+    sql_profiler.reset()
+    return {"message": "Query statistics cleared"}
+
 @app.post("/admin/users/{user_id}/toggle")
 async def admin_toggle_user(user_id: int, current_user: dict = Depends(require_admin)):
     """Toggle user active status (admin only)"""
@@ -407,16 +754,18 @@ async def admin_toggle_user(user_id: int, current_user: dict = Depends(require_a
         
         new_status = 0 if row[0] else 1
         cursor.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
+        mark_user_changed(cursor, user_id)
         conn.commit()
         conn.close()
+        invalidate_user(user_id)
         
-        logger.info(f"User {user_id} status changed to {new_status} by admin {current_user['id']}")
+        logger.info("User %s status changed to %s by admin %s", user_id, new_status, current_user["id"])
         return {"message": "User status updated", "is_active": bool(new_status)}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Toggle user error: {e}")
+        logger.error("Toggle user error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update user"
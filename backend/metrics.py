@@ -0,0 +1,201 @@
+"""
+Metrics - counters, gauges and histograms in Prometheus text format
+
+Recording takes no lock. Every metric keeps one shard per thread and a
+thread only ever writes its own shard, so an increment is a dict update
+and a histogram observation is a bisect plus two list updates. A scrape
+merges the shards. Values computed elsewhere, such as cache hit ratios,
+come from collectors called at scrape time.
+
+    REQUESTS = counter("http_requests_total", "HTTP requests", ("route", "status"))
+    REQUESTS.inc("/chat", "200")
+    with LATENCY.time("/chat"):
+        ...
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from logger_config import logger, BackgroundQueueHandler
+
+# Seconds; fine enough for SQLite statements, wide enough for LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_registry = {}  # name -> metric, in registration order
+_collectors = []
+_registry_lock = threading.Lock()
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """This thread's shard, created on its first write (the only locked step)"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> list:
+        with self._shards_lock:
+            return [dict(shard) for shard in self._shards]
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def values(self) -> dict:
+        merged = {}
+        for shard in self._snapshot():
+            for key, value in shard.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self) -> list:
+        return [f"{self.name}{self._label_text(key)} {_number(value)}" for key, value in sorted(self.values().items())]
+
+class Gauge(Counter):
+    """Up/down value; shards hold deltas, so inc and dec may come from different threads"""
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values):
+        shard = self._shard()
+        counts = shard.get(label_values)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def values(self) -> dict:
+        """label values -> (per-bucket counts, sum)"""
+        merged = {}
+        for shard in self._snapshot():
+            for key, counts in shard.items():
+                counts = list(counts)
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], counts)]
+                else:
+                    merged[key] = counts
+        return {key: (counts[:-1], counts[-1]) for key, counts in merged.items()}
+
+    def render(self) -> list:
+        lines = []
+        for key, (counts, total) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bound_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+def counter(name: str, help_text: str, labels: tuple = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))
+
+def gauge(name: str, help_text: str, labels: tuple = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labels))
+
+def histogram(name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))
+
+def register_collector(collect):
+    """`collect()` returns [(name, kind, help, [({label: value}, number), ...]), ...] at scrape time"""
+    with _registry_lock:
+        _collectors.append(collect)
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    with _registry_lock:
+        metrics, collectors = list(_registry.values()), list(_collectors)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", getattr(collect, "__name__", collect), e)
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+def _collect_logging() -> list:
+    return [("log_records_dropped_total", "counter", "Log records dropped because the writer queue was full",
+             [({}, BackgroundQueueHandler.dropped)])]
+
+register_collector(_collect_logging)
+
+# Shared instruments, recorded from the modules that do the work
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = histogram("http_request_duration_seconds", "HTTP request latency until the response starts",
+                         ("method", "route"))
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being handled")
+DB_QUERY_LATENCY = histogram("db_query_duration_seconds", "SQLite statement execution time", ("operation",))
+DB_CONNECT_LATENCY = histogram("db_connection_wait_seconds", "Time to open a SQLite connection and set pragmas")
+DB_CONNECTIONS = gauge("db_connections_active", "Open SQLite connections")
+LLM_LATENCY = histogram("groq_request_duration_seconds", "Groq chat completion latency", ("kind", "outcome"))
+TRANSLATION_LATENCY = histogram("translation_duration_seconds", "Translation latency by stage", ("stage",))
+BATCH_SIZE = histogram("batch_size", "Items per model batch", ("batcher",), buckets=SIZE_BUCKETS)
+PASSWORD_HASH_LATENCY = histogram("password_hash_duration_seconds",
+                                  "bcrypt time including the wait for a hashing thread", ("operation",))
@@ -0,0 +1,103 @@
+"""
+Micro-batcher - groups concurrent inference requests into padded batches
+
+Requests from many threads are queued. A worker takes the first waiting
+item, then keeps collecting until the batch is full or `max_wait` seconds
+have passed since that first item. It runs the whole batch in one model
+call and hands each caller its own result. On CPU a MarianMT batch costs far
+less than the same texts translated one at a time.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from metrics import BATCH_SIZE
+from logger_config import logger
+
+class MicroBatcher:
+    def __init__(self, run_batch, max_batch: int = 16, max_wait: float = 0.01, workers: int = 1,
+                 name: str = "batcher"):
+        """`run_batch(list_of_inputs) -> list_of_outputs` is called on a worker thread"""
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.workers = max(1, workers)
+        self.name = name
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "items": 0, "errors": 0, "max_batch_seen": 0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info("%s started: %s workers, batch %s, wait %.0f ms",
+                    self.name, self.workers, self.max_batch, self.max_wait * 1000)
+
+    def submit(self, item) -> Future:
+        """Queue one input; the future resolves to its output"""
+        if not self._threads:
+            self.start()
+        future = Future()
+        self._queue.put((item, future))
+        with self._lock:
+            self._stats["requests"] += 1
+        return future
+
+    def map(self, items: list, timeout: float = None) -> list:
+        """Queue several inputs and wait for all of their outputs, in order"""
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _collect(self) -> list:
+        """Block for one item, then gather more until the batch is full or the wait is over"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._collect()
+            # Identical inputs in one batch are computed once
+            unique = list(dict.fromkeys(item for item, _ in batch))
+            BATCH_SIZE.observe(len(unique), self.name)
+            try:
+                outputs = dict(zip(unique, self.run_batch(unique)))
+                for item, future in batch:
+                    future.set_result(outputs[item])
+            except Exception as e:
+                logger.error("%s batch of %s failed: %s", self.name, len(unique), e)
+                with self._lock:
+                    self._stats["errors"] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(unique)
+                self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(unique))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            queued=self._queue.qsize(),
+            workers=self.workers,
+            max_batch=self.max_batch,
+            max_wait_ms=round(self.max_wait * 1000, 1),
+            avg_batch=round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        )
+        return stats
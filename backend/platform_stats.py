@@ -0,0 +1,210 @@
+"""
+Platform statistics - row counts and per-shop activity without scanning tables
+
+Triggers created by init_database keep two small tables current in the same
+transaction as each insert or delete:
+
+- platform_counters holds one row per counted table ("users", "sales", ...),
+  one per day with sales ("sales:2026-10-19"), active users and users per
+  role ("role:admin").
+- shop_activity holds each shop's row counts, revenue, sales on its latest
+  trading day and when it was last active.
+
+Admin statistics therefore read a handful of rows however large `sales`
+grows. The reconciler recomputes everything from the base tables to catch
+drift from manual edits.
+
+Run: python platform_stats.py reconcile [--fix]
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+from config import DB_PATH
+from database import get_db_connection, SHOP_COUNTED_TABLES
+from logger_config import logger
+
+PLATFORM_TABLES = ("users",) + tuple(SHOP_COUNTED_TABLES)
+SHOP_COLUMNS = ("products", "sales", "purchases", "invoices", "revenue", "sales_today", "sales_day", "last_active_at")
+
+# Tolerance for comparing summed REAL revenue
+REVENUE_EPSILON = 1e-6
+
+def _compute_counters(cursor):
+    """Recount from the base tables; returns (platform counters, {user_id: shop activity})"""
+    counters = {}
+    for table in PLATFORM_TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        counters[table] = cursor.fetchone()[0]
+    cursor.execute("SELECT 'sales:' || substr(date, 1, 10), COUNT(*) FROM sales GROUP BY 1")
+    counters.update(cursor.fetchall())
+    cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
+    counters["users:active"] = cursor.fetchone()[0]
+    cursor.execute("SELECT 'role:' || role, COUNT(*) FROM users GROUP BY role")
+    counters.update(cursor.fetchall())
+
+    shops = {}
+
+    def shop(user_id):
+        return shops.setdefault(user_id, {
+            "products": 0, "sales": 0, "purchases": 0, "invoices": 0, "revenue": 0.0,
+            "sales_today": 0, "sales_day": None, "last_active_at": None
+        })
+
+    for table, date_column in SHOP_COUNTED_TABLES.items():
+        cursor.execute(f"SELECT user_id, COUNT(*), MAX({date_column}) FROM {table} GROUP BY user_id")
+        for user_id, count, last_date in cursor.fetchall():
+            row = shop(user_id)
+            row[table] = count
+            row["last_active_at"] = max(row["last_active_at"] or "", last_date or "") or None
+    # Revenue, latest trading day and the sales on it, in one pass per shop and day
+    cursor.execute("""
+        SELECT user_id, substr(date, 1, 10), COUNT(*), SUM(quantity * selling_price)
+        FROM sales GROUP BY user_id, substr(date, 1, 10)
+    """)
+    for user_id, day, count, revenue in cursor.fetchall():
+        row = shop(user_id)
+        row["revenue"] += revenue or 0.0
+        if row["sales_day"] is None or day > row["sales_day"]:
+            row["sales_day"], row["sales_today"] = day, count
+    return counters, shops
+
+def rebuild_counters(cursor):
+    """Replace both tables with fresh counts, in the caller's transaction"""
+    counters, shops = _compute_counters(cursor)
+    cursor.execute("DELETE FROM platform_counters")
+    cursor.executemany("INSERT INTO platform_counters (name, value) VALUES (?, ?)", counters.items())
+    cursor.execute("DELETE FROM shop_activity")
+    cursor.executemany(
+        f"INSERT INTO shop_activity (user_id, {', '.join(SHOP_COLUMNS)}) VALUES (?{', ?' * len(SHOP_COLUMNS)})",
+        [(user_id,) + tuple(row[c] for c in SHOP_COLUMNS) for user_id, row in shops.items()]
+    )
+    logger.info("Platform counters rebuilt: %s counters, %s shops", len(counters), len(shops))
+
+def shop_activity_from_row(row, today: str = None) -> dict:
+    """Shape a shop_activity row (columns in SHOP_COLUMNS order) for the API"""
+    today = today or datetime.now().date().isoformat()
+    products, sales, purchases, invoices, revenue, sales_today, sales_day, last_active_at = row
+    return {
+        "products": products or 0,
+        "sales": sales or 0,
+        "purchases": purchases or 0,
+        "invoices": invoices or 0,
+        "revenue": round(revenue or 0, 2),
+        "sales_today": sales_today if sales_day == today else 0,
+        "last_active_at": last_active_at,
+        # Rows stored for the shop; SQLite keeps all shops in one file
+        "stored_rows": (products or 0) + (sales or 0) + (purchases or 0) + (invoices or 0)
+    }
+
+def get_shop_activity(user_id: int) -> dict:
+    """One shop's activity metrics"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(SHOP_COLUMNS)} FROM shop_activity WHERE user_id = ?", (user_id,))
+        return shop_activity_from_row(cursor.fetchone() or (None,) * len(SHOP_COLUMNS))
+    except Exception as e:
+        logger.error("Get shop activity error: %s", e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def get_platform_stats() -> dict:
+    """Platform totals from the counters; a few indexed lookups regardless of table sizes"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        today = datetime.now().date().isoformat()
+        names = list(PLATFORM_TABLES) + [f"sales:{today}", "users:active", "role:admin", "role:shopkeeper"]
+        cursor.execute(f"SELECT name, value FROM platform_counters WHERE name IN ({','.join('?' * len(names))})", names)
+        counters = dict(cursor.fetchall())
+        cursor.execute("SELECT COUNT(*) FROM shop_activity WHERE sales_day = ?", (today,))
+        active_shops = cursor.fetchone()[0]
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+        wal_path = f"{DB_PATH}-wal"
+        return {
+            "total_users": counters.get("users", 0),
+            "active_users": counters.get("users:active", 0),
+            "admins": counters.get("role:admin", 0),
+            "shopkeepers": counters.get("role:shopkeeper", 0),
+            "total_products": counters.get("products", 0),
+            "total_sales": counters.get("sales", 0),
+            "total_purchases": counters.get("purchases", 0),
+            "total_invoices": counters.get("invoices", 0),
+            "sales_today": counters.get(f"sales:{today}", 0),
+            "active_shops_today": active_shops,
+            "database_bytes": page_size * page_count,
+            "database_free_bytes": page_size * free_pages,
+            "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        }
+    except Exception as e:
+        logger.error("Platform stats error: %s", e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def reconcile_counters(fix: bool = False) -> dict:
+    """Compare the counters with fresh counts; with `fix`, rebuild them"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        counters, shops = _compute_counters(cursor)
+        cursor.execute("SELECT name, value FROM platform_counters")
+        stored = dict(cursor.fetchall())
+        mismatches = [
+            {"counter": name, "stored": stored.get(name, 0), "actual": counters.get(name, 0)}
+            for name in sorted(set(counters) | set(stored))
+            if stored.get(name, 0) != counters.get(name, 0)
+        ]
+
+        cursor.execute(f"SELECT user_id, {', '.join(SHOP_COLUMNS)} FROM shop_activity")
+        stored_shops = {row[0]: dict(zip(SHOP_COLUMNS, row[1:])) for row in cursor.fetchall()}
+        for user_id in sorted(set(shops) | set(stored_shops)):
+            actual = shops.get(user_id, {})
+            current = stored_shops.get(user_id, {})
+            for column in SHOP_COLUMNS:
+                a, s = actual.get(column) or 0, current.get(column) or 0
+                if (abs(a - s) > REVENUE_EPSILON) if column == "revenue" else a != s:
+                    mismatches.append({"counter": f"shop {user_id} {column}", "stored": s, "actual": a})
+
+        if fix and mismatches:
+            rebuild_counters(cursor)
+            conn.commit()
+        logger.info("Counter reconcile: %s mismatches", len(mismatches))
+        return {"checked": len(counters) + len(shops), "mismatches": mismatches, "fixed": bool(fix and mismatches)}
+    except Exception as e:
+        logger.error("Reconcile counters error: %s", e)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Platform counter maintenance")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--fix", action="store_true", help="Rebuild the counters from the base tables")
+    args = parser.parse_args(argv)
+
+    result = reconcile_counters(fix=args.fix)
+    print(f"[*] Counters checked: {result['checked']}")
+    for m in result["mismatches"]:
+        print(f"  [!] {m['counter']}: stored={m['stored']} actual={m['actual']}")
+    if result["fixed"]:
+        print(f"[+] Rebuilt counters ({len(result['mismatches'])} were off)")
+    elif not result["mismatches"]:
+        print("[SUCCESS] Counters match the tables")
+    return 1 if result["mismatches"] and not result["fixed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Product index - resolves product names to a shop's products in memory
+
+Each shop's products (and their aliases) are loaded once into an index of
+normalized names, word postings and character trigram postings. A name is
+resolved in three steps without touching SQLite:
+
+1. exact match on the normalized name or an alias ("Cooking  Oil" -> "cooking oil")
+2. word match, when the words of the query belong to exactly one product ("oil")
+3. fuzzy match on trigram similarity, for typos ("cookin oil")
+
+Fuzzy matches never cross numbers, so "pepsi 1l" does not resolve to
+"pepsi 2l". Word and fuzzy matches are suggestions: write paths bind a
+name only through resolve_exact(), so "rice" is never booked against
+"rice flour". The index is updated by the write paths in business_logic and
+dropped for a shop when its transaction rolls back; a miss still falls back
+to SQL, so products created by another worker are picked up on first use.
+"""
+import re
+import math
+import threading
+from datetime import datetime
+from typing import Optional
+from config import PRODUCT_MATCH_THRESHOLD
+from database import get_db_connection
+from metrics import register_collector
+from logger_config import logger
+
+WORD_PATTERN = re.compile(r'\w+')
+MIN_FUZZY_LENGTH = 4  # shorter queries only match exactly or by word
+AMBIGUITY_MARGIN = 0.05  # a runner-up this close to the best fuzzy score means no match
+
+def normalize(name: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(WORD_PATTERN.findall(name.lower()))
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _numbers(text: str) -> frozenset:
+    return frozenset(word for word in text.split() if any(c.isdigit() for c in word))
+
+class ShopIndex:
+    """Name lookups for one shop's products"""
+    def __init__(self):
+        self.names = {}  # product_id -> stored name
+        self.exact = {}  # normalized name or alias -> product_id
+        self.keys = []  # (normalized key, product_id, trigrams, numbers)
+        self.trigram_postings = {}  # trigram -> list of key positions
+        self.word_postings = {}  # word -> set of key positions
+        self.number_postings = {}  # word with digits -> set of key positions
+        self._sorted_names = None  # cached for the intent cache's templating
+        self.lock = threading.Lock()
+
+    def add(self, product_id: int, name: str, alias: bool = False):
+        key = normalize(name)
+        if not key:
+            return
+        with self.lock:
+            if not alias:
+                self.names[product_id] = name
+                self._sorted_names = None
+            if self.exact.get(key) == product_id:
+                return
+            self.exact[key] = product_id
+            position = len(self.keys)
+            trigrams = _trigrams(key)
+            numbers = _numbers(key)
+            self.keys.append((key, product_id, trigrams, numbers))
+            for trigram in trigrams:
+                self.trigram_postings.setdefault(trigram, []).append(position)
+            for number in numbers:
+                self.number_postings.setdefault(number, set()).add(position)
+            for word in key.split():
+                self.word_postings.setdefault(word, set()).add(position)
+
+    def resolve_exact(self, name: str) -> Optional[dict]:
+        with self.lock:
+            product_id = self.exact.get(normalize(name))
+        return self._match(product_id, 1.0, "exact") if product_id is not None else None
+
+    def resolve(self, name: str) -> Optional[dict]:
+        query = normalize(name)
+        if not query:
+            return None
+        with self.lock:
+            product_id = self.exact.get(query)
+            if product_id is not None:
+                return self._match(product_id, 1.0, "exact")
+
+            # Keys containing every correctly spelled word of the query
+            postings = [self.word_postings[word] for word in query.split() if word in self.word_postings]
+            known = set.intersection(*postings) if postings else None
+            if known is not None and len(postings) == len(query.split()):
+                products = {self.keys[position][1] for position in known}
+                if len(products) == 1:
+                    return self._match(products.pop(), 0.9, "word")
+
+            if len(query) < MIN_FUZZY_LENGTH:
+                return None
+            trigrams = _trigrams(query)
+            numbers = _numbers(query)
+            if known is not None:
+                # A typo usually spoils one word; the others must still match
+                candidates = known
+            elif numbers:
+                # Sizes and pack counts must match exactly, which narrows the
+                # candidates to keys carrying the same numbers
+                candidates = set.intersection(*(self.number_postings.get(n, set()) for n in numbers))
+            else:
+                # A key reaching the threshold shares at least `overlap`
+                # trigrams with the query, so it must appear in one of the
+                # rarest len - overlap + 1 postings; only those are scanned
+                rarest = sorted(trigrams, key=lambda t: len(self.trigram_postings.get(t, ())))
+                overlap = math.ceil(PRODUCT_MATCH_THRESHOLD * len(trigrams) / (2 - PRODUCT_MATCH_THRESHOLD))
+                candidates = set()
+                for trigram in rarest[:len(rarest) - max(overlap, 1) + 1]:
+                    candidates.update(self.trigram_postings.get(trigram, ()))
+
+            best, best_score, runner_up = None, 0.0, 0.0
+            for position in candidates:
+                key, product_id, key_trigrams, key_numbers = self.keys[position]
+                if key_numbers != numbers:
+                    continue
+                score = 2 * len(trigrams & key_trigrams) / (len(trigrams) + len(key_trigrams))  # Dice coefficient
+                if score < PRODUCT_MATCH_THRESHOLD:
+                    continue
+                if score > best_score:
+                    if best is not None and product_id != best:
+                        runner_up = best_score
+                    best, best_score = product_id, score
+                elif product_id != best and score > runner_up:
+                    runner_up = score
+            if best is None or best_score - runner_up < AMBIGUITY_MARGIN:
+                return None
+            return self._match(best, round(best_score, 3), "fuzzy")
+
+    def _match(self, product_id: int, score: float, kind: str) -> dict:
+        return {"id": product_id, "name": self.names.get(product_id), "score": score, "match": kind}
+
+    def sorted_names(self) -> list:
+        with self.lock:
+            if self._sorted_names is None:
+                names = {name.strip().lower() for name in self.names.values() if name}
+                self._sorted_names = sorted(names, key=len, reverse=True)
+            return self._sorted_names
+
+_indexes = {}  # user_id -> ShopIndex
+_lock = threading.Lock()
+_stats = {"loads": 0, "lookups": 0, "exact": 0, "word": 0, "fuzzy": 0, "misses": 0}
+
+def _load(user_id: int) -> ShopIndex:
+    """Build a shop's index from its products and aliases"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        index = ShopIndex()
+        cursor.execute("SELECT id, name FROM products WHERE user_id = ?", (user_id,))
+        for product_id, name in cursor.fetchall():
+            if name:
+                index.add(product_id, name)
+        cursor.execute("SELECT product_id, alias FROM product_aliases WHERE user_id = ?", (user_id,))
+        for product_id, alias in cursor.fetchall():
+            if product_id in index.names:
+                index.add(product_id, alias, alias=True)
+        return index
+    finally:
+        if conn:
+            conn.close()
+
+def _get_index(user_id: int) -> ShopIndex:
+    index = _indexes.get(user_id)
+    if index is None:
+        with _lock:
+            index = _indexes.get(user_id)
+            if index is None:
+                index = _load(user_id)
+                _indexes[user_id] = index
+                _stats["loads"] += 1
+                logger.info("Product index loaded for user %s: %d products", user_id, len(index.names))
+    return index
+
+def resolve(user_id: int, name: str) -> Optional[dict]:
+    """Resolve a product name to {id, name, score, match}, or None if no product fits"""
+    try:
+        match = _get_index(user_id).resolve(name)
+    except Exception as e:
+        logger.warning("Product index lookup error: %s", e)
+        return None
+    _stats["lookups"] += 1
+    _stats[match["match"] if match else "misses"] += 1
+    return match
+
+def resolve_exact(user_id: int, name: str) -> Optional[dict]:
+    """Resolve a product name by its exact normalized name or an alias only"""
+    try:
+        match = _get_index(user_id).resolve_exact(name)
+    except Exception as e:
+        logger.warning("Product index lookup error: %s", e)
+        return None
+    _stats["lookups"] += 1
+    _stats["exact" if match else "misses"] += 1
+    return match
+
+def add_product(user_id: int, product_id: int, name: str):
+    """Add a product to the shop's index, if the index is loaded"""
+    index = _indexes.get(user_id)
+    if index is not None:
+        index.add(product_id, name)
+
+def add_alias(user_id: int, product_id: int, alias: str):
+    """Store an alias for a product; returns None if the product does not exist"""
+    alias = normalize(alias)
+    if not alias:
+        raise ValueError("Alias must contain letters or digits")
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM products WHERE id = ? AND user_id = ?", (product_id, user_id))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute("""
+            INSERT INTO product_aliases (user_id, product_id, alias, created_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, alias) DO UPDATE SET product_id = excluded.product_id
+        """, (user_id, product_id, alias, datetime.now().isoformat()))
+        conn.commit()
+    except Exception as e:
+        logger.error("Add alias error: %s", e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+    # Rebuild rather than patch, in case the alias moved from another product
+    invalidate(user_id)
+    return {"product_id": product_id, "product": row[0], "alias": alias}
+
+def product_names(user_id: int) -> list:
+    """Product names of a shop, longest first"""
+    return _get_index(user_id).sorted_names()
+
+def invalidate(user_id: int = None):
+    """Drop the index of one shop, or all of them; it is rebuilt on next use"""
+    with _lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(user_id, None)
+
+def get_index_stats() -> dict:
+    with _lock:
+        shops = len(_indexes)
+        products = sum(len(index.names) for index in _indexes.values())
+    return dict(_stats, shops=shops, products=products)
+
+def _collect_metrics() -> list:
+    stats = get_index_stats()
+    return [
+        ("product_match_lookups_total", "counter", "Product name lookups by how they matched",
+         [({"match": match}, stats[match]) for match in ("exact", "word", "fuzzy", "misses")]),
+        ("product_index_loads_total", "counter", "Shop product indexes built from SQLite", [({}, stats["loads"])]),
+        ("product_index_shops", "gauge", "Shops with a product index in memory", [({}, stats["shops"])]),
+    ]
+
+register_collector(_collect_metrics)
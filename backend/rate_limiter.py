@@ -0,0 +1,47 @@
+"""
+Rate limiter - token buckets keyed by client IP or account
+
+Each key gets a bucket of `burst` tokens that refills at `per_minute`
+tokens a minute. A request takes one token; an empty bucket refuses it and
+says how long until the next token. Buckets live in the worker's memory,
+so with several workers the effective limit is per worker.
+"""
+import time
+import threading
+
+class RateLimiter:
+    def __init__(self, name: str, per_minute: float, burst: int = None, max_keys: int = 10000):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst or max(1, int(per_minute))
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "limited": 0}
+
+    def acquire(self, key: str) -> float:
+        """Take a token for `key`; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                self._stats["allowed"] += 1
+                if len(self._buckets) > self.max_keys:
+                    self._prune(now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            self._stats["limited"] += 1
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now: float):
+        """Forget buckets that have refilled; they behave the same as new ones"""
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, keys=len(self._buckets), per_minute=round(self.rate * 60, 1), burst=self.burst)
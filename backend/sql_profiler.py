@@ -0,0 +1,138 @@
+"""
+SQL profiler - per-statement timings, slow-query log and captured query plans
+
+Opt-in with SQL_PROFILING=True. Connections from get_db_connection then
+report every statement here, and the time spent fetching its rows is
+added to the same statement. Statements are aggregated by normalized text:
+literals and IN lists become "?", so "WHERE id = 5" and "WHERE id = 7"
+share a row.
+
+A statement slower than SQL_SLOW_QUERY_MS is logged together with its
+EXPLAIN QUERY PLAN. The plan is captured at most once per statement per
+PLAN_REFRESH_SECONDS. A plan step that scans a table without an index
+usually points to a missing index.
+"""
+import re
+import time
+import threading
+from collections import deque
+from config import SQL_PROFILING, SQL_SLOW_QUERY_MS, SQL_PROFILE_MAX_STATEMENTS
+from logger_config import logger
+
+PLAN_REFRESH_SECONDS = 300
+SLOW_SAMPLES = 50  # recent slow statements kept for the admin endpoint
+
+# Statements that have a query plan worth capturing
+EXPLAINABLE = {"select", "insert", "update", "delete", "with", "replace"}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w?])-?\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+enabled = SQL_PROFILING
+slow_threshold = SQL_SLOW_QUERY_MS / 1000.0
+
+_lock = threading.Lock()
+_statements = {}  # normalized sql -> stats dict
+_normalized = {}  # raw sql -> normalized sql; the code uses a bounded set of query strings
+_slow = deque(maxlen=SLOW_SAMPLES)
+_dropped = {"statements": 0}
+
+def normalize(sql: str) -> str:
+    """Statement text with literals replaced by ?, for grouping"""
+    normalized = _normalized.get(sql)
+    if normalized is None:
+        normalized = WHITESPACE.sub(" ", sql).strip()
+        normalized = STRING_LITERAL.sub("?", normalized)
+        normalized = NUMBER_LITERAL.sub("?", normalized)
+        normalized = IN_LIST.sub("IN (?...)", normalized)
+        if len(_normalized) < SQL_PROFILE_MAX_STATEMENTS * 4:
+            _normalized[sql] = normalized
+    return normalized
+
+def record(sql: str, seconds: float, calls: int = 1):
+    """Add `seconds` to a statement's totals; `calls` is 0 for time spent fetching its rows"""
+    key = normalize(sql)
+    with _lock:
+        stats = _statements.get(key)
+        if stats is None:
+            if len(_statements) >= SQL_PROFILE_MAX_STATEMENTS:
+                _dropped["statements"] += 1
+                return
+            stats = _statements[key] = {"calls": 0, "total": 0.0, "max": 0.0, "slow": 0,
+                                        "plan": None, "plan_at": 0.0}
+        stats["calls"] += calls
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+def needs_plan(sql: str) -> bool:
+    """Whether a slow statement's plan should be captured now"""
+    if sql.split(None, 1)[0].lower() not in EXPLAINABLE:
+        return False
+    with _lock:
+        stats = _statements.get(normalize(sql))
+        return stats is None or time.monotonic() - stats["plan_at"] > PLAN_REFRESH_SECONDS
+
+def record_slow(sql: str, seconds: float, plan: list = None):
+    """Log a statement over the threshold, with its query plan if one was captured"""
+    key = normalize(sql)
+    with _lock:
+        stats = _statements.get(key)
+        if stats is not None:
+            stats["slow"] += 1
+            if plan is not None:
+                stats["plan"], stats["plan_at"] = plan, time.monotonic()
+            plan = stats["plan"]
+        _slow.append({"statement": key, "ms": round(seconds * 1000, 2), "plan": plan, "at": time.time()})
+    plan_text = " | ".join(plan) if plan else "no plan"
+    logger.warning("Slow query %.0f ms: %s [%s]", seconds * 1000, key, plan_text)
+
+def full_scans(plan: list) -> list:
+    """Plan steps that read a whole table rather than seeking an index"""
+    return [step for step in plan or [] if step.startswith("SCAN ") and "INDEX" not in step]
+
+def get_top_queries(limit: int = 20, order_by: str = "total") -> dict:
+    """The statements with the highest total, average or maximum time"""
+    with _lock:
+        rows = [(key, dict(stats)) for key, stats in _statements.items()]
+        slow = list(_slow)
+        dropped = _dropped["statements"]
+    queries = []
+    for key, stats in rows:
+        calls = stats["calls"] or 1
+        queries.append({
+            "statement": key,
+            "calls": stats["calls"],
+            "total_ms": round(stats["total"] * 1000, 2),
+            "avg_ms": round(stats["total"] / calls * 1000, 3),
+            "max_ms": round(stats["max"] * 1000, 2),
+            "slow_calls": stats["slow"],
+            "plan": stats["plan"],
+            "full_scans": full_scans(stats["plan"])
+        })
+    sort_key = {"total": "total_ms", "avg": "avg_ms", "max": "max_ms", "calls": "calls"}.get(order_by, "total_ms")
+    queries.sort(key=lambda q: q[sort_key], reverse=True)
+    return {
+        "enabled": enabled,
+        "slow_threshold_ms": round(slow_threshold * 1000, 1),
+        "statements": len(rows),
+        "untracked_statements": dropped,
+        "top": queries[:limit],
+        "recent_slow": slow[::-1]
+    }
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _slow.clear()
+        _dropped["statements"] = 0
+
+def configure(enable: bool = None, slow_ms: float = None):
+    """Turn profiling on or off at runtime; the environment sets the initial state"""
+    global enabled, slow_threshold
+    if enable is not None:
+        enabled = enable
+    if slow_ms is not None:
+        slow_threshold = slow_ms / 1000.0
+    logger.info("SQL profiling %s, slow threshold %.0f ms", "on" if enabled else "off", slow_threshold * 1000)
@@ -0,0 +1,294 @@
+"""
+Stock ledger - append-only record of stock movements with periodic snapshots
+
+Every change to products.stock is written to stock_movements in the same
+transaction as the change itself. Snapshots capture a product's stock as of
+a ledger position, so current or point-in-time stock is the latest snapshot
+plus the short tail of movements after it. Every STOCK_SNAPSHOT_INTERVAL-th
+movement snapshots its shop's products with that many movements since their
+last snapshot; startup and the snapshot command catch up the rest.
+
+Run: python stock_ledger.py reconcile [--user USER_ID] [--fix]
+     python stock_ledger.py snapshot [--user USER_ID]
+"""
+import sys
+import argparse
+from datetime import datetime
+from typing import Optional
+from config import STOCK_SNAPSHOT_INTERVAL, STOCK_RECONCILE_BATCH_SIZE
+from database import get_db_connection
+from logger_config import logger
+
+# Movement reasons
+SALE = "sale"
+PURCHASE = "purchase"
+INVOICE = "invoice"
+ADJUSTMENT = "adjustment"
+OPENING = "opening"
+
+# Tolerance for comparing REAL stock values
+STOCK_EPSILON = 1e-6
+
+def record_movement(cursor, user_id: int, product_id: int, change: float, reason: str,
+                    requested: float = None, reference_id: int = None, note: str = None):
+    """Append a stock movement using the caller's cursor (and transaction)"""
+    if abs(change) < STOCK_EPSILON and requested is None:
+        return None
+    cursor.execute("""
+        INSERT INTO stock_movements (user_id, product_id, change, requested, reason, reference_id, note, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, product_id, change, change if requested is None else requested,
+          reason, reference_id, note, datetime.now().isoformat()))
+    movement_id = cursor.lastrowid
+    # Every Nth ledger entry snapshots the shop that wrote it, so each shop is
+    # checked about once per N of its own movements
+    if STOCK_SNAPSHOT_INTERVAL > 0 and movement_id % STOCK_SNAPSHOT_INTERVAL == 0:
+        _take_snapshots(cursor, user_id, STOCK_SNAPSHOT_INTERVAL)
+    return movement_id
+
+def adjust_stock(user_id: int, product_id: int, new_stock: float, note: str = None):
+    """Manually set a product's stock, recording the difference in the ledger"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name, stock FROM products WHERE id = ? AND user_id = ?", (product_id, user_id))
+        product = cursor.fetchone()
+        if not product:
+            return None
+
+        current_stock = product[1] or 0
+        new_stock = max(0, new_stock)
+        change = new_stock - current_stock
+
+        cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
+        record_movement(cursor, user_id, product_id, change, ADJUSTMENT, note=note or "Manual adjustment")
+        conn.commit()
+
+        logger.info("Stock adjusted: %s %s -> %s", product[0], current_stock, new_stock)
+        return {
+            "product_id": product_id,
+            "product": product[0],
+            "previous_stock": current_stock,
+            "new_stock": new_stock,
+            "change": change
+        }
+    except Exception as e:
+        logger.error("Adjust stock error: %s", e)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def get_stock_at(user_id: int, product_id: int, at: Optional[str] = None) -> Optional[float]:
+    """Compute a shop's product stock from the latest snapshot plus later movements.
+
+    `at` is an ISO timestamp; when omitted the current stock is returned.
+    Returns None if the product does not belong to the shop.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT 1 FROM products WHERE id = ? AND user_id = ?", (product_id, user_id))
+        if not cursor.fetchone():
+            return None
+
+        at_filter = "AND created_at <= ?" if at else ""
+        at_params = (at,) if at else ()
+
+        cursor.execute(f"""
+            SELECT stock, last_movement_id FROM stock_snapshots
+            WHERE user_id = ? AND product_id = ? {at_filter}
+            ORDER BY last_movement_id DESC LIMIT 1
+        """, (user_id, product_id) + at_params)
+        snapshot = cursor.fetchone()
+        base_stock, last_movement_id = (snapshot[0], snapshot[1]) if snapshot else (0, 0)
+
+        cursor.execute(f"""
+            SELECT COALESCE(SUM(change), 0) FROM stock_movements
+            WHERE user_id = ? AND product_id = ? AND id > ? {at_filter}
+        """, (user_id, product_id, last_movement_id) + at_params)
+
+        return base_stock + cursor.fetchone()[0]
+    except Exception as e:
+        logger.error("Get stock at error: %s", e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def get_movements(user_id: int, product_id: int, limit: int = 50, at: Optional[str] = None):
+    """Get the most recent stock movements for a product, up to `at` (ISO timestamp) if given"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        at_filter = "AND created_at <= ?" if at else ""
+        cursor.execute(f"""
+            SELECT id, change, requested, reason, reference_id, note, created_at
+            FROM stock_movements WHERE user_id = ? AND product_id = ? {at_filter}
+            ORDER BY id DESC LIMIT ?
+        """, (user_id, product_id) + ((at,) if at else ()) + (limit,))
+        return [{
+            "id": row[0],
+            "change": row[1],
+            "requested": row[2],
+            "reason": row[3],
+            "reference_id": row[4],
+            "note": row[5],
+            "date": row[6]
+        } for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error("Get movements error: %s", e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def _take_snapshots(cursor, user_id: int = None, min_movements: int = STOCK_SNAPSHOT_INTERVAL) -> int:
+    """Snapshot products with at least `min_movements` movements since their last
+    snapshot, using the caller's cursor (and transaction)"""
+    user_filter = "AND p.user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    # Tail of each product since its latest snapshot; the (product_id, id)
+    # indexes keep both lookups as range scans
+    cursor.execute(f"""
+        SELECT p.id, p.user_id,
+               COALESCE(s.stock, 0),
+               COALESCE(s.last_movement_id, 0),
+               COUNT(m.id), COALESCE(SUM(m.change), 0), MAX(m.id)
+        FROM products p
+        LEFT JOIN stock_snapshots s ON s.id = (
+            SELECT id FROM stock_snapshots
+            WHERE product_id = p.id ORDER BY last_movement_id DESC LIMIT 1
+        )
+        JOIN stock_movements m ON m.product_id = p.id AND m.id > COALESCE(s.last_movement_id, 0)
+        WHERE 1 = 1 {user_filter}
+        GROUP BY p.id
+        HAVING COUNT(m.id) >= ?
+    """, params + (max(1, min_movements),))
+
+    now = datetime.now().isoformat()
+    snapshots = [
+        (row[1], row[0], row[2] + row[5], row[6], now)
+        for row in cursor.fetchall()
+    ]
+    cursor.executemany("""
+        INSERT INTO stock_snapshots (user_id, product_id, stock, last_movement_id, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, snapshots)
+    return len(snapshots)
+
+def take_snapshots(user_id: int = None, min_movements: int = STOCK_SNAPSHOT_INTERVAL):
+    """Snapshot every product with at least `min_movements` movements since its last snapshot"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        count = _take_snapshots(conn.cursor(), user_id, min_movements)
+        conn.commit()
+
+        if count:
+            logger.info("Stock snapshots taken for %s products", count)
+        return count
+    except Exception as e:
+        logger.error("Take snapshots error: %s", e)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def reconcile_stock(user_id: int = None, fix: bool = False, batch_size: int = STOCK_RECONCILE_BATCH_SIZE):
+    """Replay the ledger and compare it with products.stock.
+
+    Products are scanned in keyset batches by id so large shops never hold one
+    long read transaction. With `fix`, products.stock is reset to the ledger value.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        user_filter = "AND p.user_id = ?" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else ()
+
+        checked = 0
+        mismatches = []
+        last_id = 0
+        while True:
+            cursor.execute(f"""
+                SELECT p.id, p.user_id, p.name, p.stock,
+                       (SELECT COALESCE(SUM(m.change), 0) FROM stock_movements m WHERE m.product_id = p.id)
+                FROM products p
+                WHERE p.id > ? {user_filter}
+                ORDER BY p.id LIMIT ?
+            """, (last_id,) + params + (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for product_id, owner_id, name, stock, ledger_stock in rows:
+                checked += 1
+                if abs((stock or 0) - ledger_stock) > STOCK_EPSILON:
+                    mismatches.append({
+                        "product_id": product_id,
+                        "user_id": owner_id,
+                        "product": name,
+                        "stock": stock,
+                        "ledger_stock": ledger_stock
+                    })
+            last_id = rows[-1][0]
+
+        if fix and mismatches:
+            cursor.executemany(
+                "UPDATE products SET stock = ? WHERE id = ?",
+                [(m["ledger_stock"], m["product_id"]) for m in mismatches]
+            )
+            conn.commit()
+            logger.info("Reconcile fixed stock for %s products", len(mismatches))
+
+        logger.info("Reconcile checked %s products, %s mismatches", checked, len(mismatches))
+        return {"checked": checked, "mismatches": mismatches, "fixed": bool(fix and mismatches)}
+    except Exception as e:
+        logger.error("Reconcile stock error: %s", e)
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock ledger maintenance")
+    parser.add_argument("command", choices=["reconcile", "snapshot"])
+    parser.add_argument("--user", type=int, default=None, help="Limit to one shop (user id)")
+    parser.add_argument("--fix", action="store_true", help="Reset products.stock to the ledger value")
+    parser.add_argument("--batch-size", type=int, default=STOCK_RECONCILE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        count = take_snapshots(args.user, min_movements=1)
+        print(f"[+] Snapshots taken: {count}")
+        return 0
+
+    result = reconcile_stock(args.user, fix=args.fix, batch_size=args.batch_size)
+    print(f"[*] Products checked: {result['checked']}")
+    for m in result["mismatches"]:
+        print(f"  [!] #{m['product_id']} {m['product']} (user {m['user_id']}): "
+              f"stock={m['stock']} ledger={m['ledger_stock']}")
+    if result["fixed"]:
+        print(f"[+] Fixed {len(result['mismatches'])} products")
+    elif not result["mismatches"]:
+        print("[SUCCESS] Stock matches the ledger")
+    return 1 if result["mismatches"] and not result["fixed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Shared test fixtures
+
+Tests run against groq_stub.py on a free local port, never the real API.
+The database, logs and traces go to a scratch directory, set before any
+backend module reads config.
+
+Run (from backend/): python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="shopkeeper_tests_")
+os.environ.update({
+    "DB_PATH": os.path.join(_scratch, "test.db"),
+    "LOG_DIR": os.path.join(_scratch, "logs"),
+    "TRACE_FILE": os.path.join(_scratch, "traces.jsonl"),
+    "LOG_LEVEL": "WARNING",
+    "TRANSLATION_WARMUP": "False",
+})
+
+import pytest
+
+@pytest.fixture(scope="session")
+def groq_stub():
+    """One stub server for the session; returns (server, base_url)"""
+    from groq_stub import start_stub
+    server, url = start_stub()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def llm(groq_stub, monkeypatch):
+    """llm_client pointed at the stub, with fresh clients, no SDK retries and a fast breaker"""
+    import llm_client
+    from circuit_breaker import CircuitBreaker
+    server, url = groq_stub
+    state = server.state
+    with state.lock:
+        state.latency = state.failure_rate = state.hang_rate = 0.0
+        state.requests = state.connections = 0
+
+    monkeypatch.setattr(llm_client, "GROQ_API_KEY", "stub")
+    monkeypatch.setattr(llm_client, "GROQ_BASE_URL", url)
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_async_client", None)
+    monkeypatch.setattr(llm_client, "groq_breaker", CircuitBreaker("groq", failure_threshold=2, cooldown=0.2))
+    yield llm_client
+    if llm_client._client is not None:
+        llm_client._client.close()
+
+@pytest.fixture
+def stub_state(groq_stub):
+    return groq_stub[0].state
+
+@pytest.fixture
+def make_shop():
+    """Create shopkeepers in the scratch database; each call returns a new user id"""
+    import uuid
+    from datetime import datetime
+    from database import init_database, get_db_connection
+    init_database()
+
+    def make():
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO users (name, email, password_hash, role, shop_name, is_active, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, ("Test Shop", f"{uuid.uuid4().hex}@test.com", "x", "shopkeeper", "Test Shop", 1,
+                  datetime.now().isoformat()))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+    return make
+
+@pytest.fixture
+def shop(make_shop):
+    """A fresh shopkeeper; returns the user id"""
+    return make_shop()
+
+@pytest.fixture
+def client(shop):
+    """A TestClient for the API, signed in as the `shop` user"""
+    from fastapi.testclient import TestClient
+    import main
+    from auth import get_current_user
+    main.app.dependency_overrides[get_current_user] = lambda: {"id": shop, "role": "shopkeeper"}
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
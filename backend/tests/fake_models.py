@@ -0,0 +1,20 @@
+"""
+Model loaders for inference pool tests; worker processes import them by
+"fake_models:<function>", like a real TRANSLATION_BACKEND
+"""
+import os
+
+def load_upper(model: str):
+    def run(texts: list) -> list:
+        if "crash" in texts:
+            os._exit(1)  # the worker dies mid-batch
+        return [text.upper() for text in texts]
+    return run
+
+def load_broken(model: str):
+    raise OSError(f"cannot load {model}")
+
+def load_slow(model: str):
+    import time
+    time.sleep(1)  # a model download and load
+    return load_upper(model)
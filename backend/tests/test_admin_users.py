@@ -0,0 +1,73 @@
+"""
+The admin user list pages by id, so walking `next_cursor` visits every user
+once even while new users sign up
+"""
+import uuid
+import pytest
+from database import get_db_connection
+
+@pytest.fixture
+def admin(client, shop):
+    """The API client, signed in as an admin"""
+    import main
+    from auth import get_current_user
+    main.app.dependency_overrides[get_current_user] = lambda: {"id": shop, "role": "admin"}
+    return client
+
+def _all_user_ids(where="", params=()):
+    conn = get_db_connection()
+    try:
+        return [row[0] for row in conn.execute(f"SELECT id FROM users {where} ORDER BY id DESC", params)]
+    finally:
+        conn.close()
+
+def _rename(user_id, name):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _walk(admin, limit, on_page=None, **params):
+    ids, before = [], None
+    while True:
+        query = dict(params, limit=limit, **({"before": before} if before is not None else {}))
+        response = admin.get("/admin/users", params=query)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["users"]) <= limit
+        ids += [user["id"] for user in page["users"]]
+        if on_page:
+            on_page()
+        before = page["next_cursor"]
+        if before is None:
+            return ids
+
+def test_pages_cover_every_user_once(admin, make_shop):
+    for _ in range(6):
+        make_shop()
+    expected = _all_user_ids()
+    ids = _walk(admin, limit=4, on_page=make_shop)  # a signup between every page
+    assert ids == expected
+    assert len(set(ids)) == len(ids)
+
+def test_last_full_page_has_no_cursor(admin):
+    total = len(_all_user_ids())
+    page = admin.get("/admin/users", params={"limit": total}).json()
+    assert (len(page["users"]), page["next_cursor"]) == (total, None)
+
+def test_search_pages_by_prefix(admin, make_shop):
+    tag = uuid.uuid4().hex[:8]
+    matching = [make_shop() for _ in range(5)]
+    for user_id in matching:
+        _rename(user_id, f"{tag} shop")
+    _rename(make_shop(), f"shop {tag}")  # contains the tag, but not as a prefix
+
+    assert _walk(admin, limit=2, search=tag) == sorted(matching, reverse=True)
+    assert _walk(admin, limit=2, search=tag.upper()) == sorted(matching, reverse=True)
+    # LIKE wildcards in the search are matched literally
+    assert _walk(admin, limit=2, search="%" + tag) == []
+
+def test_shopkeeper_cannot_list_users(client):
+    assert client.get("/admin/users").status_code == 403
@@ -0,0 +1,79 @@
+"""
+Auth caches: verified tokens skip the signature check, and a cached
+principal is dropped when any worker records a change to that account
+"""
+from datetime import timedelta
+import pytest
+import auth
+from database import get_db_connection
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_EPOCH_CHECK_INTERVAL", 0)
+    with auth._cache_lock:
+        auth._principals.clear()
+        auth._tokens.clear()
+    auth._epoch.update(value=None, checked_at=0.0)
+    yield
+
+@pytest.fixture
+def user_loads(monkeypatch):
+    """Count the account queries behind get_principal"""
+    loads = []
+    load = auth.get_user_by_id
+
+    def counting(user_id):
+        loads.append(user_id)
+        return load(user_id)
+    monkeypatch.setattr(auth, "get_user_by_id", counting)
+    return loads
+
+def _change_account(user_id, **columns):
+    """An admin's edit as another worker would commit it"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for column, value in columns.items():
+            cursor.execute(f"UPDATE users SET {column} = ? WHERE id = ?", (value, user_id))
+        auth.mark_user_changed(cursor, user_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+def test_verified_token_is_cached(shop, monkeypatch):
+    token = auth.create_access_token({"sub": str(shop)})
+    decodes = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **k: decodes.append(1) or decode(*a, **k))
+    assert auth._decode_user_id(token) == str(shop)
+    assert auth._decode_user_id(token) == str(shop)
+    assert len(decodes) == 1
+
+def test_expired_token_is_rejected(shop):
+    token = auth.create_access_token({"sub": str(shop)}, timedelta(seconds=-1))
+    with pytest.raises(auth.JWTError):
+        auth._decode_user_id(token)
+
+def test_principal_is_cached(shop, user_loads):
+    assert auth.get_principal(shop)["is_active"]
+    assert auth.get_principal(shop)["is_active"]
+    assert user_loads == [shop]
+
+def test_epoch_bump_drops_only_the_changed_account(shop, make_shop, user_loads):
+    other = make_shop()
+    auth.get_principal(shop)
+    auth.get_principal(other)
+
+    _change_account(shop, is_active=0, role="admin")
+    assert auth.get_principal(shop)["is_active"] is False
+    assert auth.get_principal(shop)["role"] == "admin"
+    auth.get_principal(other)
+    assert user_loads == [shop, other, shop]
+
+def test_change_is_seen_only_after_the_check_interval(shop, user_loads, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_EPOCH_CHECK_INTERVAL", 3600)
+    auth.get_principal(shop)
+    _change_account(shop, is_active=0)
+    assert auth.get_principal(shop)["is_active"]  # still cached until the next check
+    auth._epoch["checked_at"] = 0.0
+    assert auth.get_principal(shop)["is_active"] is False
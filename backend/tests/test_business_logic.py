@@ -0,0 +1,63 @@
+"""
+Write paths bind products by exact name, falling back to SQL for products
+this worker's index has not seen
+"""
+from datetime import datetime
+import product_index
+from database import get_db_connection
+from business_logic import import_barcodes, get_inventory
+
+def _insert_behind_index(user_id, name):
+    """Create a product the way another worker would, without touching this worker's index"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO products (user_id, name, cost_price, selling_price, stock, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, name, 70, 80, 0, datetime.now().isoformat()))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def test_import_barcodes_finds_product_missing_from_index(shop):
+    assert product_index.resolve_exact(shop, "rice") is None  # index loaded while the shop is empty
+    rice_id = _insert_behind_index(shop, "rice")
+
+    result = import_barcodes(shop, [{"barcode": "8961000000017", "name": "Rice"}])
+    assert result == {"imported": 1, "created": 0, "errors": []}
+    [rice] = get_inventory(shop)
+    assert (rice["id"], rice["barcode"]) == (rice_id, "8961000000017")
+
+def test_resolved_product_id_is_used_for_the_write(shop, monkeypatch):
+    import business_logic
+    from business_logic import execute_intents, record_purchase
+    record_purchase(shop, "rice", 10, 70)
+    product_index.add_alias(shop, _product("rice", shop), "chawal")
+
+    def no_second_lookup(*args):
+        raise AssertionError("the write path resolved the name again")
+    monkeypatch.setattr(business_logic, "_find_product", no_second_lookup)
+
+    sale = {"intent": "record_sale", "entities": {"product": "Chawal", "quantity": 2, "price": 80}}
+    purchase = {"intent": "record_purchase", "entities": {"product": "rice", "quantity": 5, "price": 72}}
+    assert "data" in execute_intents([sale], shop)
+    assert "data" in execute_intents([purchase], shop)
+    [rice] = get_inventory(shop)
+    assert (rice["stock"], rice["cost_price"], rice["selling_price"]) == (13, 72, 80)
+
+def test_parsed_product_id_is_not_trusted(shop, make_shop):
+    from business_logic import execute_intents, record_purchase
+    saffron = _insert_behind_index(shop, "saffron")
+    other_shop = make_shop()
+    record_purchase(other_shop, "rice", 1, 1)
+    # An id smuggled in with the parse must not reach another shop's product
+    sale = {"intent": "record_sale", "entities": {"product": "saffron", "quantity": 1, "price": 900,
+                                                  "product_id": _product("rice", other_shop)}}
+    execute_intents([sale], shop)
+    assert [(p["id"], p["selling_price"]) for p in get_inventory(shop)] == [(saffron, 900)]
+    assert [p["selling_price"] for p in get_inventory(other_shop)] == [1]
+
+def _product(name, user_id):
+    return next(p["id"] for p in get_inventory(user_id) if p["name"] == name)
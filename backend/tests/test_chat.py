@@ -0,0 +1,31 @@
+"""
+/chat runs the message off the event loop, so a slow parse does not
+stall other requests
+"""
+import time
+import asyncio
+import httpx
+import main
+
+def test_slow_chat_does_not_block_other_requests(client, monkeypatch):
+    def slow_chat(message, user_id):
+        time.sleep(0.5)  # an LLM call running into its budget
+        return {"response": "ok"}
+    monkeypatch.setattr(main, "process_chat_message", slow_chat)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            start = time.perf_counter()
+
+            async def inventory():
+                await asyncio.sleep(0.05)  # sent while the chat message is being parsed
+                response = await http.get("/inventory")
+                return response, time.perf_counter() - start
+            chat, (inventory, elapsed) = await asyncio.gather(http.post("/chat", json={"message": "hi"}), inventory())
+        return chat, inventory, elapsed
+
+    chat, inventory, elapsed = asyncio.run(run())
+    assert chat.json() == {"response": "ok"}
+    assert inventory.status_code == 200
+    assert elapsed < 0.3
@@ -0,0 +1,45 @@
+"""
+/chat/stream event sequence for free-form answers: `done` only after a
+clean finish, an `error` with the partial text when the LLM stream breaks
+"""
+import json
+import pytest
+import main
+
+@pytest.fixture(autouse=True)
+def llm_configured(monkeypatch):
+    monkeypatch.setattr(main, "GROQ_API_KEY", "stub")
+
+def _events(client, message="what is the meaning of life"):
+    response = client.post("/chat/stream", json={"message": message})
+    assert response.status_code == 200
+    events = []
+    for raw in response.text.strip().split("\n\n"):
+        event, data = raw.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def _reply(*tokens, fail=False):
+    async def stream(message):
+        for token in tokens:
+            yield token
+        if fail:
+            raise RuntimeError("connection reset")
+    return stream
+
+def test_clean_reply_ends_with_done(client, monkeypatch):
+    monkeypatch.setattr(main, "stream_free_form_reply", _reply("Hello", " there"))
+    names = [name for name, _ in _events(client)]
+    assert names == ["intent", "token", "token", "text", "done"]
+
+def test_broken_reply_is_flagged_not_done(client, monkeypatch):
+    monkeypatch.setattr(main, "stream_free_form_reply", _reply("Hello", " the", fail=True))
+    events = _events(client)
+    assert [name for name, _ in events] == ["intent", "token", "token", "error"]
+    assert events[-1][1]["partial"] == "Hello the"
+    assert events[-1][1]["truncated"] is True
+
+def test_reply_failing_before_any_token_falls_back(client, monkeypatch):
+    monkeypatch.setattr(main, "stream_free_form_reply", _reply(fail=True))
+    names = [name for name, _ in _events(client)]
+    assert names == ["intent", "result", "text", "done"]
@@ -0,0 +1,56 @@
+"""
+Inference pool: the model runs in worker processes, a load failure leaves
+the pool unavailable instead of blocking callers, and a crashed worker is
+replaced. The standalone service serves the same pool over HTTP.
+"""
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from inference_service import InferencePool, ServiceClient, start_service, READY, UNAVAILABLE
+
+def _pool(loader):
+    return InferencePool(model="fake", loader=loader, processes=1, max_batch=8, max_wait=0.01,
+                         timeout=30, health_interval=3600)
+
+@pytest.fixture
+def pool():
+    pool = _pool("fake_models:load_upper")
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+def test_translates_in_a_worker_process(pool):
+    assert pool.check() == READY
+    assert pool.translate(["rice", "sugar"]) == ["RICE", "SUGAR"]
+    health = pool.health()
+    assert health["ready"] and health["restarts"] == 0
+    assert health["batching"]["items"] == 2
+
+def test_load_failure_makes_the_pool_unavailable():
+    pool = _pool("fake_models:load_broken")
+    try:
+        assert pool.check() == UNAVAILABLE
+        assert "cannot load fake" in pool.health()["last_error"]
+        with pytest.raises(RuntimeError, match="unavailable"):
+            pool.translate(["rice"])
+    finally:
+        pool.shutdown()
+
+def test_crashed_worker_is_replaced(pool):
+    assert pool.check() == READY
+    with pytest.raises(BrokenProcessPool):
+        pool.translate(["crash"])
+    assert pool.health()["restarts"] == 1
+    assert pool.check() == READY
+    assert pool.translate(["oil"]) == ["OIL"]
+
+def test_service_round_trip(pool):
+    pool.check()
+    server, url = start_service(pool)
+    try:
+        client = ServiceClient(url)
+        assert client.translate(["tea"]) == ["TEA"]
+        assert client.ready
+        assert client.health()["service"] == url
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,78 @@
+"""
+Intent cache: templates, slot re-binding, refusal of ambiguous slots,
+TTL and LRU eviction, and persistence to SQLite
+"""
+import pytest
+import intent_cache
+from intent_cache import make_template, lookup, store
+
+PRODUCTS = ["cooking oil", "sugar", "rice", "oil"]  # longest first, as product_names() returns them
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    monkeypatch.setattr(intent_cache, "_known_products", lambda user_id: PRODUCTS)
+    intent_cache.clear()
+    yield intent_cache
+    intent_cache.clear()
+
+def _sale(product, quantity, price):
+    return [{"intent": "record_sale", "entities": {"product": product, "quantity": quantity, "price": price}}]
+
+def test_make_template():
+    assert make_template("Sold 3  Cooking Oil at 90.5", PRODUCTS) == (
+        "sold <n> <p> at <n>", [("n", 3.0), ("p", "cooking oil"), ("n", 90.5)])
+    assert make_template("sold 1,000 rice at 80", PRODUCTS) == (
+        "sold <n> <p> at <n>", [("n", 1000.0), ("p", "rice"), ("n", 80.0)])
+    # "oil" inside "boiled" is not a product mention
+    assert make_template("boiled 2 eggs", PRODUCTS) == ("boiled <n> eggs", [("n", 2.0)])
+
+def test_hit_rebinds_the_new_values():
+    store(1, "sold 3 sugar at 90", _sale("sugar", 3, 90))
+    assert lookup(1, "Sold 12 cooking oil at 310.5") == _sale("cooking oil", 12, 310.5)
+    hit = lookup(1, "sold 1,000 rice at 80")
+    assert hit == _sale("rice", 1000, 80)
+    assert isinstance(hit[0]["entities"]["quantity"], int)
+
+def test_values_not_in_the_message_are_kept():
+    intents = [{"intent": "record_sale", "entities": {"product": "sugar", "quantity": 12, "price": 90, "unit": "kg"}}]
+    store(1, "sold a dozen sugar at 90", intents)
+    assert lookup(1, "sold a dozen rice at 85") == [
+        {"intent": "record_sale", "entities": {"product": "rice", "quantity": 12, "price": 85, "unit": "kg"}}]
+
+def test_ambiguous_slots_are_not_cached():
+    store(1, "sold 5 sugar at 5", _sale("sugar", 5, 5))
+    assert lookup(1, "sold 2 sugar at 90") is None
+    assert intent_cache.get_cache_stats()["size"] == 0
+
+def test_entries_are_per_shop():
+    store(1, "sold 3 sugar at 90", _sale("sugar", 3, 90))
+    assert lookup(2, "sold 3 sugar at 90") is None
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(intent_cache.time, "time", lambda: now[0])
+    monkeypatch.setattr(intent_cache, "INTENT_CACHE_TTL", 60)
+    store(1, "sold 3 sugar at 90", _sale("sugar", 3, 90))
+    now[0] += 59
+    assert lookup(1, "sold 4 rice at 80") is not None
+    now[0] += 2
+    assert lookup(1, "sold 4 rice at 80") is None
+    assert intent_cache.get_cache_stats()["size"] == 0
+
+def test_lru_eviction(monkeypatch):
+    monkeypatch.setattr(intent_cache, "INTENT_CACHE_SIZE", 2)
+    store(1, "sold 3 sugar at 90", _sale("sugar", 3, 90))
+    store(1, "bought 3 sugar at 90", _sale("sugar", 3, 90))
+    assert lookup(1, "sold 1 rice at 80") is not None  # the sale template is now the most recent
+    store(1, "got 3 sugar at 90", _sale("sugar", 3, 90))
+    assert lookup(1, "bought 1 rice at 80") is None
+    assert lookup(1, "sold 1 rice at 80") is not None
+    assert lookup(1, "got 1 rice at 80") is not None
+
+def test_persisted_entries_survive_a_restart(shop, monkeypatch):
+    monkeypatch.setattr(intent_cache, "INTENT_CACHE_PERSIST", True)
+    store(shop, "sold 3 sugar at 90", _sale("sugar", 3, 90))
+    intent_cache.clear()  # a fresh process
+    assert lookup(shop, "sold 2 rice at 80") is None
+    assert intent_cache.load_persisted() >= 1
+    assert lookup(shop, "sold 2 rice at 80") == _sale("rice", 2, 80)
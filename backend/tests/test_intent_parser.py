@@ -0,0 +1,72 @@
+"""
+Multi-command parsing and execution: invoices mixed with other commands,
+the minimum-confidence guard, and unique invoice numbers within a batch
+"""
+import pytest
+from ai_intent_parser import parse_commands_with_regex
+from business_logic import execute_intents, process_chat_message, get_all_invoices, get_inventory
+
+def _intents(message):
+    return [(r["intent"], r["entities"]) for r in parse_commands_with_regex(message)]
+
+def test_two_invoices_split():
+    assert _intents("invoice for Ali: 2 rice at 85; invoice for Bilal: 3 sugar at 100") == [
+        ("create_invoice", {"customer": "ali", "items": [{"name": "rice", "quantity": 2.0, "price": 85.0}]}),
+        ("create_invoice", {"customer": "bilal", "items": [{"name": "sugar", "quantity": 3.0, "price": 100.0}]}),
+    ]
+
+def test_invoice_then_purchase():
+    assert _intents("invoice for Ali 2 rice at 85 and bought 10 sugar at 90") == [
+        ("create_invoice", {"customer": "ali", "items": [{"name": "rice", "quantity": 2.0, "price": 85.0}]}),
+        ("record_purchase", {"quantity": 10.0, "product": "sugar", "price": 90.0}),
+    ]
+
+def test_sale_then_invoice_without_separator():
+    assert [intent for intent, _ in _intents("sold 5 rice at 80 invoice for ali: 2 oil at 150")] == [
+        "record_sale", "create_invoice"]
+
+def test_invoice_keeps_its_items():
+    [(intent, entities)] = _intents("invoice for ali hassan: 5 rice at 80, 2 cooking oil at 150 and 1 sugar at 90")
+    assert intent == "create_invoice"
+    assert entities["customer"] == "ali hassan"
+    assert [item["name"] for item in entities["items"]] == ["rice", "cooking oil", "sugar"]
+
+@pytest.mark.parametrize("message, quantity, price", [
+    ("sold 1,000 rice at 80", 1000.0, 80.0),
+    ("1,000 rice sold at 80", 1000.0, 80.0),
+    ("sold 2 rice at 1,250.50", 2.0, 1250.5),
+])
+def test_thousands_separators(message, quantity, price):
+    assert _intents(message) == [("record_sale", {"quantity": quantity, "product": "rice", "price": price})]
+
+def test_invoice_item_with_thousands_separator():
+    [(_, entities)] = _intents("invoice for ali: 1,200 rice at 85, 2 oil at 300")
+    assert [(i["name"], i["quantity"]) for i in entities["items"]] == [("rice", 1200.0), ("oil", 2.0)]
+
+def test_two_invoices_in_one_batch(shop):
+    intents = parse_commands_with_regex("invoice for Ali: 2 rice at 85; invoice for Bilal: 3 sugar at 100")
+    result = execute_intents(intents, shop)
+    assert "data" in result, result["response"]
+    invoices = get_all_invoices(shop)
+    assert sorted(i["customer_name"] for i in invoices) == ["ali", "bilal"]
+    assert len({i["invoice_number"] for i in invoices}) == 2
+
+def test_unsure_batch_is_not_executed(shop):
+    intents = [
+        {"intent": "record_sale", "entities": {"quantity": 5.0, "product": "rice", "price": 80.0}, "confidence": 0.95},
+        {"intent": "record_purchase", "entities": {"quantity": 10.0, "product": "sugar", "price": 90.0},
+         "confidence": 0.5},
+    ]
+    result = execute_intents(intents, shop)
+    assert "data" not in result
+    assert "Nothing was recorded" in result["response"]
+    assert get_inventory(shop) == []
+
+@pytest.mark.parametrize("message", ["Sold 5 rice at 80 to Ahmed", "sold 5 rice at 80 for ali"])
+def test_single_command_with_extra_words_is_recorded(shop, monkeypatch, message):
+    import ai_intent_parser
+    monkeypatch.setattr(ai_intent_parser, "GROQ_API_KEY", "")
+    result = process_chat_message(message, shop)
+    assert "data" in result, result["response"]
+    [rice] = get_inventory(shop)
+    assert rice["name"] == "rice"
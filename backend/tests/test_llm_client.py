@@ -0,0 +1,63 @@
+"""Shared Groq client: connection reuse, per-call timeouts and the async variant"""
+import time
+import asyncio
+import groq
+import pytest
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+def test_chat_completion_reuses_one_client_and_connection(llm, stub_state):
+    assert llm.chat_completion(MESSAGES) == "ping"
+    client = llm.get_llm_client()
+    assert llm.chat_completion([{"role": "user", "content": "pong"}]) == "pong"
+
+    assert llm.get_llm_client() is client
+    assert stub_state.requests == 2
+    # Keep-alive: the second call goes over the first call's connection
+    assert stub_state.connections == 1
+
+def test_chat_completion_per_call_timeout(llm, stub_state):
+    stub_state.latency = 1.0
+    start = time.perf_counter()
+    with pytest.raises(groq.APITimeoutError):
+        llm.chat_completion(MESSAGES, timeout=0.2)
+    assert time.perf_counter() - start < 0.9
+
+    # The timeout belongs to that call only
+    stub_state.latency = 0.3
+    assert llm.chat_completion(MESSAGES) == "ping"
+
+def test_chat_completion_without_api_key(llm, monkeypatch):
+    monkeypatch.setattr(llm, "GROQ_API_KEY", "")
+    assert llm.chat_completion(MESSAGES) is None
+
+def test_achat_completion(llm, stub_state):
+    async def run():
+        try:
+            first = await llm.achat_completion(MESSAGES)
+            client = llm.get_async_llm_client()
+            second = await asyncio.gather(*(llm.achat_completion([{"role": "user", "content": f"n{i}"}])
+                                            for i in range(3)))
+            return first, second, client is llm.get_async_llm_client()
+        finally:
+            await llm.close_llm_clients()
+
+    first, second, same_client = asyncio.run(run())
+    assert first == "ping"
+    assert second == ["n0", "n1", "n2"]
+    assert same_client
+    assert stub_state.requests == 4
+
+def test_achat_completion_per_call_timeout(llm, stub_state):
+    stub_state.latency = 1.0
+
+    async def run():
+        try:
+            with pytest.raises(groq.APITimeoutError):
+                await llm.achat_completion(MESSAGES, timeout=0.2)
+        finally:
+            await llm.close_llm_clients()
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    assert time.perf_counter() - start < 0.9
@@ -0,0 +1,111 @@
+"""Latency budget, circuit breaker and regex fallback, driven by the stub's fault injection"""
+import time
+import asyncio
+import groq
+import pytest
+from circuit_breaker import CircuitOpenError, DeadlineExceeded, OPEN, HALF_OPEN, CLOSED
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+def open_breaker(llm):
+    for _ in range(llm.groq_breaker.failure_threshold):
+        llm.groq_breaker.record_failure()
+    assert llm.groq_breaker.state == OPEN
+
+def wait_for_half_open(llm):
+    time.sleep(llm.groq_breaker.cooldown + 0.05)
+    assert llm.groq_breaker.state == HALF_OPEN
+
+def test_budget_raises_deadline_exceeded(llm, stub_state):
+    stub_state.hang_rate = 1.0
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        llm.chat_completion(MESSAGES, budget=0.3)
+    assert time.perf_counter() - start < 1.0
+    assert llm.groq_breaker.snapshot()["timeouts"] == 1
+
+def test_parser_falls_back_to_regex_within_budget(llm, stub_state, monkeypatch):
+    import ai_intent_parser
+    monkeypatch.setattr(ai_intent_parser, "GROQ_API_KEY", "stub")
+    monkeypatch.setattr(ai_intent_parser, "LLM_INTENT_BUDGET", 0.3)
+    stub_state.hang_rate = 1.0
+    message = "my neighbour took 5 rice and paid 80 each"
+    expected = ai_intent_parser.parse_commands_with_regex(message)
+    before = ai_intent_parser.get_parser_stats()["routes"]["regex_fallback"]
+
+    start = time.perf_counter()
+    assert ai_intent_parser.parse_intents(message) == expected
+    assert time.perf_counter() - start < 1.0
+    assert ai_intent_parser.get_parser_stats()["routes"]["regex_fallback"] == before + 1
+
+def test_breaker_opens_after_repeated_failures(llm, stub_state):
+    stub_state.failure_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(groq.InternalServerError):
+            llm.chat_completion(MESSAGES)
+    assert llm.groq_breaker.state == OPEN
+
+    # Refused without reaching the provider
+    with pytest.raises(CircuitOpenError):
+        llm.chat_completion(MESSAGES)
+    assert stub_state.requests == 2
+
+def test_half_open_trial_success_closes_breaker(llm, stub_state):
+    open_breaker(llm)
+    wait_for_half_open(llm)
+    assert llm.chat_completion(MESSAGES) == "ping"
+    assert llm.groq_breaker.state == CLOSED
+
+def test_half_open_trial_failure_reopens_breaker(llm, stub_state):
+    open_breaker(llm)
+    wait_for_half_open(llm)
+    stub_state.failure_rate = 1.0
+    with pytest.raises(groq.InternalServerError):
+        llm.chat_completion(MESSAGES)
+    assert llm.groq_breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        llm.chat_completion(MESSAGES)
+
+def test_cancelled_trial_call_releases_the_trial_slot(llm, stub_state):
+    open_breaker(llm)
+    wait_for_half_open(llm)
+    stub_state.latency = 1.0
+
+    async def run():
+        try:
+            task = asyncio.create_task(llm.achat_completion(MESSAGES))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # Neither a success nor a failure: still half-open, and the next call is the trial
+            assert llm.groq_breaker.state == HALF_OPEN
+            stub_state.latency = 0.0
+            return await llm.achat_completion(MESSAGES)
+        finally:
+            await llm.close_llm_clients()
+
+    assert asyncio.run(run()) == "ping"
+    stats = llm.groq_breaker.snapshot()
+    assert stats["state"] == CLOSED
+    assert stats["cancelled"] == 1
+    assert stats["failures"] == 2  # only the ones that opened it
+
+def test_closed_stream_releases_the_trial_slot(llm, stub_state):
+    open_breaker(llm)
+    wait_for_half_open(llm)
+
+    async def run():
+        try:
+            stream = llm.astream_chat_completion([{"role": "user", "content": "one two three four"}])
+            assert await stream.__anext__() == "one"
+            # The consumer stops early, as when a /chat/stream client disconnects
+            await stream.aclose()
+            assert llm.groq_breaker.state == HALF_OPEN
+            return [token async for token in llm.astream_chat_completion(MESSAGES)]
+        finally:
+            await llm.close_llm_clients()
+
+    assert asyncio.run(run()) == ["ping"]
+    assert llm.groq_breaker.state == CLOSED
+    assert llm.groq_breaker.snapshot()["cancelled"] == 1
@@ -0,0 +1,47 @@
+"""
+Log retention counts days, not files: a day with many size rotations keeps
+all of them, and backups past LOG_BACKUP_DAYS are deleted
+"""
+import os
+import logging
+from datetime import date, timedelta
+from logger_config import SizedTimedRotatingFileHandler
+
+def _touch(directory, name):
+    with open(os.path.join(directory, name), "w") as f:
+        f.write("old\n")
+
+def _emit(handler, message):
+    handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None))
+
+def test_retention_is_by_date(tmp_path):
+    today = date.today()
+    recent = (today - timedelta(days=3)).isoformat()
+    old = (today - timedelta(days=20)).isoformat()
+    for name in (f"app.log.{old}", f"app.log.{old}.1", f"app.log.{recent}", "app.log.notes", "other.log.2020-01-01"):
+        _touch(tmp_path, name)
+
+    handler = SizedTimedRotatingFileHandler(str(tmp_path / "app.log"), max_bytes=64, backup_days=14,
+                                            when="midnight", encoding="utf-8", delay=True)
+    try:
+        for i in range(30):  # every record past the first overflows 64 bytes
+            _emit(handler, f"record {i} " + "x" * 60)
+    finally:
+        handler.close()
+
+    names = set(os.listdir(tmp_path))
+    assert not any(name.startswith(f"app.log.{old}") for name in names)
+    assert {f"app.log.{recent}", "app.log.notes", "other.log.2020-01-01", "app.log"} <= names
+    # Today's size rotations are all kept, well past 14 files
+    assert len([name for name in names if name.startswith(f"app.log.{today.isoformat()}")]) == 29
+
+def test_zero_days_keeps_everything(tmp_path):
+    _touch(tmp_path, "app.log.2020-01-01")
+    handler = SizedTimedRotatingFileHandler(str(tmp_path / "app.log"), max_bytes=16, backup_days=0,
+                                            when="midnight", encoding="utf-8", delay=True)
+    try:
+        for i in range(3):
+            _emit(handler, f"record {i} " + "x" * 20)
+    finally:
+        handler.close()
+    assert "app.log.2020-01-01" in os.listdir(tmp_path)
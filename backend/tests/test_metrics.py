@@ -0,0 +1,76 @@
+"""
+/metrics is valid Prometheus text exposition format (version 0.0.4)
+"""
+import re
+import metrics
+
+NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+LABEL = rf'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+SAMPLE = re.compile(rf"^({NAME})(\{{(?:{LABEL}(?:,{LABEL})*)?\}})? (\S+)$")
+KINDS = {"counter", "gauge", "histogram", "summary", "untyped"}
+SUFFIXES = {"histogram": ("_bucket", "_sum", "_count"), "summary": ("_sum", "_count", "")}
+
+def parse(text):
+    """{family: {"type", "help", "samples": [(name, labels text, value)]}}; fails on malformed lines"""
+    assert text.endswith("\n")
+    families, family = {}, None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, _, help_text = line[len("# HELP "):].partition(" ")
+            assert re.fullmatch(NAME, name) and name not in families, line
+            family = name
+            families[name] = {"help": help_text, "type": None, "samples": []}
+        elif line.startswith("# TYPE "):
+            name, _, kind = line[len("# TYPE "):].partition(" ")
+            assert name in families and families[name]["type"] is None, line
+            assert kind in KINDS, line
+            families[name]["type"] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"malformed sample: {line!r}"
+            name, labels, value = match.groups()
+            assert family is not None, f"sample before any HELP: {line!r}"
+            allowed = [family + suffix for suffix in SUFFIXES.get(families[family]["type"], ("",))]
+            assert name in allowed, f"{name} outside its family {family}"
+            float(value)  # also accepts +Inf and NaN
+            families[family]["samples"].append((name, labels or "", value))
+    return families
+
+def test_metrics_endpoint_parses(client):
+    client.get("/inventory")  # at least one request, query and connection recorded
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    families = parse(response.text)
+    assert {"http_requests_total", "http_request_duration_seconds", "db_query_duration_seconds",
+            "log_records_dropped_total"} <= set(families)
+    assert all(family["type"] for family in families.values())
+
+    for name, family in families.items():
+        if family["type"] != "histogram":
+            continue
+        series = {}
+        for sample, labels, value in family["samples"]:
+            key = re.sub(r',?le="[^"]*"', "", labels).replace("{}", "")
+            series.setdefault(key, []).append((sample, labels, float(value)))
+        for key, samples in series.items():
+            buckets = [value for sample, _, value in samples if sample == f"{name}_bucket"]
+            [count] = [value for sample, _, value in samples if sample == f"{name}_count"]
+            assert buckets == sorted(buckets), f"{name}{key} buckets are not cumulative"
+            assert 'le="+Inf"' in [labels for sample, labels, _ in samples if sample == f"{name}_bucket"][-1]
+            assert buckets[-1] == count
+
+def test_label_values_are_escaped():
+    errors = metrics.Counter("test_errors_total", "Errors by message", ("message",))
+    errors.inc('bad "quote" \\ and\nnewline')
+    [line] = errors.render()
+    assert line == 'test_errors_total{message="bad \\"quote\\" \\\\ and\\nnewline"} 1'
+    parse(f"# HELP test_errors_total Errors\n# TYPE test_errors_total counter\n{line}\n")
+
+def test_metrics_token_required_when_set(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
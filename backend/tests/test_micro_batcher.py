@@ -0,0 +1,61 @@
+"""
+Micro-batcher: a batch is flushed when it is full or when the wait since
+its first item is over; duplicates run once and failures reach every caller
+"""
+import time
+import threading
+import pytest
+from micro_batcher import MicroBatcher
+
+def _batcher(**options):
+    batches = []
+
+    def run_batch(items):
+        batches.append(list(items))
+        if "boom" in items:
+            raise RuntimeError("model crashed")
+        return [item.upper() for item in items]
+    return MicroBatcher(run_batch, **options), batches
+
+def test_flushes_when_full():
+    batcher, batches = _batcher(max_batch=4, max_wait=0.2)
+    assert batcher.map(["a", "b", "c", "d", "e"], timeout=2) == ["A", "B", "C", "D", "E"]
+    assert batches == [["a", "b", "c", "d"], ["e"]]
+    assert batcher.get_stats()["max_batch_seen"] == 4
+
+def test_full_batch_is_not_delayed():
+    batcher, batches = _batcher(max_batch=3, max_wait=10)
+    start = time.monotonic()
+    assert batcher.map(["a", "b", "c"], timeout=2) == ["A", "B", "C"]
+    assert time.monotonic() - start < 2
+    assert batches == [["a", "b", "c"]]
+
+def test_flushes_after_max_wait():
+    batcher, batches = _batcher(max_batch=100, max_wait=0.1)
+    start = time.monotonic()
+    assert batcher.map(["a", "b"], timeout=2) == ["A", "B"]
+    elapsed = time.monotonic() - start
+    assert 0.09 <= elapsed < 2
+    assert batches == [["a", "b"]]
+
+def test_concurrent_callers_share_a_batch():
+    batcher, batches = _batcher(max_batch=8, max_wait=0.2)
+    results = {}
+
+    def call(word):
+        results[word] = batcher.submit(word).result(timeout=2)
+    threads = [threading.Thread(target=call, args=(word,)) for word in ("x", "y", "x", "z")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {"x": "X", "y": "Y", "z": "Z"}
+    assert sorted(batches[0]) == ["x", "y", "z"]  # the duplicate "x" ran once
+
+def test_failure_reaches_every_caller():
+    batcher, _ = _batcher(max_batch=2, max_wait=1)
+    futures = [batcher.submit("boom"), batcher.submit("ok")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=2)
+    assert batcher.get_stats()["errors"] == 1
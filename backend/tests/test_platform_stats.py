@@ -0,0 +1,78 @@
+"""
+The counter triggers keep platform_counters and shop_activity equal to a
+fresh recount, so reconcile finds nothing to fix
+"""
+from datetime import datetime, timedelta
+from database import get_db_connection
+from platform_stats import reconcile_counters, get_shop_activity
+from business_logic import record_sale, record_purchase, create_invoice, get_or_create_product
+
+def _execute(sql, params=()):
+    conn = get_db_connection()
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _assert_reconciled():
+    result = reconcile_counters()
+    assert result["mismatches"] == []
+    assert not result["fixed"]
+
+def test_counters_follow_inserts_and_deletes(shop):
+    get_or_create_product(shop, "salt", 20, 25)
+    record_purchase(shop, "rice", 20, 70)
+    record_purchase(shop, "sugar", 10, 100)
+    record_sale(shop, "rice", 2, 80)
+    create_invoice(shop, "Ahmed", [{"name": "sugar", "quantity": 1, "price": 120},
+                                   {"name": "rice", "quantity": 3, "price": 85}])
+    # A sale on an earlier day, as a back-dated entry would be
+    yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+    _execute("""
+        INSERT INTO sales (user_id, product_name, quantity, selling_price, cost_price, date)
+        VALUES (?, 'rice', 1, 90, 70, ?)
+    """, (shop, yesterday))
+    _assert_reconciled()
+
+    activity = get_shop_activity(shop)
+    assert (activity["products"], activity["sales"], activity["purchases"], activity["invoices"]) == (3, 4, 2, 1)
+    assert activity["revenue"] == 2 * 80 + 120 + 3 * 85 + 90
+    assert activity["sales_today"] == 3
+
+    # Row deletes are manual edits; the triggers keep counts and revenue but
+    # not an earlier activity time, so these leave the newest rows in place
+    _execute("DELETE FROM sales WHERE user_id = ? AND date = ?", (shop, yesterday))
+    _execute("DELETE FROM purchases WHERE user_id = ? AND product_name = 'sugar'", (shop,))
+    _execute("DELETE FROM products WHERE user_id = ? AND name = 'salt'", (shop,))
+    _assert_reconciled()
+
+def test_counters_follow_user_changes(make_shop):
+    user_id = make_shop()
+    _assert_reconciled()
+    _execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,))
+    _assert_reconciled()
+    _execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
+    _assert_reconciled()
+    _execute("DELETE FROM users WHERE id = ?", (user_id,))
+    _assert_reconciled()
+
+def test_deleting_a_shop_drops_its_activity(make_shop):
+    user_id = make_shop()
+    record_sale(user_id, "rice", 1, 80)
+    # Rows first, then the user, as data_generator clears a shop
+    for table in ("sales", "purchases", "invoices", "products"):
+        _execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+    _execute("DELETE FROM users WHERE id = ?", (user_id,))
+    _assert_reconciled()
+    assert get_shop_activity(user_id)["stored_rows"] == 0
+
+def test_reconcile_fix_repairs_drift(shop):
+    record_sale(shop, "rice", 1, 80)
+    _execute("UPDATE platform_counters SET value = value + 5 WHERE name = 'sales'")
+    _execute("UPDATE shop_activity SET revenue = 0 WHERE user_id = ?", (shop,))
+
+    result = reconcile_counters(fix=True)
+    assert {m["counter"] for m in result["mismatches"]} == {"sales", f"shop {shop} revenue"}
+    assert result["fixed"]
+    _assert_reconciled()
@@ -0,0 +1,45 @@
+"""
+ShopIndex name resolution: exact names and aliases, unique word matches,
+fuzzy matches for typos, and numbers kept out of fuzzy matching
+"""
+import pytest
+from product_index import ShopIndex
+
+@pytest.fixture
+def index():
+    index = ShopIndex()
+    for product_id, name in enumerate(["cooking oil", "rice", "rice flour", "pepsi 1l", "pepsi 2l", "sugar"], 1):
+        index.add(product_id, name)
+    index.add(2, "chawal", alias=True)
+    return index
+
+def _resolved(match):
+    return match and (match["name"], match["match"])
+
+@pytest.mark.parametrize("query, expected", [
+    ("Cooking  Oil", ("cooking oil", "exact")),
+    ("rice", ("rice", "exact")),
+    ("Chawal", ("rice", "exact")),
+    ("oil", ("cooking oil", "word")),
+    ("flour", ("rice flour", "word")),
+    ("cookin oil", ("cooking oil", "fuzzy")),
+    ("sugarr", ("sugar", "fuzzy")),
+])
+def test_resolve(index, query, expected):
+    assert _resolved(index.resolve(query)) == expected
+
+@pytest.mark.parametrize("query", ["pepsi", "biscuits", "sug", ""])
+def test_no_match(index, query):
+    # "pepsi" names two products; "sug" is too short to match fuzzily
+    assert index.resolve(query) is None
+
+def test_numbers_never_match_fuzzily(index):
+    assert _resolved(index.resolve("pepsi 1l")) == ("pepsi 1l", "exact")
+    assert index.resolve("pepsi 3l") is None
+    assert index.resolve("pepsy 2") is None
+    assert _resolved(index.resolve("pepsy 2l")) == ("pepsi 2l", "fuzzy")
+
+def test_resolve_exact_ignores_approximate_matches(index):
+    assert _resolved(index.resolve_exact("CHAWAL")) == ("rice", "exact")
+    assert index.resolve_exact("oil") is None
+    assert index.resolve_exact("cookin oil") is None
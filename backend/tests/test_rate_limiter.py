@@ -0,0 +1,68 @@
+"""
+Login admission control: token buckets refill at their rate, and the
+password hashing pool refuses work past its queue instead of piling up
+"""
+import asyncio
+import threading
+import pytest
+import auth
+import rate_limiter
+from rate_limiter import RateLimiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+def test_burst_then_refill(clock):
+    limiter = RateLimiter("test", per_minute=6, burst=3)  # one token every 10 s
+    assert [limiter.acquire("1.2.3.4") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("1.2.3.4") == pytest.approx(10)
+    clock[0] += 4
+    assert limiter.acquire("1.2.3.4") == pytest.approx(6)
+    clock[0] += 6
+    assert limiter.acquire("1.2.3.4") == 0
+    assert limiter.acquire("1.2.3.4") == pytest.approx(10)
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = RateLimiter("test", per_minute=60, burst=2)
+    limiter.acquire("a")
+    clock[0] += 3600
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, pytest.approx(1)]
+
+def test_keys_are_independent(clock):
+    limiter = RateLimiter("test", per_minute=1, burst=1)
+    assert limiter.acquire("ali@demo.com") == 0
+    assert limiter.acquire("ali@demo.com") > 0
+    assert limiter.acquire("bilal@demo.com") == 0
+    assert limiter.get_stats() == {"allowed": 2, "limited": 1, "keys": 2, "per_minute": 1.0, "burst": 1}
+
+def test_refilled_buckets_are_pruned(clock):
+    limiter = RateLimiter("test", per_minute=60, burst=1, max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    clock[0] += 5
+    limiter.acquire("c")
+    assert limiter.get_stats()["keys"] == 1
+
+def test_hash_queue_refuses_past_capacity(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(auth, "PASSWORD_HASH_QUEUE", 1)
+    release = threading.Event()
+
+    def slow_hash(password):
+        release.wait(5)
+        return "hashed"
+
+    async def run():
+        first = asyncio.ensure_future(auth._run_hashing(slow_hash, "a"))
+        second = asyncio.ensure_future(auth._run_hashing(slow_hash, "b"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(auth.PasswordHashBusy):
+            await auth._run_hashing(slow_hash, "c")
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == ["hashed", "hashed"]
+    assert auth._hash_pending == 0
@@ -0,0 +1,77 @@
+"""
+SQL profiler: statements grouped by normalized text, slow statements logged
+with their query plan
+"""
+import logging
+import pytest
+import sql_profiler
+from database import get_db_connection
+
+@pytest.fixture
+def profiler(shop, monkeypatch):
+    """Profiling on with a 0 ms threshold, so every statement counts as slow"""
+    sql_profiler.reset()
+    monkeypatch.setattr(sql_profiler, "enabled", True)
+    monkeypatch.setattr(sql_profiler, "slow_threshold", 0.0)
+    yield sql_profiler
+    sql_profiler.reset()
+
+def _run(sql, parameters=()):
+    conn = get_db_connection()
+    try:
+        return conn.cursor().execute(sql, parameters).fetchall()
+    finally:
+        conn.close()
+
+def _stats(statement):
+    [query] = [q for q in sql_profiler.get_top_queries(limit=100)["top"] if q["statement"] == statement]
+    return query
+
+def test_normalize_groups_literals():
+    normalize = sql_profiler.normalize
+    assert normalize("SELECT * FROM sales\n   WHERE id = 5 AND name = 'it''s'") == \
+        "SELECT * FROM sales WHERE id = ? AND name = ?"
+    assert normalize("SELECT * FROM sales WHERE id IN (1, 2, 3)") == \
+        normalize("SELECT * FROM sales WHERE id IN (?,?)") == "SELECT * FROM sales WHERE id IN (?...)"
+    # Digits inside identifiers are not literals
+    assert normalize("SELECT col1 FROM t2 WHERE x = -1.5") == "SELECT col1 FROM t2 WHERE x = ?"
+
+def test_statements_are_aggregated_with_fetch_time(profiler):
+    for product_id in (5, 7):
+        _run(f"SELECT * FROM products WHERE id = {product_id}")
+    query = _stats("SELECT * FROM products WHERE id = ?")
+    assert query["calls"] == 2  # fetchall adds time, not calls
+    assert query["total_ms"] >= query["max_ms"] > 0
+
+def test_slow_query_logged_with_plan(profiler, caplog):
+    with caplog.at_level(logging.WARNING, logger="shopkeeper_ai"):
+        _run("SELECT * FROM sales WHERE product_name = ?", ("rice",))
+    scan = _stats("SELECT * FROM sales WHERE product_name = ?")
+    assert scan["slow_calls"] == 1
+    assert scan["full_scans"] == ["SCAN sales"]
+    assert any("Slow query" in r.message and "SCAN sales" in r.message for r in caplog.records)
+
+    _run("SELECT * FROM users WHERE id = ?", (1,))
+    seek = _stats("SELECT * FROM users WHERE id = ?")
+    assert seek["plan"] and seek["full_scans"] == []
+
+    recent = profiler.get_top_queries()["recent_slow"]
+    assert recent[0]["statement"] == "SELECT * FROM users WHERE id = ?"
+
+def test_plan_captured_once_per_refresh(profiler, monkeypatch):
+    sql = "SELECT * FROM purchases WHERE product_name = ?"
+    assert profiler.needs_plan(sql)
+    _run(sql, ("rice",))
+    assert not profiler.needs_plan(sql)
+    _run(sql, ("sugar",))
+    query = _stats(sql)
+    assert (query["slow_calls"], query["full_scans"]) == (2, ["SCAN purchases"])
+
+    monkeypatch.setattr(sql_profiler, "PLAN_REFRESH_SECONDS", -1)
+    assert profiler.needs_plan(sql)
+    assert not profiler.needs_plan("PRAGMA table_info(sales)")  # nothing to explain
+
+def test_disabled_profiler_records_nothing(profiler, monkeypatch):
+    monkeypatch.setattr(sql_profiler, "enabled", False)
+    _run("SELECT * FROM products WHERE id = ?", (1,))
+    assert profiler.get_top_queries()["statements"] == 0
@@ -0,0 +1,89 @@
+"""
+Stock ledger: movements written with each stock change, reconcile finding
+and fixing drift, periodic snapshots and point-in-time stock
+"""
+import time
+from datetime import datetime
+import stock_ledger
+from database import get_db_connection
+from business_logic import record_purchase, record_sale, get_inventory
+from stock_ledger import adjust_stock, get_movements, get_stock_at, reconcile_stock, take_snapshots
+
+def _product_id(user_id, name):
+    return next(p["id"] for p in get_inventory(user_id) if p["name"] == name)
+
+def _snapshots(product_id):
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT stock, last_movement_id FROM stock_snapshots WHERE product_id = ? ORDER BY id",
+                            (product_id,)).fetchall()
+    finally:
+        conn.close()
+
+def test_changes_are_recorded_as_movements(shop):
+    record_purchase(shop, "rice", 10, 70)
+    record_sale(shop, "rice", 4, 80)
+    record_sale(shop, "rice", 9, 80)  # only 6 left - stock stops at 0
+    rice = _product_id(shop, "rice")
+    adjust_stock(shop, rice, 3, "Found a bag")
+
+    movements = get_movements(shop, rice)
+    assert [(m["reason"], m["change"], m["requested"]) for m in reversed(movements)] == [
+        ("purchase", 10, 10), ("sale", -4, -4), ("sale", -6, -9), ("adjustment", 3, 3)]
+    assert get_stock_at(shop, rice) == 3
+    assert reconcile_stock(shop)["mismatches"] == []
+
+def test_reconcile_finds_and_fixes_drift(shop):
+    record_purchase(shop, "sugar", 20, 90)
+    sugar = _product_id(shop, "sugar")
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE products SET stock = 12 WHERE id = ?", (sugar,))  # a write that skipped the ledger
+        conn.commit()
+    finally:
+        conn.close()
+
+    result = reconcile_stock(shop, batch_size=1)
+    assert [(m["product_id"], m["stock"], m["ledger_stock"]) for m in result["mismatches"]] == [(sugar, 12, 20)]
+    assert not result["fixed"]
+
+    assert reconcile_stock(shop, fix=True)["fixed"]
+    assert [p["stock"] for p in get_inventory(shop)] == [20]
+    assert reconcile_stock(shop)["mismatches"] == []
+
+def test_every_nth_movement_snapshots_the_shop(shop, monkeypatch):
+    monkeypatch.setattr(stock_ledger, "STOCK_SNAPSHOT_INTERVAL", 1)
+    record_purchase(shop, "oil", 5, 300)
+    record_purchase(shop, "oil", 2, 300)
+    oil = _product_id(shop, "oil")
+    assert [stock for stock, _ in _snapshots(oil)] == [5, 7]
+    assert get_stock_at(shop, oil) == 7
+
+def test_stock_at_a_past_time(shop):
+    record_purchase(shop, "flour", 10, 50)
+    flour = _product_id(shop, "flour")
+    take_snapshots(shop, min_movements=1)
+    time.sleep(0.01)
+    before_sales = datetime.now().isoformat()
+    time.sleep(0.01)
+    record_sale(shop, "flour", 3, 60)
+    record_purchase(shop, "flour", 5, 50)
+
+    assert get_stock_at(shop, flour, before_sales) == 10
+    assert get_stock_at(shop, flour) == 12
+    assert [m["reason"] for m in get_movements(shop, flour, at=before_sales)] == ["purchase"]
+
+def test_stock_at_is_scoped_to_the_shop(shop):
+    record_purchase(shop, "salt", 4, 20)
+    assert get_stock_at(shop + 1000, _product_id(shop, "salt")) is None
+
+def test_movements_endpoint_at(client, shop):
+    record_purchase(shop, "tea", 8, 400)
+    tea = _product_id(shop, "tea")
+    at = datetime.now().isoformat()
+    record_sale(shop, "tea", 2, 450)
+
+    body = client.get(f"/inventory/{tea}/movements", params={"at": at}).json()
+    assert (body["stock"], body["count"]) == (8, 1)
+    assert client.get(f"/inventory/{tea}/movements").json()["count"] == 2
+    assert client.get("/inventory/999999/movements", params={"at": at}).status_code == 404
@@ -0,0 +1,40 @@
+"""
+Request traces: a streamed response keeps its root span open until the
+body is sent, so the stages it runs are exported with the trace
+"""
+import json
+import pytest
+import tracing
+
+@pytest.fixture
+def traces(tmp_path, monkeypatch):
+    """Trace every request into a scratch file; returns a reader for the exported spans"""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACING", True)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+
+    def read():
+        tracing.flush()
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    return read
+
+def _trace_of(spans, root_name):
+    [root] = [s for s in spans if s["parent_id"] is None and s["name"] == root_name]
+    return root, [s for s in spans if s["trace_id"] == root["trace_id"]]
+
+def test_streamed_request_exports_its_stages(client, traces):
+    response = client.post("/chat/stream", json={"message": "sold 5 rice at 80"})
+    assert "event: done" in response.text
+    root, spans = _trace_of(traces(), "POST /chat/stream")
+    names = {s["name"] for s in spans}
+    assert {"parse_intents", "execute_intents", "record_sale"} <= names
+    assert all(s["start_ns"] >= root["start_ns"] for s in spans)
+    assert root["attributes"]["http.status"] == 200
+
+def test_plain_request_exports_one_trace(client, traces):
+    client.post("/chat", json={"message": "sold 2 sugar at 90"})
+    root, spans = _trace_of(traces(), "POST /chat")
+    assert "record_sale" in {s["name"] for s in spans}
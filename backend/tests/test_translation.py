@@ -0,0 +1,71 @@
+"""
+Bill translation: segmenting, masking values as placeholders and putting
+them back, and rejecting model output that lost a placeholder
+"""
+import pytest
+import translation
+import translation_cache
+from database import init_database
+from translation import mask_segment, segment_text, _unmask, _keeps_placeholders
+
+@pytest.mark.parametrize("segment, template", [
+    ("Sold 5 rice at Rs.320/-", "Sold {0} rice at {1}"),
+    ("Invoice INV-3-20261019-001 on 2026-10-19 14:05", "Invoice {0} on {1}"),
+    ("Total PKR 1,500.50 due 19/10/2026", "Total {0} due {1}"),
+    ("Thank you", "Thank you"),
+])
+def test_mask_unmask_round_trip(segment, template):
+    masked, values = mask_segment(segment)
+    assert masked == template
+    assert _unmask(masked, values) == segment
+
+def test_unmask_in_translated_order():
+    masked, values = mask_segment("Sold 5 rice at 80")
+    assert _unmask("{1} میں {0} چاول", values) == "80 میں 5 چاول"
+    assert _unmask("{0} {7}", values) == "5 {7}"  # an unknown placeholder is left alone
+
+@pytest.mark.parametrize("translated, kept", [
+    ("{1} میں {0} چاول", True),
+    ("{0} چاول", False),
+    ("{0} {0} {1}", False),
+    ("{0} {1} {2}", False),
+])
+def test_keeps_placeholders(translated, kept):
+    assert _keeps_placeholders("Sold {0} rice at {1}", translated) is kept
+
+def test_segments_join_back():
+    text = "Invoice #: INV-1\nCustomer: Ali, Bilal  |  Total - Rs.500"
+    pieces = segment_text(text)
+    assert "".join(piece for _, piece in pieces) == text
+    assert [piece for is_separator, piece in pieces if not is_separator] == [
+        "Invoice #", "INV-1", "Customer", "Ali", "Bilal", "Total", "Rs.500"]
+
+@pytest.fixture
+def models(monkeypatch):
+    """Fake Groq and Helsinki backends recording what they were asked"""
+    init_database()
+    translation_cache.clear()
+    calls = {"groq": [], "helsinki": []}
+
+    def groq(texts):
+        calls["groq"].append(list(texts))
+        # Groq drops the placeholder of one template, which must not be used
+        return {t: ("ترجمہ" if "{1}" in t else f"اردو {t}") for t in texts}
+
+    def helsinki(texts):
+        calls["helsinki"].append(list(texts))
+        return {t: f"ہیلسنکی {t}" for t in texts}
+
+    monkeypatch.setattr(translation, "translate_batch_with_groq", groq)
+    monkeypatch.setattr(translation, "translate_batch_with_helsinki", helsinki)
+    yield calls
+    translation_cache.clear()
+
+def test_translate_falls_back_per_segment_and_reuses_templates(models):
+    assert translation.translate_to_urdu("Sold 5 rice at 80\nThank you") == \
+        "ہیلسنکی Sold 5 rice at 80\nاردو Thank you"
+    assert models == {"groq": [["Sold {0} rice at {1}", "Thank you"]], "helsinki": [["Sold {0} rice at {1}"]]}
+
+    # New numbers, same templates: answered from the cache
+    assert translation.translate_to_urdu("Sold 12 rice at 85") == "ہیلسنکی Sold 12 rice at 85"
+    assert len(models["groq"]) == 1 and len(models["helsinki"]) == 1
@@ -0,0 +1,60 @@
+"""
+Translation cache: the in-process LRU, the shared SQLite tier behind it,
+model preference order and eviction in both tiers
+"""
+import pytest
+import translation_cache
+from database import init_database
+
+@pytest.fixture(autouse=True)
+def cache():
+    init_database()
+    translation_cache.clear()
+    yield translation_cache
+    translation_cache.clear()
+
+def _forget_memory():
+    """What another worker, or this one after a restart, sees"""
+    with translation_cache._lock:
+        translation_cache._cache.clear()
+
+def test_memory_then_database_hit():
+    translation_cache.store("Total  amount", "groq", "کل رقم")
+    stats = translation_cache.get_cache_stats()
+    assert translation_cache.lookup("Total amount", ["groq"]) == "کل رقم"  # whitespace is normalized
+    assert translation_cache.get_cache_stats()["memory_hits"] == stats["memory_hits"] + 1
+
+    _forget_memory()
+    assert translation_cache.lookup("Total amount", ["groq"]) == "کل رقم"
+    after = translation_cache.get_cache_stats()
+    assert after["db_hits"] == stats["db_hits"] + 1
+    assert after["size"] == 1  # promoted back into memory
+
+def test_models_are_tried_in_order():
+    translation_cache.store_many({"rice": "چاول (helsinki)", "sugar": "چینی"}, "helsinki")
+    translation_cache.store("rice", "groq", "چاول")
+    _forget_memory()
+    assert translation_cache.lookup_many(["rice", "sugar", "oil"], ["groq", "helsinki"]) == {
+        "rice": "چاول", "sugar": "چینی"}
+    assert translation_cache.lookup("sugar", ["groq"]) is None
+
+def test_memory_tier_is_lru(monkeypatch):
+    monkeypatch.setattr(translation_cache, "TRANSLATION_CACHE_SIZE", 2)
+    translation_cache.store("one", "groq", "1")
+    translation_cache.store("two", "groq", "2")
+    translation_cache.lookup("one", ["groq"])
+    translation_cache.store("three", "groq", "3")
+    with translation_cache._lock:
+        held = set(translation_cache._cache.values())
+    assert held == {"1", "3"}
+
+def test_database_tier_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(translation_cache, "TRANSLATION_CACHE_DB_ROWS", 3)
+    monkeypatch.setattr(translation_cache, "EVICTION_CHECK_INTERVAL", 1)
+    for word in ("a", "b", "c"):
+        translation_cache.store(word, "groq", word.upper())
+    _forget_memory()
+    translation_cache.lookup("a", ["groq"])  # "b" is now the least recently used
+    translation_cache.store("d", "groq", "D")
+    _forget_memory()
+    assert translation_cache.lookup_many(["a", "b", "c", "d"], ["groq"]) == {"a": "A", "c": "C", "d": "D"}
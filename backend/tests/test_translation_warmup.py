@@ -0,0 +1,52 @@
+"""
+Model warm-up: requests fall back instead of waiting while the local model
+loads, /health reports readiness, and a failed load is retried with backoff
+"""
+import time
+import pytest
+import translation
+from inference_service import InferencePool, UNAVAILABLE
+
+def _pool(loader, health_interval=3600):
+    return InferencePool(model="fake", loader=loader, processes=1, max_wait=0.01, timeout=30,
+                         health_interval=health_interval)
+
+class SlowLoadingPool(InferencePool):
+    def __init__(self):
+        super().__init__(model="fake", loader="fake_models:load_slow", processes=1, max_wait=0.01, timeout=30)
+
+@pytest.fixture
+def local_model(monkeypatch):
+    monkeypatch.setattr(translation, "TRANSLATION_SERVICE_URL", "")
+    monkeypatch.setattr(translation, "InferencePool", SlowLoadingPool)
+    translation.shutdown_translator()
+    yield
+    translation.shutdown_translator()
+
+def test_requests_fall_back_until_the_model_is_ready(local_model, client):
+    start = time.monotonic()
+    translation.warm_up_translator()
+    assert not translation.translator_ready()
+    assert translation.translate_batch_with_helsinki(["rice"]) == {}  # no waiting on the load
+    assert time.monotonic() - start < 1
+    assert client.get("/health").json()["translation_model"]["ready"] is False
+
+    deadline = time.monotonic() + 60
+    while not translation.translator_ready() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert translation.translate_batch_with_helsinki(["rice"]) == {"rice": "RICE"}
+    assert client.get("/health").json()["translation_model"] == {"status": "ready", "ready": True}
+    assert translation.get_translator_stats()["load_seconds"] >= 1
+
+def test_failed_load_is_retried_with_backoff():
+    pool = _pool("fake_models:load_broken", health_interval=0.5)
+    try:
+        delays = []
+        for _ in range(3):
+            assert pool.check() == UNAVAILABLE
+            delays.append(round(pool._next_retry - time.monotonic(), 1))
+            pool._restart("retrying model load")
+        assert delays == [0.5, 1.0, 2.0]
+        assert pool.health()["restarts"] == 3
+    finally:
+        pool.shutdown()
@@ -0,0 +1,375 @@
+"""
+Request tracing - spans for the stages of a request, exported as JSON lines or OTLP
+
+Every request gets an ID, taken from an X-Request-ID header or generated,
+and returned in the response. With TRACING=True the request also opens a
+root span. Spans opened while handling it become its children:
+
+    with tracing.span("translate.groq", segments=12):
+        ...
+
+    @tracing.traced("parse_intents")
+    def parse_intents(...):
+
+The current span is held in a context variable, so it follows the request
+into run_in_threadpool and across awaits. Without an active trace, span()
+and traced functions cost one context variable read. Statements run on a
+TimedConnection add their count and time to the current span, which shows
+how much of a stage was spent in SQLite.
+
+The middleware holds the root span open until the response body has been
+sent, so stages run by a StreamingResponse (/chat/stream) are part of it.
+
+A finished trace is exported when any of these holds:
+- it was sampled at the start (TRACE_SAMPLE_RATE);
+- it ran longer than TRACE_SLOW_MS;
+- one of its spans failed.
+Slow requests are therefore always kept at any sample rate. A background
+thread writes the spans to TRACE_FILE, one JSON object per line, or POSTs
+them as OTLP/HTTP JSON to TRACE_OTLP_URL.
+
+Run: python tracing.py summarize [logs/traces.jsonl] [--slowest 5]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import inspect
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from config import TRACING, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_URL
+from metrics import register_collector
+from logger_config import logger, request_id as _request_id
+
+EXPORT_QUEUE_SIZE = 2000  # finished traces waiting for the exporter; more are dropped
+EXPORT_BATCH = 100
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+_queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+_exporter = None
+_exporter_lock = threading.Lock()
+_stats = {"traces": 0, "exported": 0, "dropped": 0, "export_errors": 0}
+
+class _Trace:
+    __slots__ = ("trace_id", "request_id", "sampled", "spans", "failed", "held")
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.trace_id = os.urandom(16).hex()
+        self.request_id = request_id
+        self.sampled = sampled
+        self.spans = []
+        self.failed = False
+        self.held = False
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: str, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.trace.request_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error
+        }
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+def current_request_id():
+    return _request_id.get()
+
+def set_attribute(key: str, value):
+    """Tag the current span, if there is one"""
+    current = _current.get()
+    if current is not None:
+        current.attributes[key] = value
+
+def record_db(seconds: float):
+    """Add one statement's time to the current span (called by TimedCursor)"""
+    current = _current.get()
+    if current is not None:
+        attributes = current.attributes
+        attributes["db.statements"] = attributes.get("db.statements", 0) + 1
+        attributes["db.ms"] = round(attributes.get("db.ms", 0.0) + seconds * 1000, 3)
+
+@contextmanager
+def _open(trace: _Trace, name: str, parent_id, attributes: dict):
+    span = Span(trace, name, parent_id, attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        trace.failed = True
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current.reset(token)
+        trace.spans.append(span)
+
+@contextmanager
+def request_trace(name: str, request_id: str = None, **attributes):
+    """Bind a request ID for the duration of a request and, with TRACING on, open its root span.
+
+    The root span ends with the block unless hold() was called on it; then
+    end_request() ends it, e.g. once a streamed response body has been sent.
+    """
+    request_id = request_id or new_request_id()
+    id_token = _request_id.set(request_id)
+    try:
+        if not TRACING:
+            yield None
+            return
+        trace = _Trace(request_id, random.random() < TRACE_SAMPLE_RATE)
+        root = Span(trace, name, None, attributes)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            trace.held = False
+            root.error = f"{type(e).__name__}: {e}"
+            trace.failed = True
+            raise
+        finally:
+            _current.reset(token)
+            if not trace.held:
+                end_request(root)
+    finally:
+        _request_id.reset(id_token)
+
+def hold(root: Span):
+    """Keep a root span open after its request_trace() block; end_request() ends it"""
+    if root is not None:
+        root.trace.held = True
+
+def end_request(root: Span, error: BaseException = None):
+    """End a root span and hand its trace to the exporter; later calls do nothing"""
+    if root is None or root.end_ns is not None:
+        return
+    if error is not None:
+        root.error = f"{type(error).__name__}: {error}"
+        root.trace.failed = True
+    root.end_ns = time.time_ns()
+    root.trace.spans.append(root)
+    _finish(root.trace)
+
+async def end_after(root: Span, body):
+    """Pass a response body through and end the held root span once it is sent,
+    so spans opened while a StreamingResponse runs belong to the exported trace"""
+    error = None
+    try:
+        async for chunk in body:
+            yield chunk
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        end_request(root, None if isinstance(error, GeneratorExit) else error)
+
+@contextmanager
+def span(name: str, **attributes):
+    """A child span of the current one; does nothing outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with _open(parent.trace, name, parent.span_id, attributes) as child:
+        yield child
+
+def traced(name: str = None):
+    """Decorator: run the function (sync or async) in a span named after it"""
+    def decorate(function):
+        span_name = name or function.__qualname__
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await function(*args, **kwargs)
+                with span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _finish(trace: _Trace):
+    """Export the trace if it was sampled, slow or failed"""
+    _stats["traces"] += 1
+    root = trace.spans[-1] if trace.spans else None
+    slow = root is not None and (root.end_ns - root.start_ns) / 1e6 >= TRACE_SLOW_MS
+    if not (trace.sampled or slow or trace.failed):
+        return
+    if root is not None:
+        root.attributes["sampled_by"] = "rate" if trace.sampled else "slow" if slow else "error"
+    _ensure_exporter()
+    try:
+        _queue.put_nowait(trace)
+    except queue.Full:
+        _stats["dropped"] += 1
+
+def _ensure_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+                _exporter.start()
+
+def _export_loop():
+    export = _export_otlp if TRACE_EXPORTER == "otlp" else _export_jsonl
+    while True:
+        traces = [_queue.get()]
+        while len(traces) < EXPORT_BATCH:
+            try:
+                traces.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            export(traces)
+            _stats["exported"] += len(traces)
+        except Exception as e:
+            _stats["export_errors"] += 1
+            logger.warning("Trace export failed (%s traces): %s", len(traces), e)
+        for _ in traces:
+            _queue.task_done()
+
+def _export_jsonl(traces: list):
+    directory = os.path.dirname(TRACE_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        for trace in traces:
+            for span in trace.spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _export_otlp(traces: list):
+    """POST the spans to an OTLP/HTTP collector in its JSON encoding"""
+    import httpx
+    spans = []
+    for trace in traces:
+        for span in trace.spans:
+            attributes = dict(span.attributes, request_id=trace.request_id)
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 2 if span.parent_id is None else 1,  # SERVER for the request, INTERNAL below it
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+            })
+    body = {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "shopkeeper-ai"}}]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}]
+    }]}
+    httpx.post(TRACE_OTLP_URL, json=body, timeout=5.0).raise_for_status()
+
+def get_trace_stats() -> dict:
+    return dict(_stats, enabled=TRACING, sample_rate=TRACE_SAMPLE_RATE, slow_ms=TRACE_SLOW_MS,
+                exporter=TRACE_EXPORTER, queued=_queue.qsize())
+
+def _collect_metrics() -> list:
+    return [
+        ("traces_total", "counter", "Finished traces by what happened to them",
+         [({"result": result}, _stats[result]) for result in ("exported", "dropped", "export_errors")]),
+    ]
+
+register_collector(_collect_metrics)
+
+def flush(timeout: float = 5.0):
+    """Wait until queued traces are exported (used on shutdown and by tests)"""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def summarize(path: str, slowest: int = 5):
+    """Per-stage latency percentiles and the breakdown of the slowest requests"""
+    traces, by_name = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            traces.setdefault(record["trace_id"], []).append(record)
+            by_name.setdefault(record["name"], []).append(record["duration_ms"])
+
+    print(f"[*] {len(traces)} traces from {path}")
+    print(f"    {'span':40s} {'count':>6s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for name, durations in sorted(by_name.items(), key=lambda item: -percentile(item[1], 0.99)):
+        print(f"    {name[:40]:40s} {len(durations):6d} {percentile(durations, 0.5):7.1f}ms "
+              f"{percentile(durations, 0.95):7.1f}ms {percentile(durations, 0.99):7.1f}ms")
+
+    roots = sorted((s for spans in traces.values() for s in spans if s["parent_id"] is None),
+                   key=lambda s: -s["duration_ms"])
+    for root in roots[:slowest]:
+        print(f"\n    {root['name']} {root['duration_ms']:.1f} ms  request {root['request_id']}")
+        children = {}
+        for s in traces[root["trace_id"]]:
+            children.setdefault(s["parent_id"], []).append(s)
+
+        def show(parent_id, depth):
+            for s in sorted(children.get(parent_id, []), key=lambda s: s["start_ns"]):
+                db = f"  db {s['attributes']['db.ms']:.1f} ms" if "db.ms" in s["attributes"] else ""
+                error = f"  !! {s['error']}" if s["error"] else ""
+                print(f"    {'  ' * depth}{s['name']:{max(1, 40 - 2 * depth)}s} {s['duration_ms']:8.1f} ms{db}{error}")
+                show(s["span_id"], depth + 1)
+        show(root["span_id"], 1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trace file tools")
+    parser.add_argument("command", choices=["summarize"])
+    parser.add_argument("path", nargs="?", default=TRACE_FILE)
+    parser.add_argument("--slowest", type=int, default=5, help="Slowest requests to break down")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"[!] No trace file at {args.path}")
+        return 1
+    summarize(args.path, args.slowest)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,94 +1,219 @@
 """
 Translation module - English to Urdu using Groq API or Helsinki-NLP model
+
+Bill text is translated segment by segment. Lines are split into phrases,
+numbers, amounts and dates are masked as placeholders ("Sold {0} rice at
+{1}"), and only templates not already in the translation cache go to a
+model, in one batch. A changed quantity or date therefore reuses the
+cached template instead of starting a new translation.
 """
+import re
+import threading
 from logger_config import logger
-from config import GROQ_API_KEY
+from circuit_breaker import CircuitOpenError
+from llm_client import chat_completion
+from metrics import TRANSLATION_LATENCY, BATCH_SIZE
+import tracing
+from config import LLM_TRANSLATION_BUDGET, GROQ_MODEL, TRANSLATION_SERVICE_URL
+from inference_service import InferencePool, ServiceClient, HELSINKI_MODEL
+import translation_cache
+
+GROQ_CACHE_MODEL = f"groq/{GROQ_MODEL}"
+GROQ_BATCH_SIZE = 40  # segments per Groq request, to stay within max_tokens
+
+# Line breaks and phrase boundaries: column gaps, pipes, tabs, ": ", ", ", " - "
+SEGMENT_SEPARATOR = re.compile(r'(\s*\n\s*|\s*[|\t]\s*| {2,}|:\s+|,\s+|\s+-\s+)')
+
+# Values kept verbatim in the output, most specific first
+MASK_PATTERN = re.compile(r"""
+    \d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?        # 2026-10-19, 2026-10-19 14:05
+  | \d{1,2}[/.]\d{1,2}[/.]\d{2,4}                          # 19/10/2026
+  | \d{1,2}:\d{2}(?:\s?[ap]m)?                             # 14:05, 2:05 pm
+  | (?:rs\.?|pkr|₹|\$)\s*\d[\d,]*(?:\.\d+)?(?:\s*/-)?      # Rs.320/-, PKR 1,500
+  | \b[a-z]+-\d[\w-]*                                      # INV-20261019
+  | \d[\d,]*(?:\.\d+)?(?:\s*/-)?                           # 5, 1,500.50, 80/-
+""", re.IGNORECASE | re.VERBOSE)
 
-# Global translator instance
-_translator = None
-_model_loaded = False
-_groq_client = None
+PLACEHOLDER_PATTERN = re.compile(r'\{(\d+)\}')
+NUMBERED_LINE_PATTERN = re.compile(r'^\s*(\d+)[.)]\s*(.*)$')
 
-def get_groq_client():
-    """Get or create Groq client"""
-    global _groq_client
-    if _groq_client is None and GROQ_API_KEY:
+UNAVAILABLE_NOTE = "[ترجمہ دستیاب نہیں]"
+
+# Local model backend: a shared inference service or this process's own worker pool
+_backend = None
+_backend_lock = threading.Lock()
+
+def translate_batch_with_groq(texts: list) -> dict:
+    """Translate several segments in one Groq request per GROQ_BATCH_SIZE; returns {text: urdu}"""
+    translated = {}
+    for start in range(0, len(texts), GROQ_BATCH_SIZE):
+        batch = texts[start:start + GROQ_BATCH_SIZE]
+        BATCH_SIZE.observe(len(batch), "groq_translation")
         try:
-            from groq import Groq
-            _groq_client = Groq(api_key=GROQ_API_KEY)
-            logger.info("Groq client initialized for translation")
+            reply = chat_completion(
+                [
+                    {
+                        "role": "system",
+                        "content": "You are a translator. Translate each numbered line of English text to Urdu. Reply with the same numbered lines, one per line, in proper Urdu script and nothing else. Keep placeholders like {0} exactly as they are."
+                    },
+                    {
+                        "role": "user",
+                        "content": "\n".join(f"{i}. {text}" for i, text in enumerate(batch, 1))
+                    }
+                ],
+                temperature=0.3,
+                max_tokens=2048,
+                budget=LLM_TRANSLATION_BUDGET
+            )
+        except CircuitOpenError as e:
+            logger.debug(str(e))
+            break
         except Exception as e:
-            logger.error(f"Failed to initialize Groq client: {e}")
-    return _groq_client
-
-def translate_with_groq(text: str) -> str:
-    """Translate using Groq API"""
-    client = get_groq_client()
-    if not client:
-        return None
-    
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a translator. Translate the following English text to Urdu. Only provide the Urdu translation, nothing else. Use proper Urdu script."
-                },
-                {
-                    "role": "user",
-                    "content": text
-                }
-            ],
-            temperature=0.3,
-            max_tokens=1024
-        )
-        translated = response.choices[0].message.content.strip()
-        logger.info(f"Groq translated: {text[:30]}... -> {translated[:30]}...")
-        return translated
-    except Exception as e:
-        logger.error(f"Groq translation error: {e}")
-        return None
-
-def load_translator():
-    """Load the Helsinki-NLP translation model lazily"""
-    global _translator, _model_loaded
-    
-    if _model_loaded:
-        return _translator
-    
+            logger.error("Groq batch translation error: %s", e)
+            break
+        if reply is None:
+            break
+
+        lines = {}
+        for line in reply.splitlines():
+            match = NUMBERED_LINE_PATTERN.match(line)
+            if match and match.group(2).strip():
+                lines[int(match.group(1))] = match.group(2).strip()
+        for i, text in enumerate(batch, 1):
+            if i in lines:
+                translated[text] = lines[i]
+        logger.info("Groq translated %d/%d segments in one request", len(lines), len(batch))
+    return translated
+
+def get_inference_backend():
+    """The local model backend, started on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if TRANSLATION_SERVICE_URL:
+                    _backend = ServiceClient(TRANSLATION_SERVICE_URL)
+                else:
+                    _backend = InferencePool()
+                    _backend.start()
+    return _backend
+
+def warm_up_translator():
+    """Start loading the local model in the background so the first request does not pay for it"""
+    backend = get_inference_backend()
+    logger.info("Translation model warm-up started (%s)", HELSINKI_MODEL)
+    return backend
+
+def translator_ready() -> bool:
+    """Whether the local model is loaded and answering"""
+    return _backend is not None and _backend.ready
+
+def translate_batch_with_helsinki(texts: list) -> dict:
+    """Translate segments with the Helsinki-NLP model in its worker processes; returns {text: urdu}"""
+    if not texts:
+        return {}
     try:
-        from transformers import pipeline
-        logger.info("Loading Helsinki-NLP translation model...")
-        _translator = pipeline("translation", model="Helsinki-NLP/opus-mt-en-ur")
-        _model_loaded = True
-        logger.info("Translation model loaded successfully")
-        return _translator
+        translated = get_inference_backend().translate(texts)
     except Exception as e:
-        logger.error(f"Failed to load translation model: {e}")
-        _model_loaded = True  # Don't retry
-        return None
+        logger.warning("Local translation model unavailable: %s", e)
+        return {}
+    logger.info("Helsinki translated %d segments", len(texts))
+    return dict(zip(texts, translated))
+
+def get_translator_stats() -> dict:
+    """Health and batching counters of the local translation model"""
+    if _backend is None:
+        return {"status": "not started", "model": HELSINKI_MODEL}
+    return _backend.health()
+
+def shutdown_translator():
+    """Stop this process's inference workers (called on application shutdown)"""
+    global _backend
+    backend, _backend = _backend, None
+    if isinstance(backend, InferencePool):
+        backend.shutdown()
 
+def segment_text(text: str) -> list:
+    """Split bill text into (is_separator, piece) pairs that join back to the original"""
+    pieces = SEGMENT_SEPARATOR.split(text)
+    # re.split with a capture group alternates text and separators
+    return [(index % 2 == 1, piece) for index, piece in enumerate(pieces) if piece]
+
+def mask_segment(segment: str):
+    """Replace numbers, amounts, codes and dates with {0}, {1}, ...; returns (template, values)"""
+    values = []
+
+    def placeholder(match):
+        values.append(match.group())
+        return "{" + str(len(values) - 1) + "}"
+
+    return MASK_PATTERN.sub(placeholder, segment), values
+
+def _needs_translation(template: str) -> bool:
+    """Whether anything but placeholders and punctuation is left to translate"""
+    return any(c.isalpha() for c in PLACEHOLDER_PATTERN.sub("", template))
+
+def _keeps_placeholders(template: str, translated: str) -> bool:
+    return sorted(PLACEHOLDER_PATTERN.findall(template)) == sorted(PLACEHOLDER_PATTERN.findall(translated))
+
+def _unmask(translated: str, values: list) -> str:
+    return PLACEHOLDER_PATTERN.sub(
+        lambda m: values[int(m.group(1))] if int(m.group(1)) < len(values) else m.group(), translated
+    )
+
+def translate_segments(templates: list) -> dict:
+    """Translate unique templates: cache first, then the misses in one batch per model"""
+    with TRANSLATION_LATENCY.time("cache"), tracing.span("translate.cache", segments=len(templates)):
+        found = translation_cache.lookup_many(templates, [GROQ_CACHE_MODEL, HELSINKI_MODEL])
+    misses = [t for t in templates if t not in found]
+    if not misses:
+        return found
+
+    # Try Groq API first (faster and more reliable), then Helsinki-NLP for what is left
+    for stage, model, translate_batch in (("groq", GROQ_CACHE_MODEL, translate_batch_with_groq),
+                                          ("helsinki", HELSINKI_MODEL, translate_batch_with_helsinki)):
+        with TRANSLATION_LATENCY.time(stage), tracing.span(f"translate.{stage}", segments=len(misses)):
+            translated = {t: u for t, u in translate_batch(misses).items() if _keeps_placeholders(t, u)}
+        translation_cache.store_many(translated, model)
+        found.update(translated)
+        misses = [t for t in misses if t not in translated]
+        if not misses:
+            break
+    return found
+
+@tracing.traced("translate_to_urdu")
 def translate_to_urdu(text: str) -> str:
     """Translate English text to Urdu - uses Groq API first, then Helsinki-NLP as fallback"""
+    with TRANSLATION_LATENCY.time("total"):
+        return _translate_to_urdu(text)
+
+def _translate_to_urdu(text: str) -> str:
     try:
-        # Try Groq API first (faster and more reliable)
-        groq_result = translate_with_groq(text)
-        if groq_result:
-            return groq_result
-        
-        # Fallback to Helsinki-NLP model
-        translator = load_translator()
-        
-        if translator is None:
-            # Last fallback: return original text with note
-            return f"[ترجمہ دستیاب نہیں] {text}"
-        
-        result = translator(text, max_length=512)
-        translated = result[0]["translation_text"]
-        logger.info(f"Helsinki translated: {text[:30]}... -> {translated[:30]}...")
-        return translated
-        
+        pieces = []  # (text, values) to emit; values is None for verbatim text
+        for is_separator, piece in segment_text(text):
+            template, values = mask_segment(piece)
+            if is_separator or not _needs_translation(template):
+                pieces.append((piece, None))
+            else:
+                pieces.append((template, values))
+
+        templates = list(dict.fromkeys(t for t, values in pieces if values is not None))
+        if not templates:
+            return text
+
+        translated = translate_segments(templates)
+        missing = [t for t in templates if t not in translated]
+        if missing:
+            if len(missing) == len(templates):
+                # Last fallback: return original text with note
+                return f"{UNAVAILABLE_NOTE} {text}"
+            logger.warning("%s of %s segments left untranslated", len(missing), len(templates))
+
+        return "".join(
+            piece if values is None else _unmask(translated.get(piece, piece), values)
+            for piece, values in pieces
+        )
+
     except Exception as e:
-        logger.error(f"Translation error: {e}")
+        logger.error("Translation error: %s", e)
         return f"[ترجمہ میں خرابی] {text}"
@@ -0,0 +1,182 @@
+"""
+Translation cache - two tiers so repeated text never reaches a model twice
+
+Invoices repeat the same product names, headings and phrases, so
+translations are cached by a hash of the model and the normalized text.
+The first tier is an in-process LRU; the second is a SQLite table shared by
+all workers and kept across restarts. A hit in the second tier is promoted
+into the first. Both tiers are bounded: the LRU by entry count, the table by
+row count, evicting the least recently used rows.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from config import TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_DB_ROWS
+from database import get_db_connection
+from metrics import register_collector
+from logger_config import logger
+
+# Check the table size every this many stores rather than on each one
+EVICTION_CHECK_INTERVAL = 100
+
+_cache = OrderedDict()  # key -> translated text
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0,
+          "memory_evictions": 0, "db_evictions": 0}
+_stores_since_check = 0
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so re-flowed text shares a cache entry"""
+    return " ".join(text.split())
+
+def make_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize(text)}".encode("utf-8")).hexdigest()
+
+def _remember(key: str, translated: str):
+    """Insert into the in-process tier under the lock, evicting past capacity"""
+    _cache[key] = translated
+    _cache.move_to_end(key)
+    while len(_cache) > TRANSLATION_CACHE_SIZE:
+        _cache.popitem(last=False)
+        _stats["memory_evictions"] += 1
+
+def lookup(text: str, models: list) -> Optional[str]:
+    """Return a cached translation of `text` by the first of `models` that has one"""
+    return lookup_many([text], models).get(text)
+
+def lookup_many(texts: list, models: list) -> dict:
+    """Cached translations for several texts with one database round trip; misses are left out"""
+    found, pending = {}, {}  # pending: text -> keys in model preference order
+    with _lock:
+        for text in texts:
+            keys = [make_key(text, model) for model in models]
+            key = next((k for k in keys if k in _cache), None)
+            if key is not None:
+                _cache.move_to_end(key)
+                _stats["memory_hits"] += 1
+                found[text] = _cache[key]
+            else:
+                pending[text] = keys
+    if not pending:
+        return found
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        all_keys = [key for keys in pending.values() for key in keys]
+        rows = {}
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(all_keys), 500):
+            chunk = all_keys[start:start + 500]
+            cursor = conn.execute(
+                f"SELECT key, translated FROM translation_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            rows.update(cursor.fetchall())
+        used = []
+        with _lock:
+            for text, keys in pending.items():
+                key = next((k for k in keys if k in rows), None)
+                if key is None:
+                    _stats["misses"] += 1
+                    continue
+                _remember(key, rows[key])
+                _stats["db_hits"] += 1
+                found[text] = rows[key]
+                used.append(key)
+        if used:
+            now = datetime.now().isoformat()
+            conn.executemany("UPDATE translation_cache SET last_used_at = ? WHERE key = ?", [(now, k) for k in used])
+            conn.commit()
+    except Exception as e:
+        logger.warning("Translation cache lookup error: %s", e)
+        with _lock:
+            _stats["misses"] += len(pending) - sum(1 for text in pending if text in found)
+    finally:
+        if conn:
+            conn.close()
+    return found
+
+def store(text: str, model: str, translated: str):
+    """Cache a model's translation in both tiers"""
+    store_many({text: translated}, model)
+
+def store_many(translations: dict, model: str):
+    """Cache several translations ({text: translated}) by one model in both tiers"""
+    global _stores_since_check
+    if not translations:
+        return
+    rows = [(make_key(text, model), translated) for text, translated in translations.items()]
+    with _lock:
+        for key, translated in rows:
+            _remember(key, translated)
+        _stats["stores"] += len(rows)
+        _stores_since_check += len(rows)
+        check_size = _stores_since_check >= EVICTION_CHECK_INTERVAL
+        if check_size:
+            _stores_since_check = 0
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        now = datetime.now().isoformat()
+        conn.executemany("""
+            INSERT OR REPLACE INTO translation_cache (key, model, translated, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(key, model, translated, now, now) for key, translated in rows])
+        if check_size:
+            _evict(conn)
+        conn.commit()
+    except Exception as e:
+        logger.warning("Translation cache store error: %s", e)
+    finally:
+        if conn:
+            conn.close()
+
+def _evict(conn):
+    """Trim the table to TRANSLATION_CACHE_DB_ROWS, least recently used first"""
+    excess = conn.execute("SELECT COUNT(*) FROM translation_cache").fetchone()[0] - TRANSLATION_CACHE_DB_ROWS
+    if excess > 0:
+        conn.execute("""
+            DELETE FROM translation_cache WHERE key IN (
+                SELECT key FROM translation_cache ORDER BY last_used_at LIMIT ?
+            )
+        """, (excess,))
+        with _lock:
+            _stats["db_evictions"] += excess
+        logger.info("Translation cache evicted %s rows", excess)
+
+def clear():
+    """Empty both tiers"""
+    with _lock:
+        _cache.clear()
+    conn = None
+    try:
+        conn = get_db_connection()
+        conn.execute("DELETE FROM translation_cache")
+        conn.commit()
+    finally:
+        if conn:
+            conn.close()
+
+def get_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, size=len(_cache), capacity=TRANSLATION_CACHE_SIZE,
+                     db_capacity=TRANSLATION_CACHE_DB_ROWS)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+    return stats
+
+def _collect_metrics() -> list:
+    stats = get_cache_stats()
+    return [
+        ("translation_cache_lookups_total", "counter", "Translation cache lookups by result",
+         [({"result": result}, stats[result]) for result in ("memory_hits", "db_hits", "misses")]),
+        ("translation_cache_hit_ratio", "gauge", "Share of lookups answered from memory or SQLite",
+         [({}, stats["hit_ratio"])]),
+        ("translation_cache_entries", "gauge", "Templates held in memory", [({}, stats["size"])]),
+    ]
+
+register_collector(_collect_metrics)
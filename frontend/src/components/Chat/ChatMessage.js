@@ -2,7 +2,7 @@ import React from 'react';
 import './ChatMessage.css';
 
 function ChatMessage({ message }) {
-  const { type, text, data, error, timestamp } = message;
+  const { type, text, data, error, timestamp, status, streaming } = message;
   const isBot = type === 'bot';
 
   const formatTime = (ts) => {
@@ -106,7 +106,7 @@ function ChatMessage({ message }) {
   };
 
   return (
-    <div className={`chat-message ${type} ${error ? 'error' : ''} fade-in`}>
+    <div className={`chat-message ${type} ${error ? 'error' : ''} ${streaming ? 'streaming' : ''} fade-in`}>
       {isBot && (
         <div className="message-avatar bot-avatar">
           <span>🤖</span>
@@ -114,7 +114,8 @@ function ChatMessage({ message }) {
       )}
       <div className="message-wrapper">
         <div className="message-bubble">
-          <div className="message-text">{text}</div>
+          {!text && status && <div className="message-status">{status}</div>}
+          {text && <div className="message-text">{text}</div>}
           {renderData()}
         </div>
         {timestamp && (
@@ -1,9 +1,11 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import Layout from '../components/Layout/Layout';
 import { useAuth } from '../context/AuthContext';
 import api from '../services/api';
 import './Admin.css';
 
+const PAGE_SIZE = 50;
+
 function Admin() {
   const { user } = useAuth();
   const [users, setUsers] = useState([]);
@@ -12,18 +14,27 @@ function Admin() {
   const [error, setError] = useState('');
   const [activeTab, setActiveTab] = useState('overview');
   const [searchTerm, setSearchTerm] = useState('');
+  const [statusFilter, setStatusFilter] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  useEffect(() => {
-    fetchData();
-  }, []);
+  // One page of users; the server searches and filters, newest first
+  const fetchUsers = useCallback(async (before = null) => {
+    const params = { limit: PAGE_SIZE };
+    if (searchTerm.trim()) params.search = searchTerm.trim();
+    if (statusFilter) params.status = statusFilter;
+    if (before) params.before = before;
+    const res = await api.get('/admin/users', { params });
+    setUsers(prev => (before ? [...prev, ...(res.data.users || [])] : res.data.users || []));
+    setNextCursor(res.data.next_cursor);
+  }, [searchTerm, statusFilter]);
 
   const fetchData = async () => {
     try {
-      const [usersRes, statsRes] = await Promise.all([
-        api.get('/admin/users'),
+      const [, statsRes] = await Promise.all([
+        fetchUsers(),
         api.get('/admin/stats')
       ]);
-      setUsers(usersRes.data.users || []);
       setStats(statsRes.data);
     } catch (err) {
       setError('Failed to load admin data.');
@@ -32,26 +43,50 @@ function Admin() {
     }
   };
 
+  useEffect(() => {
+    fetchData();
+  }, []);
+
+  // Re-query when the search or filter changes, after typing pauses
+  useEffect(() => {
+    if (loading) return undefined;
+    const timer = setTimeout(() => {
+      fetchUsers().catch(() => setError('Failed to load users.'));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [fetchUsers]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchUsers(nextCursor);
+    } catch (err) {
+      alert('Failed to load more users');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const toggleUserStatus = async (userId, currentStatus) => {
     try {
       await api.post(`/admin/users/${userId}/toggle`);
       setUsers(users.map(u => 
         u.id === userId ? { ...u, is_active: !currentStatus } : u
       ));
+      setStats(prev => prev && {
+        ...prev,
+        active_users: prev.active_users + (currentStatus ? -1 : 1)
+      });
     } catch (err) {
       alert('Failed to update user status');
     }
   };
 
-  const filteredUsers = users.filter(u => 
-    u.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    u.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    u.shop_name?.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
-  const activeUsers = users.filter(u => u.is_active).length;
-  const shopkeepers = users.filter(u => u.role === 'shopkeeper').length;
-  const admins = users.filter(u => u.role === 'admin').length;
+  // Totals come from the server's counters, not from the loaded page
+  const totalUsers = stats?.total_users || 0;
+  const activeUsers = stats?.active_users || 0;
+  const shopkeepers = stats?.shopkeepers || 0;
+  const admins = stats?.admins || 0;
 
   if (user?.role !== 'admin') {
     return (
@@ -103,7 +138,7 @@ function Admin() {
                 className={`tab-btn ${activeTab === 'users' ? 'active' : ''}`}
                 onClick={() => setActiveTab('users')}
               >
-                👥 Users ({users.length})
+                👥 Users ({totalUsers})
               </button>
               <button 
                 className={`tab-btn ${activeTab === 'activity' ? 'active' : ''}`}
@@ -167,7 +202,7 @@ function Admin() {
                         <div className="dist-bar">
                           <div 
                             className="dist-fill shopkeeper" 
-                            style={{ width: `${users.length > 0 ? (shopkeepers / users.length) * 100 : 0}%` }}
+                            style={{ width: `${totalUsers > 0 ? (shopkeepers / totalUsers) * 100 : 0}%` }}
                           ></div>
                         </div>
                         <span className="dist-value">{shopkeepers}</span>
@@ -177,7 +212,7 @@ function Admin() {
                         <div className="dist-bar">
                           <div 
                             className="dist-fill admin" 
-                            style={{ width: `${users.length > 0 ? (admins / users.length) * 100 : 0}%` }}
+                            style={{ width: `${totalUsers > 0 ? (admins / totalUsers) * 100 : 0}%` }}
                           ></div>
                         </div>
                         <span className="dist-value">{admins}</span>
@@ -232,15 +267,24 @@ function Admin() {
                     <span className="search-icon">🔍</span>
                     <input
                       type="text"
-                      placeholder="Search users..."
+                      placeholder="Search name, email or shop..."
                       value={searchTerm}
                       onChange={(e) => setSearchTerm(e.target.value)}
                       className="search-input"
                     />
                   </div>
+                  <select
+                    className="input status-filter"
+                    value={statusFilter}
+                    onChange={(e) => setStatusFilter(e.target.value)}
+                  >
+                    <option value="">All statuses</option>
+                    <option value="active">Active</option>
+                    <option value="inactive">Inactive</option>
+                  </select>
                   <div className="user-stats">
                     <span className="badge badge-success">{activeUsers} Active</span>
-                    <span className="badge badge-danger">{users.length - activeUsers} Inactive</span>
+                    <span className="badge badge-danger">{totalUsers - activeUsers} Inactive</span>
                   </div>
                 </div>
 
@@ -253,12 +297,14 @@ function Admin() {
                         <th>Shop Name</th>
                         <th>Role</th>
                         <th>Status</th>
+                        <th>Sales</th>
+                        <th>Last Active</th>
                         <th>Joined</th>
                         <th>Actions</th>
                       </tr>
                     </thead>
                     <tbody>
-                      {filteredUsers.map((u) => (
+                      {users.map((u) => (
                         <tr key={u.id}>
                           <td>
                             <div className="user-cell">
@@ -279,6 +325,17 @@ function Admin() {
                             <span className={`status-dot ${u.is_active ? 'active' : 'inactive'}`}></span>
                             {u.is_active ? 'Active' : 'Inactive'}
                           </td>
+                          <td>
+                            {u.activity?.sales || 0}
+                            {u.activity?.sales_today > 0 && (
+                              <span className="sales-today"> ({u.activity.sales_today} today)</span>
+                            )}
+                          </td>
+                          <td>
+                            {u.activity?.last_active_at
+                              ? new Date(u.activity.last_active_at).toLocaleDateString()
+                              : '-'}
+                          </td>
                           <td>{new Date(u.created_at).toLocaleDateString()}</td>
                           <td>
                             <div className="action-buttons">
@@ -296,7 +353,17 @@ function Admin() {
                       ))}
                     </tbody>
                   </table>
+                  {users.length === 0 && (
+                    <p className="users-empty">No users match this search.</p>
+                  )}
                 </div>
+                {nextCursor && (
+                  <div className="users-more">
+                    <button className="btn btn-secondary" onClick={loadMore} disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
 
@@ -363,7 +430,7 @@ function Admin() {
                     <h3>🗄️ Database</h3>
                     <div className="setting-info">
                       <p><strong>Type:</strong> SQLite</p>
-                      <p><strong>Size:</strong> {stats ? '~1 MB' : 'Unknown'}</p>
+                      <p><strong>Size:</strong> {stats ? `${(stats.database_bytes / 1048576).toFixed(1)} MB` : 'Unknown'}</p>
                       <p><strong>Status:</strong> <span className="badge badge-success">Healthy</span></p>
                     </div>
                   </div>
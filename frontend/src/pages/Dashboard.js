@@ -3,9 +3,20 @@ import Layout from '../components/Layout/Layout';
 import ChatMessage from '../components/Chat/ChatMessage';
 import ChatInput from '../components/Chat/ChatInput';
 import WelcomeModal from '../components/Onboarding/WelcomeModal';
-import api from '../services/api';
+import api, { streamChat } from '../services/api';
 import './Dashboard.css';
 
+// Shown while a streamed reply is being prepared
+const STATUS_LABELS = {
+  record_sale: 'Recording sale...',
+  record_purchase: 'Recording purchase...',
+  create_invoice: 'Creating invoice...',
+  show_inventory: 'Loading inventory...',
+  show_summary: 'Preparing summary...',
+  suggest_reorder: 'Checking stock levels...',
+  recommend_price: 'Calculating price...',
+};
+
 const WELCOME_MESSAGE = {
   type: 'bot',
   text: "👋 Welcome to ShopKeeperAI! I'm your intelligent shop assistant.\n\nI can help you with:\n• Recording sales and purchases\n• Managing inventory\n• Creating invoices\n• Daily summaries and reports\n• Reorder suggestions\n• Translating bills to Urdu\n\nTry typing something like \"Sold 5kg rice at 80\" or \"Show my inventory\"",
@@ -78,18 +89,61 @@ function Dashboard() {
     setMessages(prev => [...prev, userMessage]);
     setLoading(true);
 
+    const botId = `bot-${Date.now()}`;
+    let started = false;
+    const updateBot = (update) => {
+      setMessages(prev => prev.map(m => (m.id === botId ? { ...m, ...update(m) } : m)));
+    };
+
     try {
-      const response = await api.post('/chat', { message: text });
-      const data = response.data;
-      
-      const botMessage = {
-        type: 'bot',
-        text: data.response || data.message,
-        data: data.data || null,
-        timestamp: new Date().toISOString()
-      };
-      
-      setMessages(prev => [...prev, botMessage]);
+      try {
+        // Stream the reply so each stage shows as soon as it is ready
+        await streamChat(text, (event, payload) => {
+          if (!started) {
+            started = true;
+            setLoading(false);
+            setMessages(prev => [...prev, {
+              id: botId,
+              type: 'bot',
+              text: '',
+              streaming: true,
+              timestamp: new Date().toISOString()
+            }]);
+          }
+          if (event === 'intent') {
+            const intents = payload.intents || [];
+            const label = intents.length > 1
+              ? `Recording ${intents.length} actions...`
+              : STATUS_LABELS[intents[0]?.intent] || 'Thinking...';
+            updateBot(() => ({ status: label }));
+          } else if (event === 'token') {
+            updateBot(m => ({ text: m.text + payload.token }));
+          } else if (event === 'result') {
+            updateBot(() => ({ data: payload.data || null }));
+          } else if (event === 'text') {
+            updateBot(() => ({ text: payload.response }));
+          } else if (event === 'done') {
+            updateBot(() => ({ streaming: false, status: null }));
+          } else if (event === 'error') {
+            const text = payload.truncated ? `${payload.partial}\n\n⚠️ ${payload.detail}` : payload.detail;
+            updateBot(() => ({ text, error: true, streaming: false, status: null }));
+          }
+        });
+      } catch (streamErr) {
+        if (started) throw streamErr;
+        // Streaming unavailable - fall back to the regular endpoint
+        const response = await api.post('/chat', { message: text });
+        const data = response.data;
+        
+        const botMessage = {
+          type: 'bot',
+          text: data.response || data.message,
+          data: data.data || null,
+          timestamp: new Date().toISOString()
+        };
+        
+        setMessages(prev => [...prev, botMessage]);
+      }
       
       // Refresh stock notifications if the message might have affected inventory
       const lowerText = text.toLowerCase();